@@ -1,3 +1,6 @@
 #!/bin/bash
+set -e
 pip install -r requirements.txt
-python3 app.py
\ No newline at end of file
+# The Procfile's release step, then its web process
+python3 manage.py setup
+exec gunicorn async_app:app_factory --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:${PORT:-5000} --workers ${WEB_CONCURRENCY:-2}
@@ -1,504 +1,254 @@
-from flask import Flask, request, jsonify, session
-from flask_pymongo import PyMongo
+from flask import Flask, Blueprint, abort, current_app, g, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO
 import uuid
+import time
 from config import Config
-from models.Customer import Customer
-from models.product import Product
-from models.Conversation import Conversation
-from services.ai_service import AIService
-from datetime import datetime, timezone
-from pymongo import MongoClient
-from bson import ObjectId
+from services.admission import Overloaded
+from services.chat_pipeline import ChatPipeline
+from services.container import Services
+from services.single_flight import TurnAbandoned
+from utils.db import get_db
+from utils.helpers import mongo_to_dict, server_timing, sse_event
+from utils.mongo_metrics import round_trips
+from utils.serialization import MongoJSONProvider, dumps
+from utils.metrics import http_request_seconds, registry
 import os
 
-app = Flask(__name__)
-app.config.from_object(Config)
-mongo = PyMongo(app)
-db = mongo.db
-
-cors = CORS(app,origins="*")
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-customer_model = Customer(db)
-product_model = Product(db)
-conversation_model = Conversation(db)
-ai_service = AIService()
-
-# Use your actual MongoDB URI here
-client = MongoClient(Config.MONGO_URI)
-db = client["ecomerce_chatbot"]  # Use your actual database name
-
-# Drop the unique index on 'username' if it exists
-try:
-    db.customers.drop_index("username_1")
-    # print("Dropped unique index on 'username'.")
-except Exception:
-    pass
-
-# Insert fake products if not present
-if product_model.collection.count_documents({}) == 0:
-    product_model.insert_many([
-        {
-            "name": "MacBook Pro 16-inch M3",
-            "brand": "Apple",
-            "price": 2499.99,
-            "category": "laptop",
-            "description": "Powerful laptop with M3 chip, 16GB RAM, 512GB SSD. Perfect for professionals and creatives.",
-            "specs": {
-                "processor": "Apple M3",
-                "ram": "16GB",
-                "storage": "512GB SSD",
-                "screen": "16-inch Retina",
-                "graphics": "Integrated"
-            },
-            "image_url": "https://www.apple.com/newsroom/images/product/mac/standard/Apple_new-macbookair-wallpaper-screen_11102020_big.jpg.small_2x.jpg",
-            "in_stock": True,
-            "rating": 4.8,
-            "color": "Space Gray",
-            "tags": ["professional", "creative", "premium", "mac", "apple"]
-        },
-        {
-            "name": "Dell XPS 13 Plus",
-            "brand": "Dell",
-            "price": 1399.99,
-            "category": "laptop",
-            "description": "Ultra-thin, lightweight laptop with 12th Gen Intel i7, 16GB RAM, 1TB SSD. Great for business and travel.",
-            "specs": {
-                "processor": "Intel i7-1260P",
-                "ram": "16GB",
-                "storage": "1TB SSD",
-                "screen": "13.4-inch FHD+",
-                "graphics": "Intel Iris Xe"
-            },
-            "image_url": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcSd4hJBxUtlZcEhvgdIEt4dZt3VZ6CJPqXOdA&s",
-            "in_stock": True,
-            "rating": 4.7,
-            "color": "Silver",
-            "tags": ["business", "ultrabook", "dell", "portable"]
-        },
-        {
-            "name": "HP Spectre x360 14",
-            "brand": "HP",
-            "price": 1249.99,
-            "category": "laptop",
-            "description": "Convertible 2-in-1 laptop with touch screen, Intel i7, 16GB RAM, 512GB SSD. Perfect for students and professionals.",
-            "specs": {
-                "processor": "Intel i7-1165G7",
-                "ram": "16GB",
-                "storage": "512GB SSD",
-                "screen": "13.5-inch OLED",
-                "graphics": "Intel Iris Xe"
-            },
-            "image_url": "https://cdn.mos.cms.futurecdn.net/v2/t:0,l:0,cw:2000,ch:1125,q:80,w:2000/pyL3b8cis5dcmUvgbe9ygV.jpg",
-            "in_stock": True,
-            "rating": 4.6,
-            "color": "Nightfall Black",
-            "tags": ["2-in-1", "touchscreen", "hp", "student"]
-        },
-        {
-            "name": "Lenovo ThinkPad X1 Carbon Gen 11",
-            "brand": "Lenovo",
-            "price": 1599.99,
-            "category": "laptop",
-            "description": "Business-class laptop with Intel i7, 16GB RAM, 1TB SSD, legendary ThinkPad keyboard.",
-            "specs": {
-                "processor": "Intel i7-1355U",
-                "ram": "16GB",
-                "storage": "1TB SSD",
-                "screen": "14-inch WUXGA",
-                "graphics": "Intel Iris Xe"
-            },
-            "image_url": "https://5.imimg.com/data5/EI/TV/DO/SELLER-43661309/lenovo-laptops-500x500.png",
-            "in_stock": True,
-            "rating": 4.9,
-            "color": "Black",
-            "tags": ["business", "thinkpad", "lenovo", "durable"]
-        },
-        {
-            "name": "ASUS ROG Zephyrus G14",
-            "brand": "ASUS",
-            "price": 1799.99,
-            "category": "laptop",
-            "description": "High-performance gaming laptop with AMD Ryzen 9, RTX 4060, 32GB RAM, 1TB SSD.",
-            "specs": {
-                "processor": "AMD Ryzen 9 7940HS",
-                "ram": "32GB",
-                "storage": "1TB SSD",
-                "screen": "14-inch QHD",
-                "graphics": "NVIDIA RTX 4060"
-            },
-            "image_url": "https://www.notebookcheck.net/uploads/tx_nbc2/display-asus-k55_02.jpg",
-            "in_stock": True,
-            "rating": 4.8,
-            "color": "White",
-            "tags": ["gaming", "asus", "high-performance"]
-        },
-        {
-            "name": "Acer Swift 3 OLED",
-            "brand": "Acer",
-            "price": 899.99,
-            "category": "laptop",
-            "description": "Affordable ultrabook with Intel i5, 8GB RAM, 512GB SSD, OLED display.",
-            "specs": {
-                "processor": "Intel i5-1240P",
-                "ram": "8GB",
-                "storage": "512GB SSD",
-                "screen": "14-inch OLED",
-                "graphics": "Intel Iris Xe"
-            },
-            "image_url": "https://5.imimg.com/data5/SELLER/Default/2022/11/VY/TM/OH/139444584/acer-laptop-aspire-3.jpg",
-            "in_stock": True,
-            "rating": 4.4,
-            "color": "Silver",
-            "tags": ["budget", "ultrabook", "acer"]
-        },
-        {
-            "name": "Microsoft Surface Laptop 5",
-            "brand": "Microsoft",
-            "price": 1299.99,
-            "category": "laptop",
-            "description": "Sleek, lightweight laptop with Intel i5, 16GB RAM, 512GB SSD, touchscreen.",
-            "specs": {
-                "processor": "Intel i5-1235U",
-                "ram": "16GB",
-                "storage": "512GB SSD",
-                "screen": "13.5-inch PixelSense",
-                "graphics": "Intel Iris Xe"
-            },
-            "image_url": "https://cdn-dynmedia-1.microsoft.com/is/image/microsoftcorp/FL1C-BB-00?qlt=90&wid=1253&hei=705&extendN=0.12,0.12,0.12,0.12&bgc=FFFFFFFF&fmt=jpg",
-            "in_stock": True,
-            "rating": 4.5,
-            "color": "Platinum",
-            "tags": ["microsoft", "surface", "touchscreen"]
-        },
-        {
-            "name": "Razer Blade 15",
-            "brand": "Razer",
-            "price": 2199.99,
-            "category": "laptop",
-            "description": "Premium gaming laptop with Intel i7, RTX 3070, 16GB RAM, 1TB SSD, 240Hz display.",
-            "specs": {
-                "processor": "Intel i7-12800H",
-                "ram": "16GB",
-                "storage": "1TB SSD",
-                "screen": "15.6-inch QHD 240Hz",
-                "graphics": "NVIDIA RTX 3070"
-            },
-            "image_url": "https://example.com/razer-blade-15.jpg",
-            "in_stock": True,
-            "rating": 4.7,
-            "color": "Black",
-            "tags": ["gaming", "razer", "high-refresh"]
-        },
-        {
-            "name": "Apple MacBook Air M2",
-            "brand": "Apple",
-            "price": 1099.99,
-            "category": "laptop",
-            "description": "Lightweight, fanless laptop with Apple M2 chip, 8GB RAM, 256GB SSD. Great for students and everyday use.",
-            "specs": {
-                "processor": "Apple M2",
-                "ram": "8GB",
-                "storage": "256GB SSD",
-                "screen": "13.6-inch Retina",
-                "graphics": "Integrated"
-            },
-            "image_url": "https://example.com/macbook-air-m2.jpg",
-            "in_stock": True,
-            "rating": 4.6,
-            "color": "Starlight",
-            "tags": ["student", "macbook", "apple", "lightweight"]
-        },
-        {
-            "name": "MSI Creator Z16",
-            "brand": "MSI",
-            "price": 1899.99,
-            "category": "laptop",
-            "description": "Creator-focused laptop with Intel i9, RTX 3060, 32GB RAM, 1TB SSD, 16-inch QHD+ display.",
-            "specs": {
-                "processor": "Intel i9-11900H",
-                "ram": "32GB",
-                "storage": "1TB SSD",
-                "screen": "16-inch QHD+",
-                "graphics": "NVIDIA RTX 3060"
-            },
-            "image_url": "https://example.com/msi-creator-z16.jpg",
-            "in_stock": True,
-            "rating": 4.7,
-            "color": "Gray",
-            "tags": ["creator", "msi", "high-performance"]
-        }
-    ])
-
-print("Files in /app at runtime:", os.listdir('.'))
-print("Files in /app/models at runtime:", os.listdir('./models'))
-
-def extract_customer_info(message, conversation_id, existing_customer_data=None):
-    # This is a simplified version; you can expand with your regex logic
-    customer_data = existing_customer_data.copy() if existing_customer_data else {}
-    message_lower = message.lower()
-
-    import re
-    # Name
-    if not customer_data.get('name'):
-        name_patterns = [
-            r'(?:my name is|i am|i\'m|call me|name is)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
-            r'^([a-zA-Z]+)(?:\s+[a-zA-Z]+)?\s*(?:here|!|\.|\s*$)',
-            r'(?:i\'m|im)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)'
-        ]
-        for pattern in name_patterns:
-            name_match = re.search(pattern, message, re.IGNORECASE)
-            if name_match:
-                name = name_match.group(1).strip().title()
-                if name.lower() not in ['looking', 'searching', 'need', 'want', 'here', 'hello', 'hi']:
-                    customer_data['name'] = name
-                    break
-
-    # Email
-    if not customer_data.get('email'):
-        email_match = re.search(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', message)
-        if email_match:
-            customer_data['email'] = email_match.group(1)
-
-    # Phone
-    if not customer_data.get('phone'):
-        phone_patterns = [
-            r'(?:phone|number|tel|mobile|call)\s*:?0\s*([0-9\s\-\(\)\+]{7,})',
-            r'([0-9]{3}[-\s]?[0-9]{3}[-\s]?[0-9]{4})',
-            r'(\+[0-9\s\-\(\)]{10,})',
-            r'([0-9]{6,})'
-        ]
-        for pattern in phone_patterns:
-            phone_match = re.search(pattern, message, re.IGNORECASE)
-            if phone_match:
-                customer_data['phone'] = phone_match.group(1).strip()
-                break
+api = Blueprint('api', __name__)
 
-    # Looking for
-    if not customer_data.get('looking_for'):
-        looking_patterns = [
-            r'(?:looking for|need|want|searching for|interested in)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
-            r'(?:buy|purchase|get)\s+(?:a|an|some)?\s*([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
-            r'(laptop|computer|gaming laptop|business laptop|ultrabook|notebook)',
-        ]
-        for pattern in looking_patterns:
-            looking_match = re.search(pattern, message, re.IGNORECASE)
-            if looking_match:
-                looking_for = looking_match.group(1).strip().lower()
-                customer_data['looking_for'] = looking_for
-                break
 
-    # Preferences (budget, brand, color)
-    if not customer_data.get('budget'):
-        budget_match = re.search(r'budget\s*(?:is|of|around)?\s*\$?(\d+(?:,\d{3})*(?:\.\d{2})?)', message, re.IGNORECASE)
-        if budget_match:
-            customer_data['budget'] = f"${budget_match.group(1)}"
-    if not customer_data.get('brand_preference'):
-        # Positive brand preference (e.g., 'I want HP')
-        for brand in ['apple', 'dell', 'hp', 'lenovo', 'asus', 'acer', 'microsoft', 'surface', 'macbook', 'thinkpad', 'msi', 'razer']:
-            if re.search(rf'\b{brand}\b', message_lower) and not re.search(rf"(don\'t want|no|avoid|not|without)\s+{brand}", message_lower):
-                customer_data['brand_preference'] = brand.title()
-                break
-    # Exclude brand (e.g., 'I don\'t want MacBook', 'no Apple')
-    if not customer_data.get('exclude_brand'):
-        for brand in ['apple', 'dell', 'hp', 'lenovo', 'asus', 'acer', 'microsoft', 'surface', 'macbook', 'thinkpad', 'msi', 'razer']:
-            if re.search(rf"(don\'t want|no|avoid|not|without)\s+{brand}", message_lower):
-                customer_data['exclude_brand'] = brand.title()
-                break
-    if not customer_data.get('color_preference'):
-        for color in ['black', 'white', 'silver', 'gray', 'grey', 'gold', 'rose gold', 'blue', 'red']:
-            if color in message_lower:
-                customer_data['color_preference'] = color.title()
-                break
+def create_app(config=Config, db=None):
+    """Build the Flask app.
+
+    Nothing here talks to MongoDB: the shared client connects on the first
+    query, and seeding and index migrations live in manage.py.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    # jsonify turns ObjectId and datetime values into strings while encoding
+    app.json = MongoJSONProvider(app)
+    CORS(app, origins="*")
+    if config.SOCKETIO_ENABLED:
+        # No Socket.IO handlers are registered yet, and flask_socketio (via aiohttp) is slow to import
+        from flask_socketio import SocketIO
+        SocketIO(app, cors_allowed_origins="*")
+    app.extensions['chatbot'] = Services(db if db is not None else get_db(config.MONGO_URI), config)
+    registry.enabled = config.METRICS_ENABLED
+    app.register_blueprint(api)
+    return app
+
 
-    customer_data['conversation_id'] = conversation_id
-    customer_data['timestamp'] = datetime.now(timezone.utc).isoformat()
-    return customer_data
-
-def get_missing_info(customer_data):
-    required_fields = ['name', 'email', 'phone', 'looking_for']
-    missing = [field for field in required_fields if not customer_data.get(field)]
-    if not missing and not customer_data.get('budget') and not customer_data.get('brand_preference'):
-        missing.append('preferences')
-    return missing
-
-def mongo_to_dict(doc):
-    """Recursively convert MongoDB document to dict with string _id and nested ObjectIds."""
-    if not doc:
-        return doc
-    if isinstance(doc, ObjectId):
-        return str(doc)
-    if isinstance(doc, list):
-        return [mongo_to_dict(item) for item in doc]
-    if isinstance(doc, dict):
-        doc = dict(doc)
-        for k, v in doc.items():
-            if isinstance(v, ObjectId):
-                doc[k] = str(v)
-            elif isinstance(v, (dict, list)):
-                doc[k] = mongo_to_dict(v)
-        return doc
-    return doc
-
-def mongo_list_to_dicts(docs):
-    return [mongo_to_dict(doc) for doc in docs]
-
-def merge_customer_data(old, new):
-    merged = old.copy()
-    for k, v in new.items():
-        if v not in [None, '', []]:  # Only overwrite if new value is not empty/None
-            merged[k] = v
-    return merged
-
-@app.route('/')
+def services():
+    return current_app.extensions['chatbot']
+
+
+@api.before_app_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@api.after_app_request
+def record_request(response):
+    # For streamed responses this is the time to the first byte
+    if 'request_start' in g:
+        http_request_seconds.observe(
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    return response
+
+@api.app_errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({'error': 'Too many requests, please retry shortly', 'reason': e.reason})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def admit(session_id):
+    """Take an admission slot for a chat turn; returns the release() callable."""
+    admission = services().admission
+    if admission is None:
+        return lambda: None
+    return admission.acquire(session_id)
+
+def single_flight(session_id, message, fn):
+    """fn() as the session's next turn, or the result of an identical turn already in flight."""
+    flights = services().flights
+    if flights is None:
+        return fn()
+    return flights.run(session_id, message, fn)
+
+@api.route('/')
 def index():
     return "E-commerce AI Chatbot Backend is running! Use /api/chat for the chat API."
 
-@app.route('/api/chat', methods=['POST'])
+def save_turn_to_session(turn):
+    if services().session_store is not None:
+        # The profile is kept server-side; drop what older versions put in the cookie
+        if session:
+            session.clear()
+        return
+    if turn.customer_id:
+        session['customer_id'] = turn.customer_id
+    session['conversation_id'] = str(turn.conversation_id)
+    session['customer_data'] = mongo_to_dict(turn.customer_data)
+    session['session_id'] = turn.session_id
+
+@api.route('/api/chat', methods=['POST'])
 def chat():
     data = request.get_json()
     user_message = data.get('message', '')
     session_id = data.get('session_id') or str(uuid.uuid4())
 
-    # Get or create conversation - FIXED: Use session_id consistently
-    conversation = conversation_model.get_by_session_id(session_id)
-    if not conversation:
-        conversation_id = conversation_model.create(
-            customer_id=None,
-            session_id=session_id
-        )
-        conversation = {'_id': conversation_id, 'session_id': session_id}
-    else:
-        conversation_id = conversation['_id']
-
-    # Get existing customer data from session or database
-    existing_customer_data = session.get('customer_data', {})
-    
-    # Add user message to conversation
-    conversation_model.add_message(
-        conversation_id=conversation_id,
-        message_type='user',
-        content=user_message
-    )
-
-    # Extract and merge customer info
-    customer_data_new = extract_customer_info(user_message, conversation_id, existing_customer_data)
-    customer_data = merge_customer_data(existing_customer_data, customer_data_new)
-
-    # Save/update customer in database
-    customer_id = None
-    if customer_data.get('email'):
-        existing = customer_model.get_by_email(customer_data['email'])
-        if existing:
-            updated_data = merge_customer_data(existing, customer_data)
-            if '_id' in updated_data:
-                del updated_data['_id']
-            customer_model.update(existing['_id'], updated_data)
-            customer_id = str(existing['_id'])
-            customer_data = mongo_to_dict(customer_model.get_by_id(existing['_id']))
-        else:
-            customer_id = customer_model.create(customer_data)
-            customer_data = mongo_to_dict(customer_model.get_by_id(customer_id))
-        session['customer_id'] = customer_id
-
-    # Update session with current customer data
-    session['conversation_id'] = str(conversation_id)
-    session['customer_data'] = mongo_to_dict(customer_data)
-    session['session_id'] = session_id
-
-    # Check what information is still missing
-    missing_info = get_missing_info(customer_data)
-
-    # Get products if we have enough info
-    products = []
-    if not missing_info or (customer_data.get('looking_for') and len(missing_info) <= 1):
-        products = product_model.find_by_query_and_preferences(
-            customer_data.get('looking_for', 'laptop'),
-            customer_data
-        )
-        if products:
-            products = mongo_list_to_dicts(products)
-
-    if products:
-        products = mongo_list_to_dicts(products)
-    if customer_data:
-        customer_data = mongo_to_dict(customer_data)
-
-    # Generate AI response with current context
-    ai_response_data = ai_service.generate_response(
-        user_message=user_message,
-        customer_info=customer_data,
-        products=products,
-        missing_info=missing_info,
-        conversation_history=conversation_model.get_recent_messages(conversation_id, limit=5)
-    )
+    customer_data = session.get('customer_data', {})
+
+    def run_turn():
+        release = admit(session_id)
+        try:
+            with round_trips.track() as mongo_calls:
+                turn, response_data = services().chat_pipeline.run(user_message, session_id, customer_data)
+        finally:
+            release()
+        # Encoded once, so duplicate requests coalesced onto this turn get the same body
+        start = time.perf_counter()
+        body = dumps(response_data)
+        ChatPipeline.record_timing(turn, 'serialize', start)
+        return turn, body, {'X-Mongo-Round-Trips': str(mongo_calls.count), 'Server-Timing': server_timing(turn.timings)}
+
+    turn, body, headers = single_flight(session_id, user_message, run_turn)
+    save_turn_to_session(turn)
+    return Response(body, mimetype='application/json', headers=headers)
+
+@api.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same turn as /api/chat, streamed as server-sent events.
+
+    Emits 'delta' events with pieces of the reply text while the model is
+    generating, then one 'done' event with the full /api/chat payload plus the
+    fields the model extracted. The session cookie is sent with the response
+    headers, so only the pre-LLM customer data reaches it; the post-LLM data
+    is persisted in the database and returned in the 'done' event.
+    """
+    data = request.get_json()
+    user_message = data.get('message', '')
+    session_id = data.get('session_id') or str(uuid.uuid4())
 
-    # Merge extracted fields from LLM into customer_data
-    if 'extracted_fields' in ai_response_data:
-        customer_data = merge_customer_data(customer_data, ai_response_data['extracted_fields'])
-
-    # If we now have an email, update or create the customer in DB
-    if customer_data.get('email'):
-        existing = customer_model.get_by_email(customer_data['email'])
-        if existing:
-            updated_data = merge_customer_data(existing, customer_data)
-            if '_id' in updated_data:
-                del updated_data['_id']
-            customer_model.update(existing['_id'], updated_data)
-            customer_id = str(existing['_id'])
-            customer_data = mongo_to_dict(customer_model.get_by_id(existing['_id']))
-        else:
-            customer_id = customer_model.create(customer_data)
-            customer_data = mongo_to_dict(customer_model.get_by_id(customer_id))
-        session['customer_id'] = customer_id
-
-    # Update session with the latest customer_data
-    session['customer_data'] = mongo_to_dict(customer_data)
-
-    # Check what information is still missing
-    missing_info = get_missing_info(customer_data)
-
-    # Get products if we have enough info
-    products = []
-    if not missing_info or (customer_data.get('looking_for') and len(missing_info) <= 1):
-        products = product_model.find_by_query_and_preferences(
-            customer_data.get('looking_for', 'laptop'),
-            customer_data
-        )
-        if products:
-            products = mongo_list_to_dicts(products)
-
-    if products:
-        products = mongo_list_to_dicts(products)
-    if customer_data:
-        customer_data = mongo_to_dict(customer_data)
-
-    # Add bot response to conversation
-    conversation_model.add_message(
-        conversation_id=conversation_id,
-        message_type='bot',
-        content=ai_response_data['response']
+    chat_pipeline = services().chat_pipeline
+    flights = services().flights
+    # Keyed apart from /api/chat turns, whose shared result is an encoded body
+    flight = flights.enter(session_id, ('stream', user_message)) if flights is not None else None
+    if flight is not None and not flight.leader:
+        # A duplicate of a stream in flight: its reply in one piece once the first copy is done
+        return Response(coalesced_stream(flight), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    try:
+        if flight is not None:
+            flight.wait()
+        release = admit(session_id)
+    except BaseException as e:
+        if flight is not None:
+            flight.finish(error=e)
+        raise
+    try:
+        turn = chat_pipeline.start(user_message, session_id, session.get('customer_data', {}))
+    except BaseException as e:
+        release()
+        if flight is not None:
+            flight.finish(error=e)
+        raise
+    save_turn_to_session(turn)
+
+    def generate():
+        try:
+            for delta in chat_pipeline.stream(turn):
+                yield sse_event('delta', {'text': delta})
+            response_data = chat_pipeline.finish(turn)
+            response_data['extracted_fields'] = turn.ai_response.get('extracted_fields', {})
+            if flight is not None:
+                flight.finish(response_data)
+            yield sse_event('done', response_data)
+        except Exception as e:
+            if flight is not None:
+                flight.finish(error=e)
+            yield sse_event('error', {'error': str(e)})
+
+    def close():
+        release()
+        if flight is not None:
+            flight.finish(error=TurnAbandoned('The stream was closed before the turn finished'))
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
-
-    response_data = {
-        'response': ai_response_data['response'],
-        'products': products[:3] if products else [],
-        'session_id': session_id,
-        'needs_customer_info': ai_response_data.get('needs_customer_info', False),
-        'customer_info': customer_data if customer_data else None,
-        'missing_info': missing_info,
-        'conversation_id': str(conversation_id)
-    }
-
-    return jsonify(response_data)
-
-@app.route('/api/reset', methods=['POST'])
+    # The slot and the session's turn are held until the stream is closed, also when the client disconnects
+    response.call_on_close(close)
+    return response
+
+def coalesced_stream(flight):
+    try:
+        response_data = flight.result()
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+    yield sse_event('delta', {'text': response_data['response']})
+    yield sse_event('done', response_data)
+
+@api.route('/api/models/stats')
+def model_stats():
+    return jsonify(services().ai_service.model_selector.stats())
+
+@api.route('/api/cache/stats')
+def cache_stats():
+    history_cache = services().history_cache
+    response_cache = services().response_cache
+    customers = services().customers
+    return jsonify({
+        'history': history_cache.stats() if history_cache is not None else None,
+        'responses': response_cache.stats() if response_cache is not None else None,
+        'customers': customers.stats() if services().customer_cache is not None else None
+    })
+
+@api.route('/api/admission/stats')
+def admission_stats():
+    admission = services().admission
+    return jsonify(admission.stats() if admission is not None else None)
+
+@api.route('/api/flights/stats')
+def flight_stats():
+    flights = services().flights
+    return jsonify(flights.stats() if flights is not None else None)
+
+@api.route('/api/router/stats')
+def router_stats():
+    router = services().router
+    return jsonify(router.stats() if router is not None else None)
+
+@api.route('/api/sessions/stats')
+def session_stats():
+    session_store = services().session_store
+    return jsonify(session_store.stats() if session_store is not None else None)
+
+@api.route('/metrics')
+def metrics():
+    if not registry.enabled:
+        abort(404)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@api.route('/api/reset', methods=['POST'])
 def reset_conversation():
+    session_store = services().session_store
+    data = request.get_json(silent=True) or {}
+    if session_store is not None and data.get('session_id'):
+        session_store.delete(data['session_id'])
     session.clear()
     return jsonify({'message': 'Conversation reset'})
 
+app = create_app()
+
 if __name__ == '__main__':
     import sys
 
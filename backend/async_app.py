@@ -0,0 +1,361 @@
+"""asyncio serving mode on aiohttp.
+
+Serves the same API as app.py, but a chat turn awaits the model API on the
+event loop instead of holding a thread for the whole call. The pymongo work
+before and after the LLM call runs on a bounded thread pool
+(ASYNC_DB_WORKERS threads), so one worker process can keep hundreds of
+turns in flight. With SESSION_STORE=cookie, sessions use Flask's signed
+cookie format and SECRET_KEY, so a session continues across app.py and
+async_app.py.
+
+    gunicorn async_app:app_factory --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:5000
+    python async_app.py
+"""
+import asyncio
+import contextvars
+import functools
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from config import Config
+from services.admission import Overloaded
+from services.container import Services
+from services.single_flight import TurnAbandoned
+from utils.db import get_db
+from utils.helpers import mongo_to_dict, server_timing, sse_event
+from utils.metrics import http_request_seconds, registry
+from utils.mongo_metrics import round_trips
+from utils.serialization import dumps
+
+SESSION_COOKIE = 'session'
+SESSION_MAX_AGE = 31 * 24 * 3600
+
+
+class CookieSessions:
+    """Reads and writes Flask's signed session cookie."""
+
+    def __init__(self, secret_key):
+        self.serializer = URLSafeTimedSerializer(
+            secret_key,
+            salt='cookie-session',
+            serializer=TaggedJSONSerializer(),
+            signer_kwargs={'key_derivation': 'hmac', 'digest_method': hashlib.sha1}
+        ) if secret_key else None
+
+    def load(self, request):
+        value = request.cookies.get(SESSION_COOKIE)
+        if not value or self.serializer is None:
+            return {}
+        try:
+            return self.serializer.loads(value, max_age=SESSION_MAX_AGE)
+        except BadSignature:
+            return {}
+
+    def save(self, response, data):
+        if self.serializer is None:
+            return
+        response.set_cookie(
+            SESSION_COOKIE, self.serializer.dumps(data),
+            max_age=None, path='/', httponly=True, samesite='Lax'
+        )
+
+    def clear(self, response):
+        response.del_cookie(SESSION_COOKIE, path='/')
+
+
+services_key = web.AppKey('services', Services)
+executor_key = web.AppKey('executor', ThreadPoolExecutor)
+sessions_key = web.AppKey('sessions', CookieSessions)
+
+
+def offload(request, fn, *args):
+    """Run blocking (pymongo) work on the DB pool, keeping contextvars such as round_trips."""
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(request.app[executor_key], functools.partial(ctx.run, fn, *args))
+
+
+def save_turn_to_session(request, response, session, turn):
+    sessions = request.app[sessions_key]
+    if request.app[services_key].session_store is not None:
+        # The profile is kept server-side; drop what older versions put in the cookie
+        if session:
+            sessions.clear(response)
+        return
+    if turn.customer_id:
+        session['customer_id'] = turn.customer_id
+    session['conversation_id'] = str(turn.conversation_id)
+    session['customer_data'] = mongo_to_dict(turn.customer_data)
+    session['session_id'] = turn.session_id
+    sessions.save(response, session)
+
+
+def json_response(data, **kwargs):
+    return web.json_response(data, dumps=dumps, **kwargs)
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    # Same policy as flask_cors with origins="*"
+    if request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers:
+        response = web.Response()
+        response.headers['Access-Control-Allow-Methods'] = 'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+        requested = request.headers.get('Access-Control-Request-Headers')
+        if requested:
+            response.headers['Access-Control-Allow-Headers'] = requested
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        route = request.match_info.route
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            endpoint=route.name or (route.resource.canonical if route.resource else 'unmatched'),
+            method=request.method,
+            status=str(status)
+        )
+
+
+@web.middleware
+async def overload_middleware(request, handler):
+    try:
+        return await handler(request)
+    except Overloaded as e:
+        return json_response(
+            {'error': 'Too many requests, please retry shortly', 'reason': e.reason},
+            status=429, headers={'Retry-After': str(e.retry_after)}
+        )
+
+
+async def admit(request, session_id):
+    """Take an admission slot for a chat turn; returns the release() callable."""
+    admission = request.app[services_key].admission
+    if admission is None:
+        return lambda: None
+    return await admission.aacquire(session_id)
+
+
+async def single_flight(request, session_id, message, fn):
+    """await fn() as the session's next turn, or the result of an identical turn already in flight."""
+    flights = request.app[services_key].flights
+    if flights is None:
+        return await fn()
+    return await flights.arun(session_id, message, fn)
+
+
+async def index(request):
+    return web.Response(text="E-commerce AI Chatbot Backend is running! Use /api/chat for the chat API.")
+
+
+async def chat(request):
+    data = await request.json()
+    user_message = data.get('message', '')
+    session_id = data.get('session_id') or str(uuid.uuid4())
+    sessions = request.app[sessions_key]
+    session = sessions.load(request)
+    pipeline = request.app[services_key].chat_pipeline
+
+    async def run_turn():
+        release = await admit(request, session_id)
+        try:
+            with round_trips.track() as mongo_calls:
+                turn = await offload(request, pipeline.start, user_message, session_id, session.get('customer_data', {}))
+                await pipeline.agenerate(turn)
+                response_data = await offload(request, pipeline.finish, turn)
+        finally:
+            release()
+        # Encoded once, so duplicate requests coalesced onto this turn get the same body
+        start = time.perf_counter()
+        body = dumps(response_data)
+        pipeline.record_timing(turn, 'serialize', start)
+        return turn, body, {'X-Mongo-Round-Trips': str(mongo_calls.count), 'Server-Timing': server_timing(turn.timings)}
+
+    turn, body, headers = await single_flight(request, session_id, user_message, run_turn)
+    response = web.Response(text=body, content_type='application/json', headers=headers)
+    save_turn_to_session(request, response, session, turn)
+    return response
+
+
+async def chat_stream(request):
+    """Same events as /api/chat/stream in app.py."""
+    data = await request.json()
+    user_message = data.get('message', '')
+    session_id = data.get('session_id') or str(uuid.uuid4())
+    session = request.app[sessions_key].load(request)
+    pipeline = request.app[services_key].chat_pipeline
+
+    flights = request.app[services_key].flights
+    # Keyed apart from /api/chat turns, whose shared result is an encoded body
+    flight = flights.enter(session_id, ('stream', user_message)) if flights is not None else None
+    if flight is not None and not flight.leader:
+        return await coalesced_stream(request, flight)
+    try:
+        if flight is not None:
+            await flight.await_turn()
+        release = await admit(request, session_id)
+        try:
+            return await stream_turn(request, pipeline, user_message, session_id, session, flight)
+        finally:
+            release()
+    except BaseException as e:
+        if flight is not None:
+            flight.finish(error=e)
+        raise
+    finally:
+        if flight is not None:
+            flight.finish(error=TurnAbandoned('The stream was closed before the turn finished'))
+
+
+async def coalesced_stream(request, flight):
+    """A duplicate of a stream in flight: its reply in one piece once the first copy is done."""
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+    try:
+        response_data = await flight.aresult()
+    except Exception as e:
+        await response.write(sse_event('error', {'error': str(e)}).encode())
+    else:
+        await response.write(sse_event('delta', {'text': response_data['response']}).encode())
+        await response.write(sse_event('done', response_data).encode())
+    await response.write_eof()
+    return response
+
+
+async def stream_turn(request, pipeline, user_message, session_id, session, flight=None):
+    turn = await offload(request, pipeline.start, user_message, session_id, session.get('customer_data', {}))
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    save_turn_to_session(request, response, session, turn)
+    await response.prepare(request)
+    try:
+        async for delta in pipeline.astream(turn):
+            await response.write(sse_event('delta', {'text': delta}).encode())
+        response_data = await offload(request, pipeline.finish, turn)
+        response_data['extracted_fields'] = turn.ai_response.get('extracted_fields', {})
+        if flight is not None:
+            flight.finish(response_data)
+        await response.write(sse_event('done', response_data).encode())
+    except ConnectionResetError:
+        # The client went away
+        raise
+    except Exception as e:
+        if flight is not None:
+            flight.finish(error=e)
+        await response.write(sse_event('error', {'error': str(e)}).encode())
+    await response.write_eof()
+    return response
+
+
+async def model_stats(request):
+    return json_response(request.app[services_key].ai_service.model_selector.stats())
+
+
+async def cache_stats(request):
+    services = request.app[services_key]
+    return json_response({
+        'history': services.history_cache.stats() if services.history_cache is not None else None,
+        'responses': services.response_cache.stats() if services.response_cache is not None else None,
+        'customers': services.customers.stats() if services.customer_cache is not None else None
+    })
+
+
+async def admission_stats(request):
+    admission = request.app[services_key].admission
+    return json_response(admission.stats() if admission is not None else None)
+
+
+async def flight_stats(request):
+    flights = request.app[services_key].flights
+    return json_response(flights.stats() if flights is not None else None)
+
+
+async def router_stats(request):
+    router = request.app[services_key].router
+    return json_response(router.stats() if router is not None else None)
+
+
+async def session_stats(request):
+    session_store = request.app[services_key].session_store
+    return json_response(session_store.stats() if session_store is not None else None)
+
+
+async def metrics(request):
+    if not registry.enabled:
+        raise web.HTTPNotFound()
+    return web.Response(body=registry.render().encode(), content_type='text/plain; version=0.0.4', charset='utf-8')
+
+
+async def reset_conversation(request):
+    session_store = request.app[services_key].session_store
+    try:
+        data = await request.json() if request.can_read_body else {}
+    except ValueError:
+        data = {}
+    if session_store is not None and isinstance(data, dict) and data.get('session_id'):
+        await offload(request, session_store.delete, data['session_id'])
+    response = json_response({'message': 'Conversation reset'})
+    request.app[sessions_key].clear(response)
+    return response
+
+
+async def close_resources(app):
+    await app[services_key].ai_service.async_client.close()
+    app[executor_key].shutdown(wait=False)
+
+
+def create_async_app(config=Config, db=None):
+    app = web.Application(middlewares=[cors_middleware, metrics_middleware, overload_middleware])
+    app[services_key] = Services(db if db is not None else get_db(config.MONGO_URI), config)
+    app[executor_key] = ThreadPoolExecutor(max_workers=config.ASYNC_DB_WORKERS, thread_name_prefix='db')
+    app[sessions_key] = CookieSessions(config.SECRET_KEY)
+    registry.enabled = config.METRICS_ENABLED
+    app.router.add_get('/', index, name='api.index')
+    app.router.add_post('/api/chat', chat, name='api.chat')
+    app.router.add_post('/api/chat/stream', chat_stream, name='api.chat_stream')
+    app.router.add_get('/api/models/stats', model_stats, name='api.model_stats')
+    app.router.add_get('/api/cache/stats', cache_stats, name='api.cache_stats')
+    app.router.add_get('/api/admission/stats', admission_stats, name='api.admission_stats')
+    app.router.add_get('/api/flights/stats', flight_stats, name='api.flight_stats')
+    app.router.add_get('/api/router/stats', router_stats, name='api.router_stats')
+    app.router.add_get('/api/sessions/stats', session_stats, name='api.session_stats')
+    app.router.add_get('/metrics', metrics, name='api.metrics')
+    app.router.add_post('/api/reset', reset_conversation, name='api.reset_conversation')
+    app.on_cleanup.append(close_resources)
+    return app
+
+
+async def app_factory():
+    """Entry point for gunicorn's aiohttp.GunicornWebWorker."""
+    return create_async_app()
+
+
+if __name__ == '__main__':
+    web.run_app(create_async_app(), host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,167 @@
+"""Concurrent chat sessions per worker: sync (app.py) vs async (async_app.py).
+
+Both apps run in this process against the same database stand-in and a mock
+LLM with a fixed per-request latency. The sync app is served by a WSGI
+server with a fixed pool of --sync-threads threads, like one gunicorn gthread
+worker; the async app runs on its own event loop, like one
+aiohttp.GunicornWebWorker. A pool of aiohttp clients then runs N concurrent
+sessions, each sending --turns messages, for every N in --sessions.
+
+With an LLM latency L, a sync worker tops out near sync_threads / L
+requests per second however many sessions wait; the async worker keeps
+scaling until CPU or the database pool runs out. Servers, mock LLM and
+clients share this process (and its GIL), so absolute numbers are lower
+than on separate machines; compare the two modes with each other.
+
+    python -m benchmarks.bench_async_serving --sessions 25 100 400 --llm-latency 0.5
+    python -m benchmarks.bench_async_serving --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
+from werkzeug.serving import BaseWSGIServer
+
+from benchmarks.load_test import open_database, percentile
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+
+MESSAGES = ["hi", "I'm looking for a gaming laptop", "budget is $1500", "I prefer Asus", "thanks!"]
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that handles requests on a fixed thread pool."""
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        # Let waiting connections queue up instead of being refused
+        self.socket.listen(1024)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def start_sync(db, threads):
+    from app import create_app
+    server = PooledWSGIServer('127.0.0.1', 0, create_app(db=db), threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def start_async(db, config=Config):
+    from async_app import create_async_app
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def serve():
+        runner = web.AppRunner(create_async_app(config, db=db), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0, backlog=1024)
+        await site.start()
+        state['runner'] = runner
+        state['port'] = site._server.sockets[0].getsockname()[1]
+        started.set()
+
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(serve(), loop)
+    started.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(state['runner'].cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return f"http://127.0.0.1:{state['port']}", stop
+
+
+async def run_sessions(base_url, sessions, turns):
+    latencies = []
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=300)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        async def session():
+            nonlocal errors
+            session_id = str(uuid.uuid4())
+            for i in range(turns):
+                start = time.perf_counter()
+                try:
+                    async with http.post(f"{base_url}/api/chat", json={
+                        'message': MESSAGES[i % len(MESSAGES)], 'session_id': session_id
+                    }) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session() for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[25, 100, 400])
+    parser.add_argument('--turns', type=int, default=3, help='messages per session')
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--sync-threads', type=int, default=32)
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    llm_server, llm_url = start_mock_server(latency=args.llm_latency)
+    for model in Config.AI_MODELS:
+        model['endpoint'] = llm_url
+    os.environ.setdefault('GITHUB_TOKEN', 'bench')
+    Config.SECRET_KEY = Config.SECRET_KEY or 'bench'
+    # Every turn must reach the model; identical prompts would otherwise be served from cache
+    Config.RESPONSE_CACHE_ENABLED = False
+    Config.LLM_POOL_MAXSIZE = max(Config.LLM_POOL_MAXSIZE, max(args.sessions))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    db, cleanup = open_database(args.mongo_uri)
+    from manage import seed_products
+    seed_products(db, log=lambda *a: None)
+
+    servers = [
+        (f"sync ({args.sync_threads} threads)", start_sync(db, args.sync_threads)),
+        ("async", start_async(db)),
+    ]
+    print(f"LLM latency {args.llm_latency * 1000:.0f} ms, {args.turns} turns per session")
+    print(f"{'mode':<20} {'sessions':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    try:
+        for sessions in args.sessions:
+            for label, (base_url, _) in servers:
+                latencies, errors, elapsed = asyncio.run(run_sessions(base_url, sessions, args.turns))
+                print(f"{label:<20} {sessions:>8} {len(latencies) / elapsed:>8.1f} "
+                      f"{percentile(latencies, 50) or 0:>8.0f} {percentile(latencies, 95) or 0:>8.0f} {errors:>7}")
+    finally:
+        for _, (_, stop) in servers:
+            stop()
+        llm_server.shutdown()
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""CatalogIndex vs. the Mongo $regex path of Product.find_by_query_and_preferences.
+
+Without --mongo-uri the Mongo side is a Python collection scan that applies
+the same case-insensitive regex filters document by document, which is what
+the unindexable $regex query makes mongod do. With --mongo-uri the catalog is
+written to a scratch collection and the real query is timed.
+
+    python -m benchmarks.bench_catalog_index --products 100000
+    python -m benchmarks.bench_catalog_index --products 100000 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import re
+import time
+
+from benchmarks.catalog_data import synthetic_products
+from services.catalog_index import CatalogIndex
+
+QUERIES = [
+    ('laptop', {}),
+    ('gaming laptop', {'brand_preference': 'Asus'}),
+    ('ultrabook', {'exclude_brand': 'Apple'}),
+    ('business', {'brand_preference': 'Lenovo', 'ram': '32GB'}),
+    ('workstation', {'brand_preference': 'Razer'}),
+]
+
+
+def mongo_query(query, preferences):
+    # The filter Product.find_by_query_and_preferences sends to MongoDB
+    mongo_query = {}
+    if query:
+        mongo_query['category'] = {'$regex': query, '$options': 'i'}
+    if preferences.get('brand_preference'):
+        mongo_query['brand'] = {'$regex': preferences['brand_preference'], '$options': 'i'}
+    if preferences.get('ram'):
+        mongo_query['specs.ram'] = {'$regex': preferences['ram'], '$options': 'i'}
+    if preferences.get('exclude_brand'):
+        mongo_query['brand'] = {'$not': {'$regex': preferences['exclude_brand'], '$options': 'i'}}
+    return mongo_query
+
+
+def scan(products, query, preferences):
+    filters = []
+    for field, condition in mongo_query(query, preferences).items():
+        negate = '$not' in condition
+        regex = re.compile((condition['$not'] if negate else condition)['$regex'], re.IGNORECASE)
+        filters.append((field, regex, negate))
+    results = []
+    for doc in products:
+        for field, regex, negate in filters:
+            value = doc['specs'].get('ram') if field == 'specs.ram' else doc.get(field)
+            matched = isinstance(value, str) and regex.search(value) is not None
+            if matched == negate:
+                break
+        else:
+            results.append(dict(doc))
+    return results
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=3, help='result limit for the limited index query')
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    products = list(synthetic_products(args.products))
+    start = time.perf_counter()
+    index = CatalogIndex()
+    index.load(products)
+    print(f"{args.products} products, index built in {time.perf_counter() - start:.2f}s")
+
+    collection = None
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(args.mongo_uri)['chatbot_benchmarks']['products']
+        collection.drop()
+        collection.insert_many([dict(p) for p in products])
+
+    for query, preferences in QUERIES:
+        if collection is not None:
+            baseline, expected = timed(lambda: list(collection.find(mongo_query(query, preferences))), 3)
+            label = 'mongo'
+        else:
+            baseline, expected = timed(lambda: scan(products, query, preferences), 3)
+            label = 'scan'
+        indexed, found = timed(lambda: index.find_by_query_and_preferences(query, preferences), args.repeat)
+        limited, _ = timed(lambda: index.find_by_query_and_preferences(query, preferences, limit=args.limit),
+                           args.repeat)
+        same = [d['_id'] for d in found] == [d['_id'] for d in expected]
+        print(f"  {query!r:16} {str(preferences):42} {len(found):6} hits  "
+              f"{label} {baseline * 1000:8.2f} ms  index {indexed * 1000:8.2f} ms  "
+              f"index limit={args.limit} {limited * 1e6:8.1f} us  same={same}")
+
+    if collection is not None:
+        collection.drop()
+
+
+if __name__ == '__main__':
+    main()
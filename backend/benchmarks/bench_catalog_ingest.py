@@ -0,0 +1,80 @@
+"""Catalog ingestion throughput: parsing alone, then loads at several batch sizes.
+
+Writes a synthetic catalog (benchmarks.catalog_data) as CSV and JSONL,
+measures how fast read_rows + normalize_product get through each, then
+loads the CSV with CatalogIngest once per --batch-sizes value into a fresh
+database: a first load (inserts) and a second one of the same file
+(updates), reporting rows per second. Use --mongo-uri for numbers that
+mean anything; mongomock keeps every write in Python.
+
+    python -m benchmarks.bench_catalog_ingest --products 100000 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.catalog_data import synthetic_products
+from benchmarks.load_test import open_database
+from migrations import run_migrations
+from models.product import Product
+from services.catalog_ingest import CatalogIngest, normalize_product, read_rows
+
+CSV_FIELDS = ('sku', 'name', 'brand', 'price', 'category', 'description', 'image_url', 'in_stock', 'rating', 'color',
+              'tags', 'specs.processor', 'specs.ram', 'specs.storage', 'specs.screen', 'specs.graphics')
+
+
+def write_catalog(directory, count):
+    csv_path = os.path.join(directory, 'catalog.csv')
+    jsonl_path = os.path.join(directory, 'catalog.jsonl')
+    with open(csv_path, 'w', newline='') as csv_file, open(jsonl_path, 'w') as jsonl_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_FIELDS)
+        for doc in synthetic_products(count):
+            del doc['_id']
+            row = dict(doc, tags='|'.join(doc['tags']), **{f'specs.{k}': v for k, v in doc['specs'].items()})
+            writer.writerow([row[field] for field in CSV_FIELDS])
+            jsonl_file.write(json.dumps(doc) + '\n')
+    return csv_path, jsonl_path
+
+
+def parse_rate(path):
+    start = time.perf_counter()
+    rows = sum(1 for row, _ in read_rows(path) if normalize_product(row))
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--batch-sizes', default='100,1000,5000')
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='catalog-')
+    try:
+        csv_path, jsonl_path = write_catalog(directory, args.products)
+        print(f"{args.products} products: CSV {os.path.getsize(csv_path) / 1e6:.1f} MB, "
+              f"JSONL {os.path.getsize(jsonl_path) / 1e6:.1f} MB")
+        print(f"read + normalize: CSV {parse_rate(csv_path):.0f} rows/s, JSONL {parse_rate(jsonl_path):.0f} rows/s")
+
+        print(f"\n{'batch size':>10} {'insert rows/s':>14} {'update rows/s':>14}")
+        for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+            db, cleanup = open_database(args.mongo_uri)
+            try:
+                run_migrations(db, log=lambda *a: None)
+                loader = CatalogIngest(Product(db), batch_size=batch_size, log=lambda *a: None)
+                inserted = loader.run(csv_path, resume=False)
+                updated = loader.run(csv_path, resume=False)
+            finally:
+                cleanup()
+            print(f"{batch_size:>10} {inserted['rows_per_second']:>14} {updated['rows_per_second']:>14}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Wall-clock latency per chat turn with the pipeline stages run serially and concurrently.
+
+Replays the scripted conversations of benchmarks.load_test through
+ChatPipeline.run (as /api/chat does) against a mock LLM with --llm-latency
+seconds per request, once with CONCURRENT_STAGES off and once on. Every turn
+calls the LLM (router and response cache off), so the product lookup and
+customer upsert made during the model call show up in the latency.
+
+Against mongomock, --db-latency adds a simulated network round trip to each
+collection call; with --mongo-uri a real server (a throwaway database on it)
+is used and the option is ignored.
+
+    python -m benchmarks.bench_concurrent_stages --conversations 50 --db-latency 0.004
+    python -m benchmarks.bench_concurrent_stages --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import functools
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.load_test import conversation_script, open_database, percentile
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+
+# mongomock Collection methods the app calls; nested calls (find_one -> find) sleep once
+DB_CALLS = ('find', 'find_one', 'find_one_and_update', 'insert_one', 'insert_many', 'update_one', 'update_many',
+            'delete_one', 'delete_many', 'count_documents', 'aggregate', 'bulk_write')
+
+
+def add_db_latency(latency, jitter=False):
+    """Sleep latency seconds in every mongomock collection call (uniformly 0 to 2 * latency with jitter)."""
+    from mongomock.collection import Collection
+
+    local = threading.local()
+
+    def slow(method):
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            if getattr(local, 'inside', False):
+                return method(*args, **kwargs)
+            local.inside = True
+            try:
+                time.sleep(random.uniform(0, 2 * latency) if jitter else latency)
+                return method(*args, **kwargs)
+            finally:
+                local.inside = False
+        return call
+
+    for name in DB_CALLS:
+        setattr(Collection, name, slow(getattr(Collection, name)))
+
+
+def replay(conversations, concurrent, concurrency, mongo_uri):
+    from manage import seed_products
+    from services.container import Services
+
+    config = type('ReplayConfig', (Config,), {'CONCURRENT_STAGES': concurrent})
+    db, cleanup = open_database(mongo_uri)
+    seed_products(db, log=lambda *a: None)
+    services = Services(db, config)
+    latencies = []
+    stages = {}
+
+    def run(messages):
+        session_id = str(uuid.uuid4())
+        for message in messages:
+            start = time.perf_counter()
+            turn, _ = services.chat_pipeline.run(message, session_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+            for name, ms in turn.timings.items():
+                stages[name] = stages.get(name, 0.0) + ms
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, conversations))
+    if services.stage_pool is not None:
+        services.stage_pool.shutdown()
+    cleanup()
+    return latencies, {name: ms / len(latencies) for name, ms in stages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=50)
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--db-latency', type=float, default=0.004, help='seconds per mongomock collection call')
+    parser.add_argument('--mongo-uri')
+    parser.add_argument('--concurrency', type=int, default=1, help='conversations replayed at once')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conversations = [conversation_script(rng) for _ in range(args.conversations)]
+    if not args.mongo_uri and args.db_latency > 0:
+        add_db_latency(args.db_latency)
+
+    llm_server, llm_url = start_mock_server(latency=args.llm_latency)
+    for model in Config.AI_MODELS:
+        model['endpoint'] = llm_url
+    os.environ.setdefault('GITHUB_TOKEN', 'bench')
+    # Every turn calls the model
+    Config.RESPONSE_CACHE_ENABLED = False
+    Config.ROUTER_ENABLED = False
+    Config.ADMISSION_ENABLED = False
+    Config.LLM_POOL_MAXSIZE = max(Config.LLM_POOL_MAXSIZE, args.concurrency)
+
+    turns = sum(len(messages) for messages in conversations)
+    db = args.mongo_uri or f"mongomock + {args.db_latency * 1000:.1f} ms per call"
+    print(f"{len(conversations)} conversations, {turns} turns, LLM latency {args.llm_latency * 1000:.0f} ms, {db}")
+    print(f"{'stages':<11} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'excl. LLM':>10}")
+    results = {}
+    try:
+        for label, concurrent in (('serial', False), ('concurrent', True)):
+            latencies, stages = replay(conversations, concurrent, args.concurrency, args.mongo_uri)
+            mean = sum(latencies) / len(latencies)
+            results[label] = (mean, mean - stages.get('llm', 0.0))
+            print(f"{label:<11} {mean:>8.1f} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+                  f"{results[label][1]:>10.1f}")
+    finally:
+        llm_server.shutdown()
+
+    (serial, serial_rest), (concurrent, concurrent_rest) = results['serial'], results['concurrent']
+    print(f"\nmean turn latency -{(1 - concurrent / serial) * 100:.0f}%, "
+          f"outside the LLM call -{(1 - concurrent_rest / serial_rest) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
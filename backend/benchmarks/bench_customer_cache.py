@@ -0,0 +1,145 @@
+"""CustomerRepository: consistency under concurrent updates, then the cost of returning customers.
+
+consistency: --threads threads run a random mix of upsert_by_email,
+update, get_by_id and get_by_email on a handful of customers, with a
+jittered simulated round trip on every collection call so reads and
+writes interleave. Afterwards every profile left in the cache must equal
+the document in MongoDB. A second round serializes the writes to each
+customer (reads stay concurrent), which gives the writes an order to
+check reads against: no read may return a profile older than the last
+write that had returned before the read began. The run exits non-zero if
+either check fails.
+
+returning customers: --customers customers come back for --turns turns
+each with the profile the previous turn stored (as ChatPipeline.save_customer
+does), with the customer model alone and with the repository. Every
+turn writes either way; the difference is the cache's own cost.
+
+    python -m benchmarks.bench_customer_cache --threads 16 --ops 500
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_concurrent_stages import add_db_latency
+from benchmarks.load_test import open_database
+from models.Customer import Customer
+from services.customer_repository import CustomerRepository
+from utils.customer_cache import CustomerCache
+from utils.serialization import CUSTOMER_PROFILE
+
+
+def consistency(db, threads, ops, customers, seed, ordered):
+    db.customers.delete_many({'email': {'$regex': '^customer'}})
+    repository = CustomerRepository(Customer(db), CustomerCache(max_entries=customers))
+    emails = [f"customer{i}@example.com" for i in range(customers)]
+    ids = [str(repository.upsert_by_email({'email': email, 'name': f"Customer {i}"})['_id'])
+           for i, email in enumerate(emails)]
+    stamps = iter(range(1, 10 ** 9))
+    stamp_lock = threading.Lock()
+    write_locks = [threading.Lock() if ordered else None for _ in range(customers)]
+    # Per customer, the stamp of the last write that returned; only meaningful when writes are ordered
+    committed = [0] * customers
+    stale_reads = []
+
+    def next_stamp():
+        with stamp_lock:
+            return next(stamps)
+
+    def write(i, op):
+        stamp = next_stamp()
+        if op < 0.75:
+            repository.upsert_by_email({'email': emails[i], 'stamp': stamp, 'budget': f"${stamp}"})
+        else:
+            repository.update(ids[i], {'stamp': stamp, 'budget': f"${stamp}"})
+        committed[i] = stamp
+        return stamp
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        for _ in range(ops):
+            i = rng.randrange(customers)
+            op = rng.random()
+            if op < 0.5:
+                floor = committed[i]
+                doc = repository.get_by_id(ids[i]) if op < 0.25 else repository.get_by_email(emails[i])
+                if ordered and doc.get('stamp', 0) < floor:
+                    stale_reads.append((emails[i], doc.get('stamp'), floor))
+            elif ordered:
+                with write_locks[i]:
+                    write(i, op)
+            else:
+                write(i, op)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    mismatched = []
+    for i, email in enumerate(emails):
+        stored = db.customers.find_one({'email': email})
+        with repository.cache.lock:
+            entry = repository.cache.entries.get(ids[i])
+        if entry is not None and entry.doc != stored:
+            mismatched.append((email, entry.doc.get('stamp'), stored.get('stamp')))
+    return repository.stats(), elapsed, mismatched, stale_reads
+
+
+def returning(db, customers, turns, cached):
+    model = Customer(db)
+    customer_model = CustomerRepository(model, CustomerCache()) if cached else model
+    start = time.perf_counter()
+    for i in range(customers):
+        profile = {'email': f"returning{i}@example.com", 'name': f"Returning {i}", 'looking_for': 'gaming laptop'}
+        for _ in range(turns):
+            profile = customer_model.upsert_by_email(profile, projection=CUSTOMER_PROFILE)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (customers * turns), customer_model.stats() if cached else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=500, help='operations per thread')
+    parser.add_argument('--hot-customers', type=int, default=8, help='customers the threads contend on')
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--db-latency', type=float, default=0.001, help='mean seconds per mongomock call')
+    parser.add_argument('--mongo-uri')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if not args.mongo_uri and args.db_latency > 0:
+        add_db_latency(args.db_latency, jitter=True)
+
+    db, cleanup = open_database(args.mongo_uri)
+    try:
+        print(f"consistency: {args.threads} threads x {args.ops} ops on {args.hot_customers} customers")
+        failures = []
+        for label, ordered in (('concurrent writes', False), ('ordered writes', True)):
+            stats, elapsed, mismatched, stale_reads = consistency(
+                db, args.threads, args.ops, args.hot_customers, args.seed, ordered
+            )
+            failures += mismatched + stale_reads
+            print(f"  {label:<18} {elapsed:.1f}s, hit rate {stats['hit_rate']}, "
+                  f"{stats['discarded']} raced fills discarded; cache entries differing from MongoDB: "
+                  f"{len(mismatched)}" + (f", stale reads: {len(stale_reads)}" if ordered else ''))
+
+        print(f"\nreturning customers: {args.customers} x {args.turns} turns")
+        for label, cached in (('model', False), ('repository', True)):
+            db.customers.delete_many({'email': {'$regex': '^returning'}})
+            ms, stats = returning(db, args.customers, args.turns, cached)
+            extra = f", {stats['customers']} profiles cached" if stats else ''
+            print(f"  {label:<11} {ms:.2f} ms per turn{extra}")
+    finally:
+        cleanup()
+    if failures:
+        print(f"\nINCONSISTENT: {failures[:5]}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
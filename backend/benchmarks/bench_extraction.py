@@ -0,0 +1,160 @@
+"""Micro-benchmark of extract_customer_info over a corpus of chat messages.
+
+Compares the precompiled CustomerInfoExtractor with the original
+implementation (kept below as legacy_extract_customer_info) and checks that
+both produce identical results on every message.
+
+    python -m benchmarks.bench_extraction --rounds 200
+"""
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+from utils.extraction import BRANDS, COLORS, extract_customer_info
+
+CORPUS = [
+    "hi",
+    "hello",
+    "I need a laptop",
+    "Hi, I'm John Smith",
+    "my name is Sarah and I'm looking for a gaming laptop",
+    "John here!",
+    "call me Mike, my email is mike.jones@example.com",
+    "you can reach me at 555-123-4567",
+    "phone: 0 612 345 678",
+    "my number is +44 20 7946 0958",
+    "I want to buy a business laptop for work",
+    "budget is $1,500 and I prefer Dell",
+    "I don't want Apple, maybe something from Lenovo or HP",
+    "no macbook please, I like the thinkpad keyboard",
+    "something in rose gold or silver would be nice",
+    "I'm interested in ultrabook options under budget of 900",
+    "avoid razer, looking for a black msi",
+    "without surface, my budget around $2000.00",
+    "Can you recommend a laptop for video editing? I have a budget of $2500",
+    "email: anna_k@mail.co.uk phone 06123456789",
+    "I'd like a grey Asus or an Acer, not white",
+    "purchase an ultrabook",
+    "get some notebook for college, preferably blue",
+    "I am looking for a red laptop, no hp",
+    "what do you have in stock?",
+]
+
+WORDS = ['i', 'am', "i'm", 'my', 'name', 'is', 'want', 'need', 'no', 'not', 'avoid', "don't", 'without',
+         'budget', '$1,200', 'laptop', 'gaming', 'phone', '555-123-4567', 'a@b.io', 'bored', 'required',
+         'looking', 'for', 'buy', 'get', '!', '.', ','] + BRANDS + COLORS
+
+
+def legacy_extract_customer_info(message, conversation_id, existing_customer_data=None):
+    # The pre-engine implementation, kept for comparison
+    customer_data = existing_customer_data.copy() if existing_customer_data else {}
+    message_lower = message.lower()
+    if not customer_data.get('name'):
+        name_patterns = [
+            r'(?:my name is|i am|i\'m|call me|name is)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
+            r'^([a-zA-Z]+)(?:\s+[a-zA-Z]+)?\s*(?:here|!|\.|\s*$)',
+            r'(?:i\'m|im)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)'
+        ]
+        for pattern in name_patterns:
+            name_match = re.search(pattern, message, re.IGNORECASE)
+            if name_match:
+                name = name_match.group(1).strip().title()
+                if name.lower() not in ['looking', 'searching', 'need', 'want', 'here', 'hello', 'hi']:
+                    customer_data['name'] = name
+                    break
+    if not customer_data.get('email'):
+        email_match = re.search(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', message)
+        if email_match:
+            customer_data['email'] = email_match.group(1)
+    if not customer_data.get('phone'):
+        phone_patterns = [
+            r'(?:phone|number|tel|mobile|call)\s*:?0\s*([0-9\s\-\(\)\+]{7,})',
+            r'([0-9]{3}[-\s]?[0-9]{3}[-\s]?[0-9]{4})',
+            r'(\+[0-9\s\-\(\)]{10,})',
+            r'([0-9]{6,})'
+        ]
+        for pattern in phone_patterns:
+            phone_match = re.search(pattern, message, re.IGNORECASE)
+            if phone_match:
+                customer_data['phone'] = phone_match.group(1).strip()
+                break
+    if not customer_data.get('looking_for'):
+        looking_patterns = [
+            r'(?:looking for|need|want|searching for|interested in)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
+            r'(?:buy|purchase|get)\s+(?:a|an|some)?\s*([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
+            r'(laptop|computer|gaming laptop|business laptop|ultrabook|notebook)',
+        ]
+        for pattern in looking_patterns:
+            looking_match = re.search(pattern, message, re.IGNORECASE)
+            if looking_match:
+                customer_data['looking_for'] = looking_match.group(1).strip().lower()
+                break
+    if not customer_data.get('budget'):
+        budget_match = re.search(r'budget\s*(?:is|of|around)?\s*\$?(\d+(?:,\d{3})*(?:\.\d{2})?)', message, re.IGNORECASE)
+        if budget_match:
+            customer_data['budget'] = f"${budget_match.group(1)}"
+    if not customer_data.get('brand_preference'):
+        for brand in BRANDS:
+            if re.search(rf'\b{brand}\b', message_lower) and not re.search(rf"(don\'t want|no|avoid|not|without)\s+{brand}", message_lower):
+                customer_data['brand_preference'] = brand.title()
+                break
+    if not customer_data.get('exclude_brand'):
+        for brand in BRANDS:
+            if re.search(rf"(don\'t want|no|avoid|not|without)\s+{brand}", message_lower):
+                customer_data['exclude_brand'] = brand.title()
+                break
+    if not customer_data.get('color_preference'):
+        for color in COLORS:
+            if color in message_lower:
+                customer_data['color_preference'] = color.title()
+                break
+    customer_data['conversation_id'] = conversation_id
+    customer_data['timestamp'] = datetime.now(timezone.utc).isoformat()
+    return customer_data
+
+
+def random_messages(count, seed=7):
+    rng = random.Random(seed)
+    glue = ['', ' ', '  ', ', ']
+    return [
+        ''.join(rng.choice(WORDS) + rng.choice(glue) for _ in range(rng.randint(1, 14)))
+        for _ in range(count)
+    ]
+
+
+def check_identical(messages):
+    for message in messages:
+        new = extract_customer_info(message, 'c1')
+        new.pop('timestamp')
+        old = legacy_extract_customer_info(message, 'c1')
+        old.pop('timestamp')
+        if new != old:
+            raise AssertionError(f"Mismatch for {message!r}: {new} != {old}")
+
+
+def time_per_call(fn, messages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            fn(message, 'c1')
+    return (time.perf_counter() - start) / (rounds * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--fuzz', type=int, default=20000, help='random messages for the equivalence check')
+    args = parser.parse_args()
+
+    check_identical(CORPUS + random_messages(args.fuzz))
+    print(f"identical results on {len(CORPUS) + args.fuzz} messages")
+
+    legacy = time_per_call(legacy_extract_customer_info, CORPUS, args.rounds)
+    engine = time_per_call(extract_customer_info, CORPUS, args.rounds)
+    print(f"per message: legacy {legacy * 1e6:7.1f} us   engine {engine * 1e6:7.1f} us   ({legacy / engine:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Requests per second against a local mock /chat/completions server.
+
+Compares the old bare ``requests.post`` call with the pooled ``LLMClient``
+and the aiohttp-based ``AsyncLLMClient``.
+
+    python -m benchmarks.bench_llm_client --requests 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.mock_llm_server import start_mock_server
+from services.ai_service import AsyncLLMClient, LLMClient, _build_chat_request
+
+MESSAGES = [
+    {"role": "system", "content": "You are a friendly virtual assistant for LaptopStore."},
+    {"role": "user", "content": "hi, I need a laptop"}
+]
+
+
+def bare_post(messages, model_config):
+    # The pre-pooling implementation: a new connection per call, no timeout
+    url, headers, body = _build_chat_request(messages, model_config)
+    response = requests.post(url, headers=headers, json=body)
+    return response.json()['choices'][0]['message']['content']
+
+
+def run_threaded(call, total, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: call(), range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def run_async(client, model_config, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await client.chat_completion(MESSAGES, model_config)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0, help='mock server latency in seconds')
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency)
+    model_config = {"endpoint": url, "model": "mock/model", "token": "test"}
+
+    results = {}
+    results['bare requests.post'] = run_threaded(
+        lambda: bare_post(MESSAGES, model_config), args.requests, args.concurrency)
+    client = LLMClient(pool_maxsize=args.concurrency)
+    results['LLMClient (pooled)'] = run_threaded(
+        lambda: client.chat_completion(MESSAGES, model_config), args.requests, args.concurrency)
+    client.close()
+    results['AsyncLLMClient'] = asyncio.run(
+        run_async(AsyncLLMClient(pool_maxsize=args.concurrency), model_config, args.requests, args.concurrency))
+    server.shutdown()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    for name, rps in results.items():
+        print(f"  {name:<22} {rps:10.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Chat latency under overload, with and without admission control.
+
+A mock LLM that answers 429 once more than --llm-capacity requests are in
+flight stands in for a rate-limited model API. The async app
+(async_app.py) is then offered an open-loop arrival rate of --rate chat
+requests per second for --duration seconds, once with ADMISSION_ENABLED
+off and once with the admission controller bounding turns in flight to
+--max-concurrent with a --max-queue queue.
+
+Without admission every request goes to the model API: the overflow is
+rate limited, waits out Retry-After and retries, so latency climbs by
+seconds and turns whose retries run out fail. With admission the overflow
+is answered 429 with Retry-After in a few milliseconds and the admitted
+turns keep their latency.
+
+    python -m benchmarks.bench_overload --rate 120 --llm-capacity 20 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+import aiohttp
+
+from benchmarks.bench_async_serving import start_async
+from benchmarks.load_test import open_database, percentile
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+
+
+async def offer_load(base_url, rate, duration):
+    """Send one chat request every 1/rate seconds; returns [(status, latency ms)]."""
+    results = []
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=120)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        async def one():
+            start = time.perf_counter()
+            try:
+                async with http.post(f"{base_url}/api/chat", json={
+                    'message': "I'm looking for a gaming laptop", 'session_id': str(uuid.uuid4())
+                }) as response:
+                    await response.read()
+                    status = response.status
+            except aiohttp.ClientError:
+                status = None
+            results.append((status, (time.perf_counter() - start) * 1000))
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rate * duration)):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one()))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def report(label, results, duration):
+    ok = [ms for status, ms in results if status == 200]
+    rejected = [ms for status, ms in results if status == 429]
+    failed = len(results) - len(ok) - len(rejected)
+    print(f"{label:<18} {len(ok) / duration:>9.1f} {percentile(ok, 50) or 0:>8.0f} {percentile(ok, 95) or 0:>8.0f} "
+          f"{len(rejected):>6} {percentile(rejected, 95) or 0:>9.0f} {failed:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=120, help='offered chat requests per second')
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--llm-capacity', type=int, default=20, help='requests the mock LLM serves at once')
+    parser.add_argument('--max-concurrent', type=int, default=20)
+    parser.add_argument('--max-queue', type=int, default=40)
+    parser.add_argument('--queue-timeout', type=float, default=2.0)
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    llm_server, llm_url = start_mock_server(latency=args.llm_latency, max_concurrent=args.llm_capacity)
+    for model in Config.AI_MODELS:
+        model['endpoint'] = llm_url
+    os.environ.setdefault('GITHUB_TOKEN', 'bench')
+    Config.SECRET_KEY = Config.SECRET_KEY or 'bench'
+    Config.RESPONSE_CACHE_ENABLED = False
+    Config.LLM_POOL_MAXSIZE = max(Config.LLM_POOL_MAXSIZE, int(args.rate * args.llm_latency * 4))
+    logging.getLogger('aiohttp').setLevel(logging.CRITICAL)
+
+    db, cleanup = open_database(args.mongo_uri)
+    from manage import seed_products
+    seed_products(db, log=lambda *a: None)
+
+    runs = [
+        ('no admission', {'ADMISSION_ENABLED': False}),
+        ('admission', {
+            'ADMISSION_ENABLED': True,
+            'ADMISSION_MAX_CONCURRENT': args.max_concurrent,
+            'ADMISSION_MAX_QUEUE': args.max_queue,
+            'ADMISSION_QUEUE_TIMEOUT': args.queue_timeout,
+            'SESSION_RATE_LIMIT': '',
+        }),
+    ]
+    capacity = args.llm_capacity / args.llm_latency
+    print(f"offered {args.rate:.0f} req/s for {args.duration:.0f} s; LLM capacity ~{capacity:.0f} req/s "
+          f"({args.llm_capacity} in flight x {args.llm_latency * 1000:.0f} ms)")
+    print(f"{'mode':<18} {'ok req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'429s':>6} {'429 p95':>9} {'errors':>7}")
+    try:
+        for label, overrides in runs:
+            # A fresh app per run, so circuit breakers start closed
+            base_url, stop = start_async(db, type('BenchConfig', (Config,), overrides))
+            try:
+                results = asyncio.run(offer_load(base_url, args.rate, args.duration))
+            finally:
+                stop()
+            report(label, results, args.duration)
+    finally:
+        llm_server.shutdown()
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Prompt size and assembly time over synthetic 50-turn conversations.
+
+Replays each conversation turn by turn the way the chat pipeline does
+(the messages the summary does not cover yet from the database, rolling
+summary carried between turns)
+and compares three strategies:
+
+    full      every previous message, verbatim
+    last-5    the five most recent messages (the original behaviour)
+    budgeted  PromptBuilder with the configured token budget and summary
+
+    python -m benchmarks.bench_prompt_builder --conversations 50 --turns 50
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+from services.ai_service import AIService
+from services.prompt_builder import PromptBuilder, _REPLY_PRIMING, message_tokens
+
+USER_LINES = [
+    "I'm looking for a laptop for video editing",
+    "my budget is around $1,800, maybe a bit more if it's worth it",
+    "does it come in silver? I don't really like black",
+    "what about battery life when travelling, I fly a lot for work",
+    "I don't want Apple, something from Dell or Lenovo would be nice",
+    "how much RAM do I need for 4K timelines in Premiere Pro?",
+    "can you compare the XPS 15 with the ThinkPad X1 Extreme",
+    "is the screen good for colour grading work",
+    "ok and what's the warranty like on those",
+    "thanks, can you show me something lighter too",
+]
+BOT_LINES = [
+    "Great choice! For video editing I'd recommend at least 32GB of RAM and a dedicated GPU. "
+    "Here are a few options that fit your budget and preferences.",
+    "The Dell XPS 15 has a 3.5K OLED display that covers 100% of DCI-P3, which is excellent for "
+    "colour work, and it weighs about 1.9kg.",
+    "Both models offer a one-year standard warranty with optional upgrades to three years of "
+    "on-site support. Would you like me to add that to the comparison?",
+    "Battery life on these machines is typically 8 to 11 hours of light use; heavy rendering "
+    "will drain it much faster, so the charger is worth keeping handy.",
+]
+
+
+def synthetic_conversation(turns, rng):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    messages = []
+    for i in range(turns):
+        for offset, (kind, lines) in enumerate((('user', USER_LINES), ('bot', BOT_LINES))):
+            messages.append({
+                'type': kind,
+                'content': rng.choice(lines),
+                'timestamp': (start + timedelta(seconds=10 * i + offset)).isoformat()
+            })
+    return messages
+
+
+def count(system_prompt, history, user_message):
+    messages = [{"role": "system", "content": system_prompt}]
+    messages += [{"role": "user", "content": m['content']} for m in history]
+    messages.append({"role": "user", "content": user_message})
+    return sum(message_tokens(m) for m in messages) + _REPLY_PRIMING
+
+
+def replay(conversation, strategy, builder, system_prompt, fetch):
+    sizes = []
+    elapsed = 0.0
+    summary, summary_until = '', None
+    for i in range(0, len(conversation), 2):
+        user_message = conversation[i]['content']
+        previous = conversation[:i]
+        start = time.perf_counter()
+        if strategy == 'full':
+            tokens = count(system_prompt, previous, user_message)
+        elif strategy == 'last-5':
+            tokens = count(system_prompt, previous[-5:], user_message)
+        else:
+            unfolded = [m for m in previous if summary_until is None or m['timestamp'] > summary_until]
+            prompt = builder.build(system_prompt, unfolded[-fetch:], user_message, summary, summary_until)
+            summary, summary_until = prompt.summary, prompt.summary_until
+            tokens = prompt.tokens
+        elapsed += time.perf_counter() - start
+        sizes.append(tokens)
+    return sizes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--max-tokens', type=int, default=Config.PROMPT_MAX_TOKENS)
+    parser.add_argument('--summary-tokens', type=int, default=Config.PROMPT_SUMMARY_TOKENS)
+    parser.add_argument('--max-messages', type=int, default=Config.PROMPT_HISTORY_MESSAGES)
+    parser.add_argument('--fetch', type=int, default=Config.PROMPT_HISTORY_FETCH)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    conversations = [synthetic_conversation(args.turns, rng) for _ in range(args.conversations)]
+    builder = PromptBuilder(max_tokens=args.max_tokens, summary_tokens=args.summary_tokens,
+                            max_messages=args.max_messages)
+    # The real system prompt, taken from a prompt with no history
+    system_prompt = AIService(prompt_builder=builder)._build_prompt('').messages[0]['content']
+
+    print(f"{args.conversations} conversations x {args.turns} turns, budget {args.max_tokens} tokens")
+    print(f"{'strategy':<10} {'mean tok':>9} {'last turn':>10} {'max tok':>8} {'us/turn':>8}")
+    for strategy in ('full', 'last-5', 'budgeted'):
+        sizes, last, elapsed = [], [], 0.0
+        for conversation in conversations:
+            turn_sizes, turn_elapsed = replay(conversation, strategy, builder, system_prompt, args.fetch)
+            sizes += turn_sizes
+            last.append(turn_sizes[-1])
+            elapsed += turn_elapsed
+        print(f"{strategy:<10} {statistics.mean(sizes):>9.0f} {statistics.mean(last):>10.0f} "
+              f"{max(sizes):>8} {elapsed / len(sizes) * 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""ProductRanker (NumPy columns + argpartition) vs ranking documents in Python.
+
+The Python side takes every match from CatalogIndex, scores each document
+with the same formula in plain Python and sorts; the NumPy side is
+ProductRanker.top_k. Both must return the same products.
+
+    python -m benchmarks.bench_ranking --products 100000
+"""
+import argparse
+import math
+import time
+
+from benchmarks.catalog_data import synthetic_products
+from services.catalog_index import CatalogIndex
+from services.product_ranker import (
+    OUT_OF_STOCK_FACTOR, OVER_BUDGET_TOLERANCE, WEIGHTS, ProductRanker, parse_budget, parse_gb
+)
+
+REQUESTS = [
+    ('gaming laptop', {'budget': '$1,500', 'color_preference': 'Black'}),
+    ('laptop', {}),
+    ('ultrabook', {'exclude_brand': 'Apple', 'budget': '$900'}),
+    ('business laptop', {'brand_preference': 'Lenovo', 'budget': '$2,000', 'color_preference': 'Silver'}),
+    ('workstation', {'brand_preference': 'Razer', 'budget': '$3000'}),
+]
+
+
+def python_top_k(index, query, preferences, k, catalog_tags, max_ram, max_storage):
+    budget = parse_budget(preferences.get('budget'))
+    color = (preferences.get('color_preference') or '').lower()
+    words = set(query.lower().split())
+
+    def score(doc):
+        s = WEIGHTS['rating'] * doc['rating'] / 5.0
+        if budget:
+            price = doc['price']
+            if price <= budget:
+                s += WEIGHTS['budget'] * (0.5 + 0.5 * min(max(price / budget, 0.0), 1.0))
+            else:
+                s += WEIGHTS['budget'] * 0.5 * min(max(1 - (price - budget) / (OVER_BUDGET_TOLERANCE * budget), 0.0), 1.0)
+        else:
+            s += WEIGHTS['budget'] * 0.5
+        tags = {t.lower() for t in doc['tags']}
+        wanted = [w for w in words if w in catalog_tags]
+        if wanted:
+            s += WEIGHTS['tags'] * sum(w in tags for w in wanted) / len(wanted)
+        ram = math.log2(1 + parse_gb(doc['specs']['ram']))
+        storage = math.log2(1 + parse_gb(doc['specs']['storage']))
+        s += WEIGHTS['specs'] * (0.5 * ram / max_ram + 0.5 * storage / max_storage)
+        if color and doc['color'].lower() == color:
+            s += WEIGHTS['color']
+        return s if doc['in_stock'] else s * OUT_OF_STOCK_FACTOR
+
+    matches = index.find_by_query_and_preferences(query, preferences)
+    return sorted(matches, key=lambda d: -score(d))[:k]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    index = CatalogIndex()
+    index.load(synthetic_products(args.products))
+    ranker = ProductRanker()
+    build_ms, _ = timed(lambda: ranker._rebuild(index), 1)
+    catalog_tags = set(ranker.columns.tag_bit)
+    max_ram = max(math.log2(1 + parse_gb(d['specs']['ram'])) for d in index.docs.values())
+    max_storage = max(math.log2(1 + parse_gb(d['specs']['storage'])) for d in index.docs.values())
+
+    print(f"{args.products} products, column build {build_ms:.0f} ms (once per catalog change, in the background)")
+    print(f"{'query':<18} {'matches':>8} {'python ms':>10} {'numpy ms':>9} {'same':>5}")
+    for query, preferences in REQUESTS:
+        matches = len(index.find_by_query_and_preferences(query, preferences))
+        python_ms, expected = timed(
+            lambda: python_top_k(index, query, preferences, args.k, catalog_tags, max_ram, max_storage), max(1, args.repeat // 10)
+        )
+        numpy_ms, ranked = timed(lambda: ranker.top_k(index, query, preferences, args.k), args.repeat)
+        same = [d['_id'] for d in expected] == [d['_id'] for d in ranked]
+        print(f"{query:<18} {matches:>8} {python_ms:>10.1f} {numpy_ms:>9.2f} {'yes' if same else 'NO':>5}")
+
+
+if __name__ == '__main__':
+    main()
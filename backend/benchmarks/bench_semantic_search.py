@@ -0,0 +1,91 @@
+"""SemanticIndex on a synthetic catalog: build, reopen, incremental inserts, query latency and recall.
+
+Each query phrase comes with a relevance rule over the generated fields
+(tags, the "Great for ..." use in the description, specs). recall@k is the
+share of the top k that is relevant, out of min(k, relevant products). The
+"regex" column is what the category match of find_by_query_and_preferences
+finds for the same phrase.
+
+    python -m benchmarks.bench_semantic_search --products 100000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from benchmarks.catalog_data import synthetic_products
+from benchmarks.load_test import percentile
+from services.catalog_index import CatalogIndex
+from services.semantic_search import SemanticIndex
+
+QUERIES = [
+    ('something light for college',
+     lambda d: 'lightweight' in d['tags'] and d['description'].endswith('college.')),
+    ('video editing machine', lambda d: 'video editing' in d['description']),
+    ('oled touchscreen for travel',
+     lambda d: 'oled' in d['tags'] and 'touchscreen' in d['tags'] and d['description'].endswith('travel.')),
+    ('esports rig with an rtx 4080',
+     lambda d: 'esports' in d['description'] and d['specs']['graphics'] == 'NVIDIA RTX 4080'),
+    ('long battery for programming', lambda d: 'long-battery' in d['tags'] and 'programming' in d['description']),
+    ('durable chromebook for students', lambda d: d['category'] == 'chromebook' and 'durable' in d['tags']),
+]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--inserts', type=int, default=500, help='products added after the build')
+    args = parser.parse_args()
+
+    docs = list(synthetic_products(args.products + args.inserts))
+    catalog, inserts = docs[:args.products], docs[args.products:]
+    index = CatalogIndex()
+    index.load(catalog)
+    path = tempfile.mkdtemp(prefix='semantic-')
+    try:
+        semantic = SemanticIndex(path=path)
+        build_ms, _ = timed(lambda: semantic.sync(index))
+        reopened = SemanticIndex(path=path)
+        open_ms, _ = timed(lambda: reopened.sync(index))
+        assert reopened.opened_from_disk
+        matrix = semantic.snapshot.matrix
+        print(f"{args.products} products, {len(matrix.rows)} postings")
+        print(f"build and save {build_ms:.0f} ms, reopen memory-mapped {open_ms:.0f} ms")
+
+        for doc in inserts:
+            index.upsert(doc)
+        insert_ms, _ = timed(lambda: semantic.sync(index))
+        print(f"{len(inserts)} inserted products indexed incrementally in {insert_ms:.0f} ms")
+
+        by_id = {doc['_id']: doc for doc in docs}
+        print(f"\n{'query':<32} {'regex':>6} {'relevant':>9} {'p50 ms':>7} {'p95 ms':>7} {'recall@' + str(args.k):>10}")
+        for text, relevant in QUERIES:
+            regex = len(index.find_by_query_and_preferences(text, {}))
+            total = sum(1 for doc in docs if relevant(doc))
+            latencies = []
+            for _ in range(args.repeat):
+                ms, hits = timed(lambda: semantic.search(text, k=args.k))
+                latencies.append(ms)
+            found = sum(1 for product_id, _ in hits if relevant(by_id[product_id]))
+            recall = found / min(args.k, total) if total else 0.0
+            print(f"{text:<32} {regex:>6} {total:>9} {percentile(latencies, 50):>7.2f} "
+                  f"{percentile(latencies, 95):>7.2f} {recall:>10.2f}")
+
+        allowed = {str(doc['_id']) for doc in index.query(brand='Lenovo', fields=())}
+        latencies = [timed(lambda: semantic.search(QUERIES[0][0], k=args.k, allowed=allowed))[0]
+                     for _ in range(args.repeat)]
+        print(f"\nwith a brand filter ({len(allowed)} allowed products): p50 {percentile(latencies, 50):.2f} ms")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Bytes and CPU per chat response: full documents + mongo_to_dict vs views.
+
+'before' is the path this replaced: find_by_query_and_preferences returns
+every matching product with every field, mongo_list_to_dicts copies them
+all, the customer is copied with mongo_to_dict, and the response (with 3
+of the products) is encoded by bson.json_util. 'after' asks for at most
+CARD_LIMIT products through the PRODUCT_CARD projection and encodes the
+documents once with utils.serialization.dumps.
+
+"fetched KB" is the BSON size of the documents the query hands back, i.e.
+what crosses the wire from mongod (or is copied out of the catalog index).
+
+    python -m benchmarks.bench_serialization --products 50000
+    python -m benchmarks.bench_serialization --products 50000 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import time
+import uuid
+
+import bson
+from bson import ObjectId, json_util
+
+from benchmarks.bench_catalog_index import QUERIES
+from benchmarks.catalog_data import synthetic_products
+from models.product import Product
+from services.catalog_index import CatalogIndex
+from utils.helpers import mongo_list_to_dicts, mongo_to_dict
+from utils.serialization import CARD_LIMIT, PRODUCT_CARD, dumps
+
+CUSTOMER = {
+    '_id': ObjectId(),
+    'name': 'Sarah Miller',
+    'email': 'sarah.miller1234@example.com',
+    'phone': '555-321-9876',
+    'looking_for': 'gaming laptop',
+    'budget': '$1,500',
+    'conversation_id': str(ObjectId()),
+    'timestamp': '2026-01-01T00:00:00+00:00',
+}
+
+
+def response(products, customer):
+    return {
+        'response': 'Here are some options for you.',
+        'products': products,
+        'session_id': 'bench',
+        'needs_customer_info': False,
+        'customer_info': customer,
+        'missing_info': [],
+        'conversation_id': str(ObjectId()),
+        'prompt_tokens': 300,
+    }
+
+
+def fetch_before(product_model, query, preferences):
+    return product_model.find_by_query_and_preferences(query, preferences)
+
+
+def fetch_after(product_model, query, preferences):
+    return product_model.find_by_query_and_preferences(query, preferences, limit=CARD_LIMIT, projection=PRODUCT_CARD)
+
+
+def before(product_model, query, preferences):
+    products = fetch_before(product_model, query, preferences)
+    products = mongo_list_to_dicts(products) if products else []
+    return json_util.dumps(response(products[:3], mongo_to_dict(CUSTOMER)))
+
+
+def after(product_model, query, preferences):
+    return dumps(response(fetch_after(product_model, query, preferences), CUSTOMER))
+
+
+def measure(path, fetch, product_model, repeat):
+    start = time.perf_counter()
+    body_bytes = 0
+    for _ in range(repeat):
+        for query, preferences in QUERIES:
+            body_bytes += len(path(product_model, query, preferences))
+    n = repeat * len(QUERIES)
+    us = (time.perf_counter() - start) / n * 1e6
+    fetched = sum(len(bson.encode(doc)) for q, p in QUERIES for doc in fetch(product_model, q, p))
+    return us, fetched / len(QUERIES) / 1024, body_bytes / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--mongo-uri', help='also time the MongoDB path on a scratch database')
+    args = parser.parse_args()
+
+    catalog = list(synthetic_products(args.products))
+    index = CatalogIndex()
+    index.load(catalog)
+
+    class Indexed(Product):
+        def __init__(self):
+            self.index = index
+
+        def get_index(self):
+            return self.index
+
+    backends = [('catalog index', Indexed(), None)]
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+        name = f"chatbot_serialization_{uuid.uuid4().hex[:8]}"
+        client[name].products.insert_many([dict(p) for p in catalog])
+        backends.append(('mongodb', Product(client[name]), lambda: client.drop_database(name)))
+
+    print(f"{args.products} products, {len(QUERIES)} queries")
+    print(f"{'backend':<15} {'path':<7} {'us/response':>12} {'fetched KB':>11} {'response B':>11}")
+    try:
+        for label, product_model, _ in backends:
+            for name, path, fetch in (('before', before, fetch_before), ('after', after, fetch_after)):
+                us, fetched_kb, body = measure(path, fetch, product_model, args.repeat)
+                print(f"{label:<15} {name:<7} {us:>12.0f} {fetched_kb:>11.1f} {body:>11.0f}")
+    finally:
+        for _, _, cleanup in backends:
+            if cleanup:
+                cleanup()
+
+
+if __name__ == '__main__':
+    main()
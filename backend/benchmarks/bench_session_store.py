@@ -0,0 +1,108 @@
+"""Per-turn cost of carrying the customer profile between turns.
+
+'cookie' is what app.py did before services/session_store.py: the merged
+customer_data (customer document, timestamps and ids included) goes into
+the signed Flask session cookie, which is verified and decoded on the
+request and re-encoded and signed on the response. The stores instead load
+a compact profile by session_id and write it back only when it changed
+(--change-rate of the turns).
+
+    python -m benchmarks.bench_session_store --turns 20000
+    python -m benchmarks.bench_session_store --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+from benchmarks.load_test import open_database
+from services.session_store import MemorySessionStore, MongoSessionStore
+from utils.helpers import mongo_to_dict
+
+
+def customer_data():
+    # Shape of turn.customer_data after save_customer: the customer document plus per-turn fields
+    now = datetime.now(timezone.utc).isoformat()
+    return mongo_to_dict({
+        '_id': ObjectId(),
+        'name': 'Sarah Miller',
+        'email': 'sarah.miller1234@example.com',
+        'phone': '555-321-9876',
+        'looking_for': 'gaming laptop',
+        'budget': '$1,500',
+        'brand_preference': 'Asus',
+        'color_preference': 'Black',
+        'conversation_id': str(ObjectId()),
+        'timestamp': now,
+        'created_at': now,
+    })
+
+
+def bench_cookie(turns):
+    app = Flask(__name__)
+    app.secret_key = 'bench'
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    data = customer_data()
+    cookie = serializer.dumps({
+        'customer_id': data['_id'], 'conversation_id': data['conversation_id'],
+        'customer_data': data, 'session_id': 'bench-session'
+    })
+    start = time.perf_counter()
+    for _ in range(turns):
+        session = serializer.loads(cookie)
+        session['customer_data']['timestamp'] = datetime.now(timezone.utc).isoformat()
+        cookie = serializer.dumps(session)
+    elapsed = time.perf_counter() - start
+    # Sent with every request and again in every response
+    return elapsed / turns * 1e6, len(cookie)
+
+
+def bench_store(store, turns, change_rate, rng):
+    session_ids = [f"bench-{i}" for i in range(1000)]
+    data = customer_data()
+    for session_id in session_ids:
+        session = store.load(session_id)
+        session.update(data)
+        store.save(session)
+    profiles = {session_id: dict(data) for session_id in session_ids}
+    start = time.perf_counter()
+    for i in range(turns):
+        session_id = session_ids[i % len(session_ids)]
+        session = store.load(session_id)
+        if rng.random() < change_rate:
+            profiles[session_id]['budget'] = f"${rng.randrange(500, 3000)}"
+        session.update(profiles[session_id])
+        store.save(session)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=20000)
+    parser.add_argument('--change-rate', type=float, default=0.2, help='fraction of turns that change the profile')
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    cookie_us, cookie_bytes = bench_cookie(args.turns)
+    print(f"{'backend':<10} {'us/turn':>9} {'cookie bytes':>13} {'writes':>7}")
+    print(f"{'cookie':<10} {cookie_us:>9.1f} {cookie_bytes:>13} {args.turns:>7}")
+
+    db, cleanup = open_database(args.mongo_uri)
+    try:
+        for label, store in [('memory', MemorySessionStore()), ('mongo', MongoSessionStore(db.sessions))]:
+            us = bench_store(store, args.turns, args.change_rate, rng)
+            writes = store.stats()['writes'] - 1000
+            print(f"{label:<10} {us:>9.1f} {0:>13} {writes:>7}")
+        if not args.mongo_uri:
+            print("(mongo ran on mongomock; pass --mongo-uri for real round-trip costs)")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
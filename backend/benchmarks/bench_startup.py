@@ -0,0 +1,70 @@
+"""Worker cold-start benchmark: import time and first-request latency.
+
+Each run starts a fresh interpreter (as a new gunicorn worker would), imports
+app.py, builds a second app with create_app() and times the first requests
+to routes that don't need the database. By default MONGO_URI points at a
+port where nothing listens, to show that startup no longer depends on MongoDB
+being reachable.
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --mongo-uri mongodb://localhost:27017/ecomerce_chatbot
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+second = app_module.create_app()
+created = time.perf_counter()
+client = app_module.app.test_client()
+client.get('/')
+first = time.perf_counter()
+client.get('/api/models/stats')
+stats = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'second_request_ms': (stats - first) * 1000,
+}))
+"""
+
+
+def run_once(env):
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=backend, env=env,
+        capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:1/ecomerce_chatbot')
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URI=args.mongo_uri)
+    env.setdefault('SECRET_KEY', 'bench')
+    env.setdefault('GITHUB_TOKEN', 'bench')
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    print(f"{args.runs} cold starts, MONGO_URI={args.mongo_uri}")
+    print(f"{'phase':<18} {'median ms':>10} {'max ms':>8}")
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms'):
+        values = [run[key] for run in runs]
+        print(f"{key[:-3]:<18} {statistics.median(values):>10.1f} {max(values):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Time to first reply character: blocking completion vs. streamed reply.
+
+Uses AIService against the local mock server, which emits one small delta
+every --token-latency seconds.
+
+    python -m benchmarks.bench_stream_ttft --turns 20 --token-latency 0.01
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+from services.ai_service import AIService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.2, help='mock server time before the first token')
+    parser.add_argument('--token-latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency, token_latency=args.token_latency)
+    for model in Config.AI_MODELS:
+        model['endpoint'] = url
+    os.environ.setdefault('GITHUB_TOKEN', 'test')
+    service = AIService()
+
+    blocking, streamed = [], []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        service.generate_response("hi, I need a laptop")
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for kind, _payload in service.stream_response("hi, I need a laptop"):
+            if kind == 'delta':
+                streamed.append(time.perf_counter() - start)
+                break
+    server.shutdown()
+
+    print(f"time to first reply character over {args.turns} turns (ms)")
+    print(f"  blocking p50 {statistics.median(blocking) * 1000:8.1f}")
+    print(f"  streamed p50 {statistics.median(streamed) * 1000:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
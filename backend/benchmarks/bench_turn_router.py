@@ -0,0 +1,122 @@
+"""Replays chat conversations with the turn router off and on.
+
+Each conversation's user messages are run, in order, through the chat
+pipeline (ChatPipeline.run, as /api/chat does) against a mock LLM with
+--llm-latency seconds per request: once with every turn calling the model
+(ROUTER_ENABLED off), once with the TurnRouter answering the turns the regex
+extraction explains from templates. Reports model API calls, per-turn
+latency and the share of turns that skipped the LLM.
+
+Conversations come from --recorded, a JSONL file with one JSON array of user
+messages per line; from --source-uri, a MongoDB URI whose database holds the
+`messages` collection of a deployment (user messages are grouped by
+conversation in timestamp order); or, by default, from the scripted
+conversations of benchmarks.load_test.
+
+    python -m benchmarks.bench_turn_router --conversations 200 --llm-latency 0.8
+    python -m benchmarks.bench_turn_router --recorded conversations.jsonl
+    python -m benchmarks.bench_turn_router --source-uri mongodb://localhost:27017/ecomerce_chatbot
+"""
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.load_test import conversation_script, open_database, percentile
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+
+
+def recorded_conversations(path):
+    with open(path) as f:
+        return [messages for messages in (json.loads(line) for line in f if line.strip()) if messages]
+
+
+def stored_conversations(uri, limit):
+    from pymongo import MongoClient
+    db = MongoClient(uri).get_default_database()
+    conversations = defaultdict(list)
+    for message in db.messages.find({'type': 'user'}, {'conversation_id': 1, 'content': 1}).sort('timestamp', 1):
+        conversations[message['conversation_id']].append(message['content'])
+    return list(conversations.values())[:limit]
+
+
+def replay(conversations, router_enabled, concurrency, llm_server):
+    from manage import seed_products
+    from services.container import Services
+
+    config = type('ReplayConfig', (Config,), {'ROUTER_ENABLED': router_enabled})
+    db, cleanup = open_database(None)
+    seed_products(db, log=lambda *a: None)
+    services = Services(db, config)
+    latencies = []
+
+    def run(messages):
+        session_id = str(uuid.uuid4())
+        for message in messages:
+            start = time.perf_counter()
+            services.chat_pipeline.run(message, session_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    calls = llm_server.requests
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, conversations))
+    elapsed = time.perf_counter() - start
+    stats = services.router.stats() if services.router is not None else None
+    cleanup()
+    return latencies, llm_server.requests - calls, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--recorded', help='JSONL file, one JSON array of user messages per line')
+    parser.add_argument('--source-uri', help='MongoDB URI of a database with recorded messages')
+    parser.add_argument('--llm-latency', type=float, default=0.8)
+    parser.add_argument('--concurrency', type=int, default=32, help='conversations replayed at once')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.recorded:
+        conversations = recorded_conversations(args.recorded)[:args.conversations]
+    elif args.source_uri:
+        conversations = stored_conversations(args.source_uri, args.conversations)
+    else:
+        rng = random.Random(args.seed)
+        conversations = [conversation_script(rng) for _ in range(args.conversations)]
+
+    llm_server, llm_url = start_mock_server(latency=args.llm_latency)
+    for model in Config.AI_MODELS:
+        model['endpoint'] = llm_url
+    os.environ.setdefault('GITHUB_TOKEN', 'bench')
+    # Every LLM turn must reach the model, and each replay starts from empty sessions
+    Config.RESPONSE_CACHE_ENABLED = False
+    Config.SESSION_STORE = 'memory'
+    Config.ADMISSION_ENABLED = False
+    Config.LLM_POOL_MAXSIZE = max(Config.LLM_POOL_MAXSIZE, args.concurrency)
+
+    turns = sum(len(messages) for messages in conversations)
+    print(f"{len(conversations)} conversations, {turns} turns, LLM latency {args.llm_latency * 1000:.0f} ms")
+    print(f"{'mode':<10} {'LLM calls':>10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'wall s':>7}")
+    results = {}
+    try:
+        for label, enabled in (('llm only', False), ('routed', True)):
+            latencies, calls, elapsed, stats = replay(conversations, enabled, args.concurrency, llm_server)
+            results[label] = (calls, sum(latencies) / len(latencies))
+            print(f"{label:<10} {calls:>10} {results[label][1]:>8.0f} {percentile(latencies, 50):>8.0f} "
+                  f"{percentile(latencies, 95):>8.0f} {elapsed:>7.1f}")
+    finally:
+        llm_server.shutdown()
+
+    (base_calls, base_mean), (calls, mean) = results['llm only'], results['routed']
+    print(f"\nturns by route: {stats['turns']}")
+    print(f"LLM calls -{(1 - calls / base_calls) * 100:.0f}%, mean turn latency -{(1 - mean / base_mean) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Synthetic product catalogs shaped like the seed products in app.py."""
+import random
+
+from bson import ObjectId
+
+BRANDS = ['Apple', 'Dell', 'HP', 'Lenovo', 'ASUS', 'Acer', 'Microsoft', 'Razer', 'MSI', 'Samsung', 'Gigabyte', 'LG']
+CATEGORIES = ['laptop', 'gaming laptop', 'business laptop', 'ultrabook', '2-in-1 laptop', 'workstation', 'chromebook']
+COLORS = ['Black', 'White', 'Silver', 'Gray', 'Space Gray', 'Blue', 'Red', 'Gold', 'Rose Gold', 'Platinum']
+TAGS = ['gaming', 'business', 'student', 'creator', 'portable', 'budget', 'premium', 'touchscreen',
+        'lightweight', 'high-performance', 'durable', 'ultrabook', 'oled', 'long-battery']
+PROCESSORS = ['Intel i5-1240P', 'Intel i7-1360P', 'Intel i9-13900H', 'AMD Ryzen 5 7640U',
+              'AMD Ryzen 7 7840HS', 'AMD Ryzen 9 7940HS', 'Apple M2', 'Apple M3']
+RAM = ['8GB', '16GB', '32GB', '64GB']
+STORAGE = ['256GB SSD', '512GB SSD', '1TB SSD', '2TB SSD']
+USES = ['video editing', 'college', 'travel', 'programming', 'office work', 'esports', 'photo editing', 'streaming']
+
+
+def synthetic_products(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        brand = rng.choice(BRANDS)
+        category = rng.choice(CATEGORIES)
+        ram = rng.choice(RAM)
+        storage = rng.choice(STORAGE)
+        processor = rng.choice(PROCESSORS)
+        tags = rng.sample(TAGS, 3) + [brand.lower()]
+        use = rng.choice(USES)
+        yield {
+            '_id': ObjectId(),
+            'sku': f"SKU-{i:07d}",
+            'name': f"{brand} {rng.choice(['Pro', 'Air', 'Plus', 'Max', 'Slim', 'X'])} {rng.randint(13, 17)} Gen {rng.randint(1, 12)}",
+            'brand': brand,
+            'price': round(rng.uniform(299, 3999), 2),
+            'category': category,
+            'description': f"{category.capitalize()} with {processor}, {ram} RAM, {storage}. Great for {use}.",
+            'specs': {
+                'processor': processor,
+                'ram': ram,
+                'storage': storage,
+                'screen': f"{rng.choice([13.3, 14, 15.6, 16, 17.3])}-inch {rng.choice(['FHD', 'QHD', 'OLED', '4K'])}",
+                'graphics': rng.choice(['Integrated', 'NVIDIA RTX 4060', 'NVIDIA RTX 4080', 'AMD Radeon'])
+            },
+            'image_url': f"https://images.example.com/products/{i:07d}/main-1200x800.jpg?variant=default&quality=90",
+            'in_stock': rng.random() > 0.1,
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'color': rng.choice(COLORS),
+            'tags': tags
+        }
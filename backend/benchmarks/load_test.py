@@ -0,0 +1,291 @@
+"""End-to-end load test of POST /api/chat.
+
+Starts the real app (create_app) on a local HTTP server, points every model
+at the mock OpenAI-compatible server and drives scripted conversations from
+concurrent virtual users. Each user keeps its own cookie session and walks
+through a conversation built from the names, emails, phones, budgets and
+brands that extract_customer_info recognises.
+
+The database is a scratch database on a real mongod with --mongo-uri
+(dropped afterwards), otherwise an in-memory mongomock client
+(pip install mongomock).
+
+Reports latency percentiles, throughput, the error rate and a per-stage
+breakdown taken from the Server-Timing header. --output stores the results
+as JSON; --baseline compares against an earlier file and exits non-zero when
+p95 or throughput regressed by more than --tolerance.
+
+    python -m benchmarks.load_test --users 16 --conversations 200 --llm-latency 0.05
+    python -m benchmarks.load_test --mongo-uri mongodb://localhost:27017 --output run.json
+    python -m benchmarks.load_test --baseline run.json --llm-error-rate 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+from utils.extraction import BRANDS
+
+FIRST_NAMES = ['John', 'Sarah', 'Mike', 'Anna', 'David', 'Laura', 'Omar', 'Mina', 'Peter', 'Julia']
+LAST_NAMES = ['Smith', 'Jones', 'Brown', 'Garcia', 'Miller', 'Hassan', 'Wilson', 'Taylor']
+KINDS = ['gaming laptop', 'business laptop', 'ultrabook', 'laptop for college', 'notebook']
+COLORS = ['black', 'silver', 'white', 'grey', 'blue']
+
+SCRIPTS = [
+    [
+        "hi",
+        "I'm {first}",
+        "my email is {email}",
+        "you can reach me at {phone}",
+        "I'm looking for a {kind}, budget is ${budget}",
+        "I prefer {brand}, ideally in {color}",
+    ],
+    [
+        "Hello! My name is {first} {last}",
+        "I want to buy a {kind} for work",
+        "email: {email} phone {phone}",
+        "I don't want {excluded}, my budget of {budget} is firm",
+    ],
+    [
+        "{first} here!",
+        "I need a {kind}",
+        "budget around ${budget} and no {excluded} please",
+        "contact me at {email}, number {phone}",
+        "something from {brand} would be nice",
+        "thanks, what about battery life?",
+    ],
+]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or '').split(','):
+        name, _, duration = part.strip().partition(';dur=')
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def conversation_script(rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    brand, excluded = rng.sample(BRANDS, 2)
+    values = {
+        'first': first,
+        'last': last,
+        'email': f"{first.lower()}.{last.lower()}{rng.randint(1, 9999)}@example.com",
+        'phone': f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        'kind': rng.choice(KINDS),
+        'budget': f"{rng.randrange(600, 3000, 50):,}",
+        'brand': brand.title(),
+        'excluded': excluded.title(),
+        'color': rng.choice(COLORS),
+    }
+    return [line.format(**values) for line in rng.choice(SCRIPTS)]
+
+
+class LoadTest:
+    def __init__(self, base_url, users, conversations, think_time=0.0, seed=1):
+        self.base_url = base_url
+        self.users = users
+        self.conversations = conversations
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def run(self):
+        scripts = [conversation_script(self.rng) for _ in range(self.conversations)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users) as pool:
+            list(pool.map(self._conversation, scripts))
+        return time.perf_counter() - start
+
+    def _conversation(self, script):
+        http = requests.Session()
+        session_id = str(uuid.uuid4())
+        for message in script:
+            start = time.perf_counter()
+            try:
+                response = http.post(f"{self.base_url}/api/chat", json={'message': message, 'session_id': session_id})
+                sample = {
+                    'latency_ms': (time.perf_counter() - start) * 1000,
+                    'status': response.status_code,
+                    'stages': parse_server_timing(response.headers.get('Server-Timing')),
+                    'round_trips': int(response.headers.get('X-Mongo-Round-Trips', 0)),
+                }
+            except requests.RequestException:
+                sample = {'latency_ms': (time.perf_counter() - start) * 1000, 'status': None, 'stages': {}, 'round_trips': 0}
+            with self.lock:
+                self.samples.append(sample)
+            if self.think_time:
+                time.sleep(self.think_time)
+        http.close()
+
+    def summary(self, elapsed):
+        ok = [s for s in self.samples if s['status'] == 200]
+        latencies = [s['latency_ms'] for s in ok]
+        stages = {}
+        for sample in ok:
+            for name, duration in sample['stages'].items():
+                stages.setdefault(name, []).append(duration)
+        return {
+            'requests': len(self.samples),
+            'errors': len(self.samples) - len(ok),
+            'error_rate': round((len(self.samples) - len(ok)) / len(self.samples), 4) if self.samples else None,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'mean': round(statistics.mean(latencies), 2) if latencies else None,
+                'p50': round(percentile(latencies, 50), 2) if latencies else None,
+                'p95': round(percentile(latencies, 95), 2) if latencies else None,
+                'p99': round(percentile(latencies, 99), 2) if latencies else None,
+                'max': round(max(latencies), 2) if latencies else None,
+            },
+            'mongo_round_trips_mean': round(statistics.mean(s['round_trips'] for s in ok), 2) if ok else None,
+            'stages_ms': {
+                name: {
+                    'mean': round(statistics.mean(values), 3),
+                    'p95': round(percentile(values, 95), 3),
+                }
+                for name, values in stages.items()
+            },
+        }
+
+
+def open_database(mongo_uri):
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+        name = f"chatbot_loadtest_{uuid.uuid4().hex[:8]}"
+        return client[name], lambda: client.drop_database(name)
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("No --mongo-uri given and mongomock is not installed (pip install mongomock)")
+    return mongomock.MongoClient()['chatbot_loadtest'], lambda: None
+
+
+def start_app(db, migrate=False, port=0):
+    # Imported late so the Config overrides made by main() are picked up
+    from app import create_app
+    from manage import seed_products
+    from migrations import run_migrations
+
+    if migrate:
+        run_migrations(db, log=lambda *args: None)
+    seed_products(db, log=lambda *args: None)
+    app = create_app(db=db)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def print_summary(result):
+    latency = result['latency_ms']
+    print(f"requests {result['requests']}  errors {result['errors']}  "
+          f"throughput {result['throughput_rps']} req/s  elapsed {result['elapsed_s']} s")
+    print(f"latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"mongo round trips per request {result['mongo_round_trips_mean']}")
+    print(f"{'stage':<22} {'mean ms':>9} {'p95 ms':>9}")
+    for name, values in result['stages_ms'].items():
+        print(f"{name:<22} {values['mean']:>9.3f} {values['p95']:>9.3f}")
+
+
+def compare(result, baseline, tolerance):
+    """Print the change against a baseline run; returns False on a regression."""
+    ok = True
+    # (label, current, baseline, lower is better, fails the run); p99 is too noisy to gate on
+    checks = [
+        ('p95 latency', result['latency_ms']['p95'], baseline['latency_ms']['p95'], True, True),
+        ('p99 latency', result['latency_ms']['p99'], baseline['latency_ms']['p99'], True, False),
+        ('throughput', result['throughput_rps'], baseline['throughput_rps'], False, True),
+    ]
+    for label, current, previous, lower_is_better, gate in checks:
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        regressed = change > tolerance if lower_is_better else change < -tolerance
+        if regressed and gate:
+            ok = False
+        print(f"{label:<12} {previous:>10} -> {current:<10} {change:+.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--conversations', type=int, default=100, help='scripted conversations to run')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds each user waits between messages')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='mock LLM seconds per request')
+    parser.add_argument('--llm-token-latency', type=float, default=0.0, help='mock LLM seconds per 4-char token')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='fraction of LLM requests that fail')
+    parser.add_argument('--llm-error-status', type=int, default=500)
+    parser.add_argument('--mongo-uri', help='use a scratch database on this mongod instead of mongomock')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative regression')
+    args = parser.parse_args()
+
+    llm_server, llm_url = start_mock_server(
+        latency=args.llm_latency,
+        token_latency=args.llm_token_latency,
+        error_rate=args.llm_error_rate,
+        error_status=args.llm_error_status
+    )
+    for model in Config.AI_MODELS:
+        model['endpoint'] = llm_url
+    os.environ.setdefault('GITHUB_TOKEN', 'load-test')
+    Config.SECRET_KEY = Config.SECRET_KEY or 'load-test'
+
+    db, cleanup = open_database(args.mongo_uri)
+    server, base_url = start_app(db, migrate=bool(args.mongo_uri))
+    try:
+        test = LoadTest(base_url, args.users, args.conversations, args.think_time, args.seed)
+        elapsed = test.run()
+    finally:
+        server.shutdown()
+        llm_server.shutdown()
+        cleanup()
+
+    result = test.summary(elapsed)
+    result['params'] = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    print_summary(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Local OpenAI-compatible /chat/completions server for benchmarks.
+
+Run standalone with ``python -m benchmarks.mock_llm_server --port 8009`` or
+start it in-process with ``start_mock_server()``.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = {
+    "name": "",
+    "email": "",
+    "phone": "",
+    "looking_for": "",
+    "reply": "Welcome to LaptopStore! May I have your name, email, phone number, and what kind of laptop you are looking for?"
+}
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    token_latency = 0.0
+    error_rate = 0.0
+    error_status = 500
+    # Requests beyond this many in flight get an immediate 429, like a rate-limited API; 0 = unlimited
+    max_concurrent = 0
+    reply = json.dumps(DEFAULT_REPLY)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.server.count()
+        length = int(self.headers.get('Content-Length', 0))
+        request_body = json.loads(self.rfile.read(length) or b'{}')
+        if self.max_concurrent:
+            if not self.server.enter(self.max_concurrent):
+                self._error(429)
+                return
+            try:
+                self._complete(request_body)
+            finally:
+                self.server.leave()
+        else:
+            self._complete(request_body)
+
+    def _complete(self, request_body):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._error()
+            return
+        if request_body.get('stream'):
+            try:
+                self._stream()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading early
+                self.close_connection = True
+            return
+        if self.token_latency:
+            # A blocking completion still pays for generating every token
+            time.sleep(self.token_latency * len(range(0, len(self.reply), 4)))
+        payload = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": self.reply}}],
+            "usage": {
+                "prompt_tokens": sum(len(m.get('content', '')) for m in request_body.get('messages', [])) // 4,
+                "completion_tokens": len(self.reply) // 4
+            }
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status=None):
+        status = status or self.error_status
+        payload = json.dumps({"error": {"message": "injected failure", "code": status}}).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self):
+        # Server-sent events, one small content delta per "token"
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(0, len(self.reply), 4):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            event = {"choices": [{"delta": {"content": self.reply[i:i + 4]}}]}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for hundreds of concurrent connections; the default backlog of 5 stalls them on SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        # Completion requests received, including rejected ones
+        self.requests = 0
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+    def enter(self, limit):
+        with self.lock:
+            if self.in_flight >= limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def start_mock_server(port=0, latency=0.0, token_latency=0.0, error_rate=0.0, error_status=500, max_concurrent=0):
+    """Start the mock server on a daemon thread; returns (server, base_url).
+
+    error_rate is the fraction of requests answered with error_status instead
+    of a completion; with max_concurrent set, requests over that many in
+    flight are answered 429.
+    """
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {
+        'latency': latency,
+        'token_latency': token_latency,
+        'error_rate': error_rate,
+        'error_status': error_status,
+        'max_concurrent': max_concurrent
+    })
+    server = MockLLMServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8009)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to sleep per request')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='seconds between streamed deltas')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected failures')
+    parser.add_argument('--max-concurrent', type=int, default=0, help='answer 429 beyond this many requests in flight')
+    args = parser.parse_args()
+    server, url = start_mock_server(
+        args.port, args.latency, args.token_latency, args.error_rate, args.error_status, args.max_concurrent
+    )
+    print(f"Mock LLM server listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
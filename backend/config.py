@@ -8,6 +8,17 @@ class Config:
    MONGO_URI = os.getenv('MONGO_URI')
    GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
    CORS_ORIGINS = os.getenv('CORS_ORIGINS')
+   MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+   SOCKETIO_ENABLED = os.getenv('SOCKETIO_ENABLED', 'false').lower() == 'true'
+   # Where the customer profile lives between turns (services/session_store.py):
+   # 'mongo', 'memory' (one worker process only) or 'cookie' (the signed Flask session)
+   SESSION_STORE = os.getenv('SESSION_STORE', 'mongo')
+   SESSION_TTL = float(os.getenv('SESSION_TTL', 30 * 24 * 3600))
+   SESSION_MEMORY_MAX = int(os.getenv('SESSION_MEMORY_MAX', 100000))
+   # Threads for pymongo calls in the asyncio serving mode (async_app.py)
+   ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', 32))
+   # Prometheus metrics on /metrics (utils/metrics.py)
+   METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
    
    # AI Model Configurations
    AI_MODELS = [
@@ -26,5 +37,103 @@ class Config:
        # Add more models as needed
    ]
 
+   # LLM HTTP client: keep-alive pool per endpoint and request timeouts (seconds)
+   LLM_POOL_CONNECTIONS = int(os.getenv('LLM_POOL_CONNECTIONS', 4))
+   LLM_POOL_MAXSIZE = int(os.getenv('LLM_POOL_MAXSIZE', 32))
+   LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+   LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+
+   # Model routing: attempts per call, EWMA smoothing, circuit breaker and hedging
+   MODEL_RETRY_BUDGET = int(os.getenv('MODEL_RETRY_BUDGET', 3))
+   MODEL_EWMA_ALPHA = float(os.getenv('MODEL_EWMA_ALPHA', 0.2))
+   MODEL_DEGRADED_ERROR_RATE = float(os.getenv('MODEL_DEGRADED_ERROR_RATE', 0.5))
+   MODEL_BREAKER_FAILURES = int(os.getenv('MODEL_BREAKER_FAILURES', 3))
+   MODEL_BREAKER_COOLDOWN = float(os.getenv('MODEL_BREAKER_COOLDOWN', 30))
+   MODEL_BREAKER_PROBES = int(os.getenv('MODEL_BREAKER_PROBES', 1))
+   # A 429 backs the model off for its Retry-After (this many seconds without one) instead of
+   # tripping the breaker; a call waits up to MODEL_RATE_LIMIT_MAX_WAIT for a backed-off model
+   MODEL_RATE_LIMIT_BACKOFF = float(os.getenv('MODEL_RATE_LIMIT_BACKOFF', 1))
+   MODEL_RATE_LIMIT_MAX_WAIT = float(os.getenv('MODEL_RATE_LIMIT_MAX_WAIT', 2))
+   MODEL_HEDGE_ENABLED = os.getenv('MODEL_HEDGE_ENABLED', 'false').lower() == 'true'
+   MODEL_HEDGE_MIN_SAMPLES = int(os.getenv('MODEL_HEDGE_MIN_SAMPLES', 20))
+   MODEL_HEDGE_WORKERS = int(os.getenv('MODEL_HEDGE_WORKERS', 16))
+
+   # Admission control for chat turns (services/admission.py): concurrent turns, wait queue and
+   # per-session rate limit; RATE_LIMIT_STORAGE_URI may point at redis:// to share limits across workers
+   ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+   ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', 64))
+   ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 128))
+   ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10))
+   SESSION_RATE_LIMIT = os.getenv('SESSION_RATE_LIMIT', '30/minute')
+   RATE_LIMIT_STORAGE_URI = os.getenv('RATE_LIMIT_STORAGE_URI', 'memory://')
+   # Per-session single flight (services/single_flight.py): a session's turns run one at a time, in order,
+   # and a request repeating a message still in flight shares its result; waits are bounded in seconds
+   SESSION_FLIGHT_ENABLED = os.getenv('SESSION_FLIGHT_ENABLED', 'true').lower() == 'true'
+   SESSION_FLIGHT_WAIT = float(os.getenv('SESSION_FLIGHT_WAIT', 30))
+   SESSION_FLIGHT_QUEUE = int(os.getenv('SESSION_FLIGHT_QUEUE', 8))
+
+   # In-process product catalog index (services/catalog_index.py)
+   CATALOG_INDEX_ENABLED = os.getenv('CATALOG_INDEX_ENABLED', 'true').lower() == 'true'
+   CATALOG_REFRESH_INTERVAL = float(os.getenv('CATALOG_REFRESH_INTERVAL', 60))
+   # Rank recommendations by budget, rating, tags, specs and color (services/product_ranker.py; needs the index)
+   RANKING_ENABLED = os.getenv('RANKING_ENABLED', 'true').lower() == 'true'
+   # Semantic product search when the category match finds nothing (services/semantic_search.py);
+   # SEMANTIC_INDEX_PATH keeps the vectors on disk, memory-mapped, across restarts
+   SEMANTIC_SEARCH_ENABLED = os.getenv('SEMANTIC_SEARCH_ENABLED', 'true').lower() == 'true'
+   SEMANTIC_INDEX_PATH = os.getenv('SEMANTIC_INDEX_PATH')
+   SEMANTIC_MIN_SCORE = float(os.getenv('SEMANTIC_MIN_SCORE', 0.05))
+
+   # Write-behind persistence for chat messages (off by default)
+   MESSAGE_WRITE_BEHIND = os.getenv('MESSAGE_WRITE_BEHIND', 'false').lower() == 'true'
+   MESSAGE_FLUSH_BATCH = int(os.getenv('MESSAGE_FLUSH_BATCH', 100))
+   MESSAGE_FLUSH_INTERVAL = float(os.getenv('MESSAGE_FLUSH_INTERVAL', 0.5))
+   MESSAGE_BUFFER_MAX = int(os.getenv('MESSAGE_BUFFER_MAX', 10000))
+
+   # Per-conversation cache of recent messages; HISTORY_CACHE_MESSAGES leaves room for the
+   # PROMPT_HISTORY_MESSAGES kept verbatim plus the messages of turns since the last fold.
+   # Entries are re-read HISTORY_CACHE_TTL seconds after they were filled; HISTORY_CACHE_VERIFY
+   # checks each hit against the conversation's turn counter, for turns other workers handled
+   HISTORY_CACHE_ENABLED = os.getenv('HISTORY_CACHE_ENABLED', 'true').lower() == 'true'
+   HISTORY_CACHE_MESSAGES = int(os.getenv('HISTORY_CACHE_MESSAGES', 40))
+   HISTORY_CACHE_CONVERSATIONS = int(os.getenv('HISTORY_CACHE_CONVERSATIONS', 10000))
+   HISTORY_CACHE_MAX_BYTES = int(os.getenv('HISTORY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+   HISTORY_CACHE_TTL = float(os.getenv('HISTORY_CACHE_TTL', 300))
+   HISTORY_CACHE_VERIFY = os.getenv('HISTORY_CACHE_VERIFY', 'true').lower() == 'true'
+
+   # Customer profiles by _id and email (utils/customer_cache.py), written through on every update;
+   # CUSTOMER_CACHE_TTL bounds how long another worker's change to a profile can go unseen
+   CUSTOMER_CACHE_ENABLED = os.getenv('CUSTOMER_CACHE_ENABLED', 'true').lower() == 'true'
+   CUSTOMER_CACHE_SIZE = int(os.getenv('CUSTOMER_CACHE_SIZE', 10000))
+   CUSTOMER_CACHE_MAX_BYTES = int(os.getenv('CUSTOMER_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+   CUSTOMER_CACHE_TTL = float(os.getenv('CUSTOMER_CACHE_TTL', 300))
+
+   # LLM response cache; RESPONSE_CACHE_PATH adds a SQLite store that survives restarts,
+   # holding at most RESPONSE_CACHE_MAX_ROWS replies
+   RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+   RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1000))
+   RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 3600))
+   RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH')
+   RESPONSE_CACHE_MAX_ROWS = int(os.getenv('RESPONSE_CACHE_MAX_ROWS', 10000))
+
+   # Turn router (services/turn_router.py): answer from templates, without the LLM, when the regex
+   # extraction explains at least ROUTER_MIN_COVERAGE of a message's words; ROUTER_RECOMMEND also
+   # answers completed profiles with the product recommendation template
+   ROUTER_ENABLED = os.getenv('ROUTER_ENABLED', 'true').lower() == 'true'
+   ROUTER_MIN_COVERAGE = float(os.getenv('ROUTER_MIN_COVERAGE', 0.8))
+   ROUTER_MAX_WORDS = int(os.getenv('ROUTER_MAX_WORDS', 20))
+   ROUTER_RECOMMEND = os.getenv('ROUTER_RECOMMEND', 'true').lower() == 'true'
+
+   # Run independent chat stages concurrently (services/chat_pipeline.py) on a pool of
+   # STAGE_POOL_WORKERS threads shared by all turns; off runs every stage in the request thread
+   CONCURRENT_STAGES = os.getenv('CONCURRENT_STAGES', 'true').lower() == 'true'
+   STAGE_POOL_WORKERS = int(os.getenv('STAGE_POOL_WORKERS', 32))
+
+   # Prompt assembly: estimated-token budget, rolling summary size, messages kept verbatim;
+   # each turn fetches the messages not yet in the summary, at most PROMPT_HISTORY_FETCH
+   PROMPT_MAX_TOKENS = int(os.getenv('PROMPT_MAX_TOKENS', 1500))
+   PROMPT_SUMMARY_TOKENS = int(os.getenv('PROMPT_SUMMARY_TOKENS', 250))
+   PROMPT_HISTORY_MESSAGES = int(os.getenv('PROMPT_HISTORY_MESSAGES', 20))
+   PROMPT_HISTORY_FETCH = int(os.getenv('PROMPT_HISTORY_FETCH', 200))
+
 def get_config():
     return Config
@@ -0,0 +1,261 @@
+"""Management commands, run from the backend/ directory.
+
+    python manage.py migrate [--verify]   # apply pending index migrations
+    python manage.py seed                 # insert the demo products into an empty catalog
+    python manage.py setup                # migrate, then seed (the release step)
+    python manage.py ingest catalog.csv   # stream a CSV/JSONL catalog in, upserting by sku
+
+These used to run on every import of app.py; keeping them here lets web
+workers start without touching the database.
+"""
+import argparse
+import sys
+from migrations import run_migrations, verify_indexes
+from models.product import Product
+from services.catalog_ingest import CatalogIngest
+from utils.db import get_db
+
+SEED_PRODUCTS = [
+    {
+        "name": "MacBook Pro 16-inch M3",
+        "brand": "Apple",
+        "price": 2499.99,
+        "category": "laptop",
+        "description": "Powerful laptop with M3 chip, 16GB RAM, 512GB SSD. Perfect for professionals and creatives.",
+        "specs": {
+            "processor": "Apple M3",
+            "ram": "16GB",
+            "storage": "512GB SSD",
+            "screen": "16-inch Retina",
+            "graphics": "Integrated"
+        },
+        "image_url": "https://www.apple.com/newsroom/images/product/mac/standard/Apple_new-macbookair-wallpaper-screen_11102020_big.jpg.small_2x.jpg",
+        "in_stock": True,
+        "rating": 4.8,
+        "color": "Space Gray",
+        "tags": ["professional", "creative", "premium", "mac", "apple"]
+    },
+    {
+        "name": "Dell XPS 13 Plus",
+        "brand": "Dell",
+        "price": 1399.99,
+        "category": "laptop",
+        "description": "Ultra-thin, lightweight laptop with 12th Gen Intel i7, 16GB RAM, 1TB SSD. Great for business and travel.",
+        "specs": {
+            "processor": "Intel i7-1260P",
+            "ram": "16GB",
+            "storage": "1TB SSD",
+            "screen": "13.4-inch FHD+",
+            "graphics": "Intel Iris Xe"
+        },
+        "image_url": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcSd4hJBxUtlZcEhvgdIEt4dZt3VZ6CJPqXOdA&s",
+        "in_stock": True,
+        "rating": 4.7,
+        "color": "Silver",
+        "tags": ["business", "ultrabook", "dell", "portable"]
+    },
+    {
+        "name": "HP Spectre x360 14",
+        "brand": "HP",
+        "price": 1249.99,
+        "category": "laptop",
+        "description": "Convertible 2-in-1 laptop with touch screen, Intel i7, 16GB RAM, 512GB SSD. Perfect for students and professionals.",
+        "specs": {
+            "processor": "Intel i7-1165G7",
+            "ram": "16GB",
+            "storage": "512GB SSD",
+            "screen": "13.5-inch OLED",
+            "graphics": "Intel Iris Xe"
+        },
+        "image_url": "https://cdn.mos.cms.futurecdn.net/v2/t:0,l:0,cw:2000,ch:1125,q:80,w:2000/pyL3b8cis5dcmUvgbe9ygV.jpg",
+        "in_stock": True,
+        "rating": 4.6,
+        "color": "Nightfall Black",
+        "tags": ["2-in-1", "touchscreen", "hp", "student"]
+    },
+    {
+        "name": "Lenovo ThinkPad X1 Carbon Gen 11",
+        "brand": "Lenovo",
+        "price": 1599.99,
+        "category": "laptop",
+        "description": "Business-class laptop with Intel i7, 16GB RAM, 1TB SSD, legendary ThinkPad keyboard.",
+        "specs": {
+            "processor": "Intel i7-1355U",
+            "ram": "16GB",
+            "storage": "1TB SSD",
+            "screen": "14-inch WUXGA",
+            "graphics": "Intel Iris Xe"
+        },
+        "image_url": "https://5.imimg.com/data5/EI/TV/DO/SELLER-43661309/lenovo-laptops-500x500.png",
+        "in_stock": True,
+        "rating": 4.9,
+        "color": "Black",
+        "tags": ["business", "thinkpad", "lenovo", "durable"]
+    },
+    {
+        "name": "ASUS ROG Zephyrus G14",
+        "brand": "ASUS",
+        "price": 1799.99,
+        "category": "laptop",
+        "description": "High-performance gaming laptop with AMD Ryzen 9, RTX 4060, 32GB RAM, 1TB SSD.",
+        "specs": {
+            "processor": "AMD Ryzen 9 7940HS",
+            "ram": "32GB",
+            "storage": "1TB SSD",
+            "screen": "14-inch QHD",
+            "graphics": "NVIDIA RTX 4060"
+        },
+        "image_url": "https://www.notebookcheck.net/uploads/tx_nbc2/display-asus-k55_02.jpg",
+        "in_stock": True,
+        "rating": 4.8,
+        "color": "White",
+        "tags": ["gaming", "asus", "high-performance"]
+    },
+    {
+        "name": "Acer Swift 3 OLED",
+        "brand": "Acer",
+        "price": 899.99,
+        "category": "laptop",
+        "description": "Affordable ultrabook with Intel i5, 8GB RAM, 512GB SSD, OLED display.",
+        "specs": {
+            "processor": "Intel i5-1240P",
+            "ram": "8GB",
+            "storage": "512GB SSD",
+            "screen": "14-inch OLED",
+            "graphics": "Intel Iris Xe"
+        },
+        "image_url": "https://5.imimg.com/data5/SELLER/Default/2022/11/VY/TM/OH/139444584/acer-laptop-aspire-3.jpg",
+        "in_stock": True,
+        "rating": 4.4,
+        "color": "Silver",
+        "tags": ["budget", "ultrabook", "acer"]
+    },
+    {
+        "name": "Microsoft Surface Laptop 5",
+        "brand": "Microsoft",
+        "price": 1299.99,
+        "category": "laptop",
+        "description": "Sleek, lightweight laptop with Intel i5, 16GB RAM, 512GB SSD, touchscreen.",
+        "specs": {
+            "processor": "Intel i5-1235U",
+            "ram": "16GB",
+            "storage": "512GB SSD",
+            "screen": "13.5-inch PixelSense",
+            "graphics": "Intel Iris Xe"
+        },
+        "image_url": "https://cdn-dynmedia-1.microsoft.com/is/image/microsoftcorp/FL1C-BB-00?qlt=90&wid=1253&hei=705&extendN=0.12,0.12,0.12,0.12&bgc=FFFFFFFF&fmt=jpg",
+        "in_stock": True,
+        "rating": 4.5,
+        "color": "Platinum",
+        "tags": ["microsoft", "surface", "touchscreen"]
+    },
+    {
+        "name": "Razer Blade 15",
+        "brand": "Razer",
+        "price": 2199.99,
+        "category": "laptop",
+        "description": "Premium gaming laptop with Intel i7, RTX 3070, 16GB RAM, 1TB SSD, 240Hz display.",
+        "specs": {
+            "processor": "Intel i7-12800H",
+            "ram": "16GB",
+            "storage": "1TB SSD",
+            "screen": "15.6-inch QHD 240Hz",
+            "graphics": "NVIDIA RTX 3070"
+        },
+        "image_url": "https://example.com/razer-blade-15.jpg",
+        "in_stock": True,
+        "rating": 4.7,
+        "color": "Black",
+        "tags": ["gaming", "razer", "high-refresh"]
+    },
+    {
+        "name": "Apple MacBook Air M2",
+        "brand": "Apple",
+        "price": 1099.99,
+        "category": "laptop",
+        "description": "Lightweight, fanless laptop with Apple M2 chip, 8GB RAM, 256GB SSD. Great for students and everyday use.",
+        "specs": {
+            "processor": "Apple M2",
+            "ram": "8GB",
+            "storage": "256GB SSD",
+            "screen": "13.6-inch Retina",
+            "graphics": "Integrated"
+        },
+        "image_url": "https://example.com/macbook-air-m2.jpg",
+        "in_stock": True,
+        "rating": 4.6,
+        "color": "Starlight",
+        "tags": ["student", "macbook", "apple", "lightweight"]
+    },
+    {
+        "name": "MSI Creator Z16",
+        "brand": "MSI",
+        "price": 1899.99,
+        "category": "laptop",
+        "description": "Creator-focused laptop with Intel i9, RTX 3060, 32GB RAM, 1TB SSD, 16-inch QHD+ display.",
+        "specs": {
+            "processor": "Intel i9-11900H",
+            "ram": "32GB",
+            "storage": "1TB SSD",
+            "screen": "16-inch QHD+",
+            "graphics": "NVIDIA RTX 3060"
+        },
+        "image_url": "https://example.com/msi-creator-z16.jpg",
+        "in_stock": True,
+        "rating": 4.7,
+        "color": "Gray",
+        "tags": ["creator", "msi", "high-performance"]
+    }
+]
+
+
+def seed_products(db, log=print):
+    product_model = Product(db)
+    if product_model.collection.count_documents({}) == 0:
+        product_model.insert_many(SEED_PRODUCTS)
+        log(f"Inserted {len(SEED_PRODUCTS)} product(s)")
+    else:
+        log("Products already present, nothing to seed")
+
+
+def migrate(db, verify=False):
+    applied = run_migrations(db)
+    print(f"{len(applied)} migration(s) applied" if applied else "Database is up to date")
+    return verify_indexes(db) if verify else True
+
+
+def ingest(db, path, fmt=None, batch_size=1000, checkpoint=None, restart=False):
+    loader = CatalogIngest(Product(db), batch_size=batch_size, checkpoint_path=checkpoint)
+    result = loader.run(path, fmt=fmt, resume=not restart)
+    print(f"{result['rows']} row(s): {result['upserted']} new, {result['modified']} updated, "
+          f"{result['rejected']} rejected in {result['elapsed']}s ({result['rows_per_second']} rows/s)")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-commerce AI Chatbot management commands")
+    parser.add_argument('command', choices=['migrate', 'seed', 'setup', 'ingest'])
+    parser.add_argument('path', nargs='?', help="catalog file for ingest (.csv, or .jsonl one product per line)")
+    parser.add_argument('--verify', action='store_true', help="check the hot queries use an index after migrating")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="ingest file format (default: by extension)")
+    parser.add_argument('--batch-size', type=int, default=1000, help="products per bulk_write")
+    parser.add_argument('--checkpoint', help="ingest progress file (default: <path>.checkpoint)")
+    parser.add_argument('--restart', action='store_true', help="ignore a saved checkpoint and load from the top")
+    args = parser.parse_args(argv)
+    if args.command == 'ingest' and not args.path:
+        parser.error("ingest needs the catalog file")
+
+    db = get_db()
+    ok = True
+    if args.command == 'ingest':
+        ingest(db, args.path, fmt=args.format, batch_size=args.batch_size, checkpoint=args.checkpoint,
+               restart=args.restart)
+    if args.command in ('migrate', 'setup'):
+        ok = migrate(db, verify=args.verify)
+    if args.command in ('seed', 'setup'):
+        seed_products(db)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
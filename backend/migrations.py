@@ -0,0 +1,185 @@
+"""Versioned MongoDB index migrations.
+
+Run at deploy time, before the web process starts:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --verify   # also check the hot queries use an index
+
+`python manage.py migrate` does the same.
+
+Applied versions are recorded in the `schema_migrations` collection, so each
+migration runs once per database.
+"""
+import sys
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from config import Config
+from models.Conversation import _id_variants
+from models.Customer import profile_fields
+from utils.db import get_db
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+@migration(1, "drop legacy unique index on customers.username")
+def drop_username_index(db):
+    try:
+        db.customers.drop_index("username_1")
+    except OperationFailure:
+        pass
+
+
+@migration(2, "index conversations by session_id and messages by (conversation_id, timestamp)")
+def conversation_indexes(db):
+    db.conversations.create_index([('session_id', ASCENDING)], name='session_id_1')
+    db.messages.create_index(
+        [('conversation_id', ASCENDING), ('timestamp', DESCENDING)],
+        name='conversation_id_1_timestamp_-1'
+    )
+
+
+@migration(3, "unique index on customers.email")
+def customer_email_index(db):
+    # The old get_by_email -> create race could store a customer twice: keep the oldest, with the
+    # newer duplicates' non-empty fields merged in as upsert_by_email would, and point their
+    # conversations and sessions at it
+    duplicates = db.customers.aggregate([
+        {'$match': {'email': {'$type': 'string'}}},
+        {'$group': {'_id': '$email', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ])
+    for group in duplicates:
+        keep, *extra = sorted(group['ids'])
+        merged = {}
+        for doc in db.customers.find({'_id': {'$in': [keep] + extra}}).sort('_id', ASCENDING):
+            merged.update(profile_fields(doc))
+        db.customers.update_one({'_id': keep}, {'$set': merged})
+        extra_ids = [str(i) for i in extra] + extra
+        for collection in (db.conversations, db.sessions):
+            collection.update_many({'customer_id': {'$in': extra_ids}}, {'$set': {'customer_id': str(keep)}})
+        db.customers.delete_many({'_id': {'$in': extra}})
+    db.customers.create_index(
+        [('email', ASCENDING)],
+        name='email_1',
+        unique=True,
+        partialFilterExpression={'email': {'$type': 'string'}}
+    )
+
+
+@migration(4, "TTL index expiring idle server-side sessions")
+def session_ttl_index(db):
+    db.sessions.create_index(
+        [('updated_at', ASCENDING)],
+        name='updated_at_ttl',
+        expireAfterSeconds=int(Config.SESSION_TTL)
+    )
+
+
+@migration(5, "unique index on conversations.session_id")
+def conversation_session_unique(db):
+    # Concurrent first turns could create a session's conversation twice: keep the oldest and
+    # move the others' messages to it before the index forbids duplicates
+    duplicates = db.conversations.aggregate([
+        {'$group': {'_id': '$session_id', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ])
+    for group in duplicates:
+        keep, *extra = sorted(group['ids'])
+        db.messages.update_many(
+            {'conversation_id': {'$in': [str(i) for i in extra] + extra}},
+            {'$set': {'conversation_id': str(keep)}}
+        )
+        db.conversations.delete_many({'_id': {'$in': extra}})
+    try:
+        db.conversations.drop_index('session_id_1')
+    except OperationFailure:
+        pass
+    db.conversations.create_index([('session_id', ASCENDING)], name='session_id_1', unique=True)
+
+
+@migration(6, "unique index on products.sku")
+def product_sku_index(db):
+    # Catalog loads upsert by SKU; the demo products have none
+    db.products.create_index(
+        [('sku', ASCENDING)],
+        name='sku_1',
+        unique=True,
+        partialFilterExpression={'sku': {'$type': 'string'}}
+    )
+
+
+def applied_versions(db):
+    return {doc['_id'] for doc in db.schema_migrations.find({}, {'_id': 1})}
+
+
+def run_migrations(db, log=print):
+    """Apply every pending migration in version order; returns the versions applied."""
+    done = applied_versions(db)
+    applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        log(f"Applying migration {version}: {description}")
+        fn(db)
+        db.schema_migrations.update_one(
+            {'_id': version},
+            {'$set': {'description': description, 'applied_at': datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+        applied.append(version)
+    return applied
+
+
+# The queries the chat path issues on every turn, as (collection, filter, sort)
+HOT_QUERIES = [
+    ('conversations', {'session_id': 'explain-check'}, None),
+    # As Conversation reads history: both stored forms of the id, newest first
+    ('messages', {'conversation_id': {'$in': _id_variants('5f0000000000000000000000')}}, [('timestamp', DESCENDING)]),
+    ('customers', {'email': 'explain-check@example.com'}, None),
+]
+
+
+def _stages(plan):
+    yield plan.get('stage')
+    if 'inputStage' in plan:
+        yield from _stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from _stages(child)
+
+
+def explain_plans(db):
+    """Return {collection: [plan stages]} for HOT_QUERIES' winning plans."""
+    plans = {}
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        plans[collection] = [stage for stage in _stages(plan) if stage]
+    return plans
+
+
+def verify_indexes(db, log=print):
+    """True when every hot query is answered by an index scan."""
+    ok = True
+    for collection, stages in explain_plans(db).items():
+        uses_index = 'IXSCAN' in stages and 'COLLSCAN' not in stages
+        log(f"{collection}: {' <- '.join(stages)} {'ok' if uses_index else 'NOT INDEXED'}")
+        ok = ok and uses_index
+    return ok
+
+
+if __name__ == '__main__':
+    db = get_db()
+    applied = run_migrations(db)
+    print(f"{len(applied)} migration(s) applied" if applied else "Database is up to date")
+    if '--verify' in sys.argv[1:] and not verify_indexes(db):
+        sys.exit(1)
@@ -1,10 +1,28 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.metrics import instrumented
 
+def _id_variants(conversation_id):
+    # Older messages were stored with the ObjectId, newer ones with its string form
+    variants = [str(conversation_id)]
+    if ObjectId.is_valid(conversation_id):
+        variants.append(ObjectId(conversation_id))
+    return variants
+
+
+@instrumented
 class Conversation:
-    def __init__(self, db):
+    def __init__(self, db, message_buffer=None, history_cache=None, verify_history=True):
         self.collection = db.conversations
         self.messages = db.messages
+        # Optional WriteBehindBuffer: add_message then queues instead of inserting
+        self.message_buffer = message_buffer
+        # Optional HistoryCache of recent messages per conversation; with verify_history a hit
+        # is checked against the conversation's turn counter, which other workers may have bumped
+        self.history_cache = history_cache
+        self.verify_history = verify_history
 
     def create(self, customer_id, session_id):
         data = {
@@ -14,9 +32,43 @@ class Conversation:
             'status': 'active'
         }
         result = self.collection.insert_one(data)
-        return str(result.inserted_id)
+        conversation_id = str(result.inserted_id)
+        if self.history_cache is not None:
+            self.history_cache.prime(conversation_id)
+        return conversation_id
+
+    def get_or_create(self, session_id, projection=None):
+        """The conversation of session_id, created in the same round trip if there is none.
+
+        Each call starts a turn and bumps the conversation's `turns` counter,
+        which get_recent_messages checks cached history against. Concurrent
+        first turns of a session get the same conversation (the unique
+        session_id index turns a racing insert into a retry).
+        Returns (conversation, created).
+        """
+        conversation_id = ObjectId()
+        try:
+            conversation = self.collection.find_one_and_update(
+                {'session_id': session_id},
+                {'$setOnInsert': {
+                    '_id': conversation_id,
+                    'customer_id': None,
+                    'created_at': datetime.now(timezone.utc).isoformat(),
+                    'status': 'active'
+                }, '$inc': {'turns': 1}},
+                projection=projection,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return self.get_or_create(session_id, projection)
+        created = conversation['_id'] == conversation_id
+        if created and self.history_cache is not None:
+            self.history_cache.prime(str(conversation_id), conversation.get('turns'))
+        return conversation, created
 
     def add_message(self, conversation_id, message_type, content, metadata=None):
+        conversation_id = str(conversation_id)
         msg = {
             'conversation_id': conversation_id,
             'type': message_type,
@@ -24,27 +76,68 @@ class Conversation:
             'metadata': metadata or {},
             'timestamp': datetime.now(timezone.utc).isoformat()
         }
-        self.messages.insert_one(msg)
-
-    # def get_recent_messages(self, conversation_id, limit=10):
-    #     return list(self.messages.find({'conversation_id': conversation_id}).sort('timestamp', -1).limit(limit))
-# Add these methods to your Conversation model class
+        if self.message_buffer is not None:
+            # Assign the _id here so a read can de-duplicate against a landed insert
+            msg['_id'] = ObjectId()
+            self.message_buffer.add(msg)
+        else:
+            self.messages.insert_one(msg)
+        if self.history_cache is not None:
+            self.history_cache.append(conversation_id, msg)
 
     def get_by_session_id(self, session_id):
         """Get conversation by session_id"""
         return self.collection.find_one({'session_id': session_id})
 
-    def get_recent_messages(self, conversation_id, limit=10):
-        # Fetch from the messages collection, sorted by timestamp
-        msgs = list(self.messages.find({'conversation_id': conversation_id}).sort('timestamp', 1).limit(limit))
-        # Format for LLM
+    def get_recent_messages(self, conversation_id, limit=10, since=None, turns=None):
+        """The last `limit` messages of the conversation, oldest first; only those after `since` if given.
+
+        turns is the conversation's turn counter as get_or_create returned it;
+        without it a cached history is used unchecked until it expires.
+        """
+        conversation_id = str(conversation_id)
+        msgs = None
+        if self.history_cache is not None:
+            msgs = self.history_cache.get(conversation_id, limit, since)
+            if (msgs is not None and self.verify_history and turns is not None
+                    and not self.history_cache.current(conversation_id, turns)):
+                self.history_cache.invalidate(conversation_id)
+                msgs = None
+        if msgs is None:
+            msgs = self._read_recent_messages(conversation_id, limit, since, turns)
+        # Format for LLM; the timestamp lets the prompt builder fold each message once
         return [
-            {"type": msg["type"], "content": msg["content"]}
+            {"type": msg["type"], "content": msg["content"], "timestamp": msg.get("timestamp")}
             for msg in msgs
         ]
 
+    def _read_recent_messages(self, conversation_id, limit, since=None, turns=None):
+        generation = self.history_cache.generation(conversation_id) if self.history_cache is not None else None
+        query = {'conversation_id': {'$in': _id_variants(conversation_id)}}
+        if since is not None:
+            query['timestamp'] = {'$gt': since}
+        # Newest first from the (conversation_id, timestamp) index, then back to chronological order
+        msgs = list(self.messages.find(query).sort('timestamp', -1).limit(limit))
+        msgs.reverse()
+        complete = since is None and len(msgs) < limit
+        if self.message_buffer is not None:
+            # Read-your-writes for messages still waiting in the buffer
+            seen = {msg['_id'] for msg in msgs}
+            pending = self.message_buffer.pending(
+                lambda msg: msg['conversation_id'] == conversation_id and msg['_id'] not in seen
+                and (since is None or msg['timestamp'] > since)
+            )
+            if pending:
+                msgs = sorted(msgs + pending, key=lambda msg: msg['timestamp'])[-limit:]
+                complete = complete and len(msgs) < limit
+        if self.history_cache is not None:
+            self.history_cache.fill(conversation_id, msgs, complete, generation, turns)
+        return msgs
+
     def update(self, conversation_id, data):
         """Update conversation data"""
+        if ObjectId.is_valid(conversation_id):
+            conversation_id = ObjectId(conversation_id)
         return self.collection.update_one(
             {'_id': conversation_id},
             {'$set': data}
@@ -1,6 +1,14 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.metrics import instrumented
 
+def profile_fields(data):
+    """The fields upsert_by_email writes: everything but _id and empty values."""
+    return {k: v for k, v in data.items() if k != '_id' and v not in [None, '', []]}
+
+
+@instrumented
 class Customer:
     def __init__(self, db):
         self.collection = db.customers
@@ -18,3 +26,19 @@ class Customer:
 
     def get_by_email(self, email):
         return self.collection.find_one({'email': email})
+
+    def upsert_by_email(self, data, projection=None):
+        """Merge data into the customer with data['email'], creating it if needed.
+
+        Empty values never overwrite stored ones. One round trip; returns the
+        document as it is after the write, limited to projection if given.
+        """
+        fields = profile_fields(data)
+        fields.setdefault('timestamp', datetime.now(timezone.utc).isoformat())
+        return self.collection.find_one_and_update(
+            {'email': data['email']},
+            {'$set': fields},
+            projection=projection,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
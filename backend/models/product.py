@@ -1,19 +1,163 @@
+import threading
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from services.catalog_index import CatalogRefresher
+from services.semantic_search import TEXT_PROJECTION
+from utils.metrics import instrumented
+
+
+@instrumented
 class Product:
-    def __init__(self, db):
+    def __init__(self, db, index=None, refresh_interval=60, ranker=None, semantic=None):
         self.collection = db.products
+        # Optional in-process CatalogIndex; loaded from the collection on first use
+        self.index = index
+        # Optional ProductRanker over the index's documents
+        self.ranker = ranker
+        # Optional SemanticIndex, searched when the category match finds nothing
+        self.semantic = semantic
+        self.refresh_interval = refresh_interval
+        self.refresher = None
+        self._load_lock = threading.Lock()
+
+    def get_index(self):
+        if self.index is None:
+            return None
+        if not self.index.loaded:
+            with self._load_lock:
+                if not self.index.loaded:
+                    self.index.load(self.collection.find())
+                    self.refresher = CatalogRefresher(self.index, self.collection, self.refresh_interval).start()
+        return self.index
+
+    def get_semantic(self):
+        if self.semantic is None:
+            return None
+        index = self.get_index()
+        if index is not None:
+            self.semantic.sync(index)
+        elif not self.semantic.loaded:
+            with self._load_lock:
+                if not self.semantic.loaded:
+                    self.semantic.load(self.collection.find({}, TEXT_PROJECTION))
+        return self.semantic
 
     def insert_many(self, products):
         self.collection.insert_many(products)
+        if self.index is not None and self.index.loaded:
+            # insert_many sets _id on each dict, so they can go straight in
+            for product in products:
+                self.index.upsert(product)
+        elif self.semantic is not None and self.semantic.loaded:
+            # With the catalog index, get_semantic() picks these up from it
+            for product in products:
+                self.semantic.upsert(product)
+
+    def upsert_many_by_sku(self, products):
+        """Set the given fields on the product with each sku, creating missing ones.
+
+        One unordered bulk_write, so a rejected document does not stop the
+        rest. Returns ({'upserted': n, 'modified': n}, write errors), each
+        error carrying the index of its document in products.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        requests = [
+            UpdateOne(
+                {'sku': product['sku']},
+                {'$set': product, **({} if 'created_at' in product else {'$setOnInsert': {'created_at': now}})},
+                upsert=True
+            )
+            for product in products
+        ]
+        try:
+            result = self.collection.bulk_write(requests, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+        counts = {'upserted': result.get('nUpserted', 0), 'modified': result.get('nModified', 0)}
+        return counts, result.get('writeErrors', [])
+
+    def invalidate_caches(self):
+        """Bring the loaded catalog index and semantic index in line with the collection after a bulk load."""
+        if self.index is not None and self.index.loaded:
+            self.index.sync(self.collection.find())
+            if self.semantic is not None and self.semantic.loaded:
+                self.semantic.sync(self.index)
+        elif self.semantic is not None and self.semantic.loaded:
+            self.semantic.load(self.collection.find({}, TEXT_PROJECTION))
 
     def find(self, query=None):
         return list(self.collection.find(query or {}))
 
-    def find_by_query_and_preferences(self, query, preferences):
-        mongo_query = {}
+    def recommend(self, query, preferences, limit=3, projection=None):
+        """The best `limit` products for the customer's request, best first.
+
+        Ranked by ProductRanker when there is one (it needs the catalog
+        index); otherwise the first matches of find_by_query_and_preferences.
+        Either way a request no category matches goes to semantic_search.
+        """
+        index = self.get_index()
+        if index is not None and self.ranker is not None:
+            fields = [field for field, included in projection.items() if included] if projection else None
+            products = self.ranker.top_k(index, query, preferences, k=limit, fields=fields)
+            return products or self.semantic_search(query, preferences, limit=limit, projection=projection)
+        return self.find_by_query_and_preferences(query, preferences, limit=limit, projection=projection)
 
-        # Filter by 'looking_for' (e.g., 'laptop', 'gaming laptop')
-        if query:
-            mongo_query['category'] = {'$regex': query, '$options': 'i'}
+    def find_by_query_and_preferences(self, query, preferences, limit=None, projection=None):
+        """Products matching the customer's request, in natural order.
+
+        projection is a Mongo inclusion projection ({field: 1}); limit caps
+        the results in the query itself. When nothing matches, falls back to
+        semantic_search (if enabled), whose results are best first.
+        """
+        index = self.get_index()
+        if index is not None:
+            fields = [field for field, included in projection.items() if included] if projection else None
+            products = index.find_by_query_and_preferences(query, preferences, limit=limit, fields=fields)
+        else:
+            mongo_query = self._preference_query(preferences)
+
+            # Filter by 'looking_for' (e.g., 'laptop', 'gaming laptop')
+            if query:
+                mongo_query['category'] = {'$regex': query, '$options': 'i'}
+
+            products = list(self.collection.find(mongo_query, projection, limit=limit or 0))
+        return products or self.semantic_search(query, preferences, limit=limit, projection=projection)
+
+    def semantic_search(self, query, preferences, limit=None, projection=None):
+        """Products whose name, description, tags and specs best match query, best first.
+
+        The brand and RAM preferences filter the results as in
+        find_by_query_and_preferences; the category does not.
+        """
+        semantic = self.get_semantic() if query else None
+        if semantic is None:
+            return []
+        index = self.get_index()
+        if index is not None:
+            filters = {
+                'brand': None if preferences.get('exclude_brand') else preferences.get('brand_preference'),
+                'ram': preferences.get('ram'),
+                'exclude_brand': preferences.get('exclude_brand')
+            }
+            allowed = None
+            if any(filters.values()):
+                allowed = {str(doc['_id']) for doc in index.query(fields=(), **filters)}
+            hits = semantic.search(query, k=limit or 10, allowed=allowed)
+            fields = [field for field, included in projection.items() if included] if projection else None
+            return index.get_many([product_id for product_id, _ in hits], fields=fields)
+
+        mongo_query = self._preference_query(preferences)
+        allowed = {str(doc['_id']) for doc in self.collection.find(mongo_query, {'_id': 1})} if mongo_query else None
+        ids = [product_id for product_id, _ in semantic.search(query, k=limit or 10, allowed=allowed)]
+        if not ids:
+            return []
+        docs = {doc['_id']: doc for doc in self.collection.find({'_id': {'$in': ids}}, projection)}
+        return [docs[product_id] for product_id in ids if product_id in docs]
+
+    @staticmethod
+    def _preference_query(preferences):
+        mongo_query = {}
 
         # Filter by brand preference
         if preferences.get('brand_preference'):
@@ -29,4 +173,4 @@ class Product:
 
         # You can add more filters for color, price, etc.
 
-        return list(self.collection.find(mongo_query))
+        return mongo_query
@@ -0,0 +1,193 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import MovingWindowRateLimiter
+
+from utils.metrics import admission_in_flight, admission_queue_depth, admission_rejected_total, admission_wait_seconds
+
+
+class Overloaded(Exception):
+    """A chat turn was not admitted; answer 429 with Retry-After."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Not admitted: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'loop', 'future', 'granted')
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """Bounds the chat turns (and so the LLM calls) a worker has in flight.
+
+    Up to max_concurrent turns run at once. Further turns wait in a FIFO
+    queue of at most max_queue entries for up to queue_timeout seconds; a
+    turn that finds the queue full, or is still waiting at its deadline, is
+    rejected with Overloaded instead of piling more calls onto a model API
+    that is already rate limiting. A freed slot is handed straight to the
+    oldest waiter, so queued turns are never overtaken by new arrivals.
+
+    Each session_id is also limited to session_limit turns (a limits string
+    such as "30/minute") in a moving window, kept in storage_uri (memory://
+    per process, or redis:// to share the limit between workers).
+
+    Threads use acquire() and asyncio handlers aacquire(); both draw on the
+    same slots. Retry-After is estimated from the recent time a turn holds
+    a slot and the number of turns ahead.
+    """
+
+    def __init__(self, max_concurrent=64, max_queue=128, queue_timeout=10.0,
+                 session_limit=None, storage_uri='memory://'):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.rejected = {}
+        # Seconds a turn holds its slot, smoothed
+        self.hold_time = None
+        self.session_limit = parse(session_limit) if session_limit else None
+        self.rate_limiter = MovingWindowRateLimiter(storage_from_string(storage_uri)) if session_limit else None
+        admission_in_flight.set_function(lambda: self.in_flight)
+        admission_queue_depth.set_function(lambda: len(self.waiters))
+
+    def acquire(self, session_id=None):
+        """Take a slot for one turn, waiting in the queue if needed.
+
+        Returns a release() callable to run once the turn is done; raises
+        Overloaded when the turn is not admitted.
+        """
+        self._check_session(session_id)
+        waiter = self._enqueue(lambda: _Waiter(event=threading.Event()))
+        if waiter is not None:
+            start = time.monotonic()
+            waiter.event.wait(self.queue_timeout)
+            self._dequeue(waiter, start)
+        return self._slot()
+
+    async def aacquire(self, session_id=None):
+        """acquire() for asyncio handlers; waits without blocking the event loop."""
+        self._check_session(session_id)
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(lambda: _Waiter(loop=loop, future=loop.create_future()))
+        if waiter is not None:
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # The client went away while queued; give back a slot handed over meanwhile
+                with self.lock:
+                    if waiter.granted:
+                        self._release_locked(None)
+                    else:
+                        self.waiters.remove(waiter)
+                raise
+            self._dequeue(waiter, start)
+        return self._slot()
+
+    def _check_session(self, session_id):
+        if self.rate_limiter is None or session_id is None:
+            return
+        if not self.rate_limiter.hit(self.session_limit, 'chat', session_id):
+            reset_time, _ = self.rate_limiter.get_window_stats(self.session_limit, 'chat', session_id)
+            self._reject('session_rate', max(1, math.ceil(reset_time - time.time())))
+
+    def _enqueue(self, make_waiter):
+        # None when a slot was free; otherwise the queued waiter
+        with self.lock:
+            if self.in_flight < self.max_concurrent and not self.waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return None
+            if len(self.waiters) >= self.max_queue:
+                retry_after = self._retry_after_locked()
+            else:
+                waiter = make_waiter()
+                self.waiters.append(waiter)
+                return waiter
+        self._reject('queue_full', retry_after)
+
+    def _dequeue(self, waiter, start):
+        with self.lock:
+            if not waiter.granted:
+                self.waiters.remove(waiter)
+                retry_after = self._retry_after_locked()
+            else:
+                self.admitted += 1
+                retry_after = None
+        admission_wait_seconds.observe(time.monotonic() - start)
+        if retry_after is not None:
+            self._reject('queue_timeout', retry_after)
+
+    def _slot(self):
+        start = time.monotonic()
+        released = []
+
+        def release():
+            # Safe to call more than once, e.g. from a finally and a response close hook
+            if not released:
+                released.append(True)
+                with self.lock:
+                    self._release_locked(time.monotonic() - start)
+        return release
+
+    def _release_locked(self, held):
+        if held is not None:
+            self.hold_time = held if self.hold_time is None else 0.2 * held + 0.8 * self.hold_time
+        if self.waiters:
+            # Hand the slot over; in_flight stays the same
+            waiter = self.waiters.popleft()
+            waiter.granted = True
+            waiter.wake()
+        else:
+            self.in_flight -= 1
+
+    def _retry_after_locked(self):
+        ahead = len(self.waiters) + 1
+        return max(1, math.ceil((self.hold_time or 1.0) * ahead / self.max_concurrent))
+
+    def _reject(self, reason, retry_after):
+        with self.lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        admission_rejected_total.inc(reason=reason)
+        raise Overloaded(reason, retry_after)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': self.in_flight,
+                'queued': len(self.waiters),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'hold_time_ms': round(self.hold_time * 1000, 1) if self.hold_time is not None else None
+            }
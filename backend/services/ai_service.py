@@ -1,9 +1,65 @@
+import asyncio
+import logging
 import requests
 import json
+import time
+from requests.adapters import HTTPAdapter
+from config import Config
 from utils.model_selector import ModelSelector
+from utils.stream_parser import ReplyStreamParser
+from utils.extraction import extractor
+from services.response_cache import ResponseCache
+from services.prompt_builder import PromptBuilder
+from utils.metrics import llm_tokens_total
 
+logger = logging.getLogger(__name__)
 
-def call_github_ai_model(messages, model_config):
+
+class ModelAPIError(Exception):
+    """Raised when the model API answers with a non-200 status."""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Seconds from the Retry-After header of a 429, when it sent one
+        self.retry_after = retry_after
+
+
+def _retry_after(headers):
+    try:
+        return max(float(headers.get('Retry-After')), 0.0)
+    except (TypeError, ValueError):
+        # Absent, or an HTTP date
+        return None
+
+
+def _record_usage(model_config, usage):
+    # Token counts as reported by the API, when it reports them
+    if usage:
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            if usage.get(kind):
+                llm_tokens_total.inc(usage[kind], model=model_config['name'], type=kind[:-len('_tokens')])
+
+
+_STREAM_DONE = object()
+
+
+def _parse_stream_line(line, model_config):
+    """Content delta carried by one SSE line, _STREAM_DONE at the end, else None."""
+    if not line or not line.startswith('data:'):
+        return None
+    data = line[len('data:'):].strip()
+    if data == '[DONE]':
+        return _STREAM_DONE
+    event = json.loads(data)
+    _record_usage(model_config, event.get('usage'))
+    choices = event.get('choices') or []
+    if choices:
+        return (choices[0].get('delta') or {}).get('content') or None
+    return None
+
+
+def _build_chat_request(messages, model_config):
     url = f"{model_config['endpoint']}/chat/completions"
     headers = {
         "Authorization": f"Bearer {model_config['token']}",
@@ -15,20 +71,175 @@ def call_github_ai_model(messages, model_config):
         "top_p": 1,
         "model": model_config['model']
     }
-    response = requests.post(url, headers=headers, json=body)
-    if response.status_code != 200:
-        raise Exception(f"Model API error: {response.text}")
-    data = response.json()
-    return data['choices'][0]['message']['content']
+    return url, headers, body
+
+
+class LLMClient:
+    """Long-lived HTTP client for the chat completions API.
+
+    Keeps a pool of keep-alive connections per endpoint so consecutive chat
+    turns reuse the same TCP/TLS connection instead of handshaking again.
+    """
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+        self.pool_connections = Config.LLM_POOL_CONNECTIONS if pool_connections is None else pool_connections
+        self.pool_maxsize = Config.LLM_POOL_MAXSIZE if pool_maxsize is None else pool_maxsize
+        self.timeout = (
+            Config.LLM_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+            Config.LLM_READ_TIMEOUT if read_timeout is None else read_timeout
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def chat_completion(self, messages, model_config):
+        url, headers, body = _build_chat_request(messages, model_config)
+        response = self.session.post(url, headers=headers, json=body, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ModelAPIError(f"Model API error: {response.text}", response.status_code,
+                                _retry_after(response.headers))
+        data = response.json()
+        _record_usage(model_config, data.get('usage'))
+        return data['choices'][0]['message']['content']
+
+    def stream_chat_completion(self, messages, model_config):
+        """Request a streamed completion and yield content deltas as they arrive."""
+        url, headers, body = _build_chat_request(messages, model_config)
+        body['stream'] = True
+        with self.session.post(url, headers=headers, json=body, timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                raise ModelAPIError(f"Model API error: {response.text}", response.status_code,
+                                    _retry_after(response.headers))
+            # SSE is always UTF-8; requests would assume ISO-8859-1 for a text/event-stream without a charset
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                content = _parse_stream_line(line, model_config)
+                if content is _STREAM_DONE:
+                    break
+                if content:
+                    yield content
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient:
+    """asyncio variant of LLMClient built on aiohttp.
+
+    The aiohttp session is created on first use, inside the running event loop.
+    """
+
+    def __init__(self, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+        self.pool_maxsize = Config.LLM_POOL_MAXSIZE if pool_maxsize is None else pool_maxsize
+        self.connect_timeout = Config.LLM_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+        self.read_timeout = Config.LLM_READ_TIMEOUT if read_timeout is None else read_timeout
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                limit_per_host=self.pool_maxsize
+            )
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def chat_completion(self, messages, model_config):
+        url, headers, body = _build_chat_request(messages, model_config)
+        session = self._get_session()
+        async with session.post(url, headers=headers, json=body) as response:
+            if response.status != 200:
+                text = await response.text()
+                raise ModelAPIError(f"Model API error: {text}", response.status, _retry_after(response.headers))
+            data = await response.json()
+        _record_usage(model_config, data.get('usage'))
+        return data['choices'][0]['message']['content']
+
+    async def stream_chat_completion(self, messages, model_config):
+        url, headers, body = _build_chat_request(messages, model_config)
+        body['stream'] = True
+        session = self._get_session()
+        async with session.post(url, headers=headers, json=body) as response:
+            if response.status != 200:
+                text = await response.text()
+                raise ModelAPIError(f"Model API error: {text}", response.status, _retry_after(response.headers))
+            async for line in response.content:
+                content = _parse_stream_line(line.decode('utf-8').strip(), model_config)
+                if content is _STREAM_DONE:
+                    break
+                if content:
+                    yield content
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+_default_client = None
+
+
+def call_github_ai_model(messages, model_config, client=None):
+    global _default_client
+    if client is None:
+        if _default_client is None:
+            _default_client = LLMClient()
+        client = _default_client
+    return client.chat_completion(messages, model_config)
 
 class AIService:
 
-    def __init__(self):
+    def __init__(self, response_cache=None, prompt_builder=None):
         self.model_selector = ModelSelector()
+        self.client = LLMClient()
+        # Used by the asyncio serving mode (async_app.py); opens no connections until then
+        self.async_client = AsyncLLMClient()
+        self.prompt_builder = prompt_builder or PromptBuilder(
+            max_tokens=Config.PROMPT_MAX_TOKENS,
+            summary_tokens=Config.PROMPT_SUMMARY_TOKENS,
+            max_messages=Config.PROMPT_HISTORY_MESSAGES
+        )
+        # Optional ResponseCache for turns without personal data
+        self.response_cache = response_cache
+
+    def _cacheable(self, messages):
+        if self.response_cache is None:
+            return False
+        # Skip the system prompt; the summary note is checked along with user messages
+        return not any(
+            m['role'] != 'assistant' and extractor.has_personal_data(m['content']) for m in messages[1:]
+        )
+
+    def _cached_reply(self, messages):
+        # Any configured model's answer will do; look them up in preference order
+        try:
+            for model in self.model_selector.models:
+                reply = self.response_cache.get(ResponseCache.make_key(model['model'], messages))
+                if reply is not None:
+                    return reply
+        except Exception:
+            logger.exception("Response cache lookup failed")
+        return None
+
+    def _cache_reply(self, model_config, messages, ai_reply):
+        # Called once the model call is over: a cache error (e.g. a locked SQLite file) only costs the entry
+        try:
+            self.response_cache.set(ResponseCache.make_key(model_config['model'], messages), ai_reply)
+        except Exception:
+            logger.exception("Response cache write failed")
     
-    def generate_response(self, user_message, customer_info=None, products=None, missing_info=None, conversation_history=None):
+    def _build_prompt(self, user_message, conversation_history=None, summary=None):
         # Compose the conversation for the LLM
-        messages = []
         # Improved system prompt for a strong intro
         system_prompt = (
             "You are a friendly virtual assistant for LaptopStore, an e-commerce site specializing in laptops. "
@@ -38,29 +249,30 @@ class AIService:
             "If you don't know a field, leave it empty. Only reply with a single JSON object, no extra text. Example:\n"
             '{"name": "", "email": "", "phone": "", "looking_for": "", "reply": "Welcome to LaptopStore! To get started, may I have your name, email, phone number, and what kind of laptop you are looking for?"}'
         )
-        messages.append({"role": "system", "content": system_prompt})
-        # Add conversation history if available
-        if conversation_history:
-            for msg in conversation_history:
-                role = "user" if msg['type'] == "user" else "assistant"
-                messages.append({"role": role, "content": msg['content']})
-        # Add the latest user message
-        messages.append({"role": "user", "content": user_message})
-
-        # Get the current model config
-        model_config = self.model_selector.get_current_model()
-        try:
-            ai_reply = call_github_ai_model(messages, model_config)
-        except Exception as e:
-            # If you hit a limit or error, switch to the next model and try again
-            model_config = self.model_selector.switch_to_next_model()
-            ai_reply = call_github_ai_model(messages, model_config)
+        # History is fitted into the token budget; older turns go into the rolling summary
+        summary = summary or {}
+        return self.prompt_builder.build(
+            system_prompt,
+            conversation_history,
+            user_message,
+            summary=summary.get('text', ''),
+            summary_until=summary.get('until')
+        )
+
+    @staticmethod
+    def _with_prompt_info(result, prompt):
+        result['prompt_tokens'] = prompt.tokens
+        result['summary'] = {'text': prompt.summary, 'until': prompt.summary_until}
+        return result
 
+    def _parse_reply(self, ai_reply, parsed=None):
         # Try to parse the reply as JSON
-        parsed = None
-        try:
-            parsed = json.loads(ai_reply)
-        except Exception:
+        if parsed is None:
+            try:
+                parsed = json.loads(ai_reply)
+            except Exception:
+                parsed = None
+        if not isinstance(parsed, dict):
             # If parsing fails, fallback to plain text
             return {
                 "response": ai_reply,
@@ -79,7 +291,158 @@ class AIService:
             "needs_customer_info": False,
             "extracted_fields": updated_fields
         }
-    
+
+    def _prepare(self, user_message, conversation_history, summary):
+        """Build the prompt; returns (prompt, cacheable, cached result or None)."""
+        prompt = self._build_prompt(user_message, conversation_history, summary)
+        cacheable = self._cacheable(prompt.messages)
+        if cacheable:
+            ai_reply = self._cached_reply(prompt.messages)
+            if ai_reply is not None:
+                return prompt, cacheable, self._with_prompt_info(self._parse_reply(ai_reply), prompt)
+        return prompt, cacheable, None
+
+    def generate_response(self, user_message, customer_info=None, products=None, missing_info=None, conversation_history=None, summary=None):
+        prompt, cacheable, cached = self._prepare(user_message, conversation_history, summary)
+        if cached is not None:
+            return cached
+        messages = prompt.messages
+
+        def call(model_config):
+            return model_config, call_github_ai_model(messages, model_config, self.client)
+
+        # Route to the healthiest model, retrying on others within the budget
+        model_config, ai_reply = self.model_selector.call(call)
+        if cacheable:
+            self._cache_reply(model_config, messages, ai_reply)
+
+        return self._with_prompt_info(self._parse_reply(ai_reply), prompt)
+
+    async def agenerate_response(self, user_message, customer_info=None, products=None, missing_info=None, conversation_history=None, summary=None):
+        """asyncio variant of generate_response; awaits the model API without blocking a thread."""
+        prompt, cacheable, cached = self._prepare(user_message, conversation_history, summary)
+        if cached is not None:
+            return cached
+        messages = prompt.messages
+
+        async def call(model_config):
+            return model_config, await self.async_client.chat_completion(messages, model_config)
+
+        model_config, ai_reply = await self.model_selector.acall(call)
+        if cacheable:
+            self._cache_reply(model_config, messages, ai_reply)
+
+        return self._with_prompt_info(self._parse_reply(ai_reply), prompt)
+
+    def stream_response(self, user_message, customer_info=None, products=None, missing_info=None, conversation_history=None, summary=None):
+        """Streaming variant of generate_response.
+
+        Yields ('delta', text) tuples as the "reply" field arrives, then a
+        single ('done', result) where result has the generate_response shape.
+        """
+        prompt, cacheable, cached = self._prepare(user_message, conversation_history, summary)
+        if cached is not None:
+            yield 'delta', cached['response']
+            yield 'done', cached
+            return
+        messages = prompt.messages
+
+        parser = ReplyStreamParser()
+        tried = []
+        last_error = None
+        for _ in range(Config.MODEL_RETRY_BUDGET):
+            model_config, wait = self.model_selector.next_model(tried)
+            if wait is not None:
+                time.sleep(wait)
+                model_config, _ = self.model_selector.next_model(tried)
+            self._check_available(model_config)
+            start = time.monotonic()
+            try:
+                for chunk in self.client.stream_chat_completion(messages, model_config):
+                    delta = parser.feed(chunk)
+                    if delta:
+                        yield 'delta', delta
+            except GeneratorExit:
+                # The client went away mid-stream; the model itself was fine
+                self.model_selector.record_success(model_config, time.monotonic() - start)
+                raise
+            except Exception as e:
+                self.model_selector.record_failure(model_config, e, time.monotonic() - start)
+                # Only fall back when nothing has been sent to the client yet
+                if parser.text():
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                self.model_selector.record_abandoned(model_config)
+                raise
+            self._finish_stream(model_config, start, cacheable, messages, parser)
+            break
+        else:
+            raise last_error
+
+        yield 'done', self._with_prompt_info(self._parse_reply(parser.text(), parser.result()), prompt)
+
+    async def astream_response(self, user_message, customer_info=None, products=None, missing_info=None, conversation_history=None, summary=None):
+        """asyncio variant of stream_response, yielding the same tuples."""
+        prompt, cacheable, cached = self._prepare(user_message, conversation_history, summary)
+        if cached is not None:
+            yield 'delta', cached['response']
+            yield 'done', cached
+            return
+        messages = prompt.messages
+
+        parser = ReplyStreamParser()
+        tried = []
+        last_error = None
+        for _ in range(Config.MODEL_RETRY_BUDGET):
+            model_config, wait = self.model_selector.next_model(tried)
+            if wait is not None:
+                await asyncio.sleep(wait)
+                model_config, _ = self.model_selector.next_model(tried)
+            self._check_available(model_config)
+            start = time.monotonic()
+            try:
+                async for chunk in self.async_client.stream_chat_completion(messages, model_config):
+                    delta = parser.feed(chunk)
+                    if delta:
+                        yield 'delta', delta
+            except GeneratorExit:
+                self.model_selector.record_success(model_config, time.monotonic() - start)
+                raise
+            except Exception as e:
+                self.model_selector.record_failure(model_config, e, time.monotonic() - start)
+                if parser.text():
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled: the probe, if this was one, must not stay in flight
+                self.model_selector.record_abandoned(model_config)
+                raise
+            self._finish_stream(model_config, start, cacheable, messages, parser)
+            break
+        else:
+            raise last_error
+
+        yield 'done', self._with_prompt_info(self._parse_reply(parser.text(), parser.result()), prompt)
+
+    @staticmethod
+    def _check_available(model_config):
+        if model_config is None:
+            raise Exception("No model available: all circuit breakers are open")
+
+    def _finish_stream(self, model_config, start, cacheable, messages, parser):
+        self.model_selector.record_success(model_config, time.monotonic() - start)
+        if cacheable:
+            self._cache_reply(model_config, messages, parser.text())
+
+    def template_response(self, route, customer_info, missing_info=None, products=None):
+        """Reply for a turn the TurnRouter sent to a template ('ask' or 'recommend'); no model call."""
+        if route == 'recommend':
+            return self._generate_product_recommendations(customer_info, products)
+        return self._ask_for_missing_info(missing_info or [], customer_info)
+
     def _is_customer_info_complete(self, customer_info):
         required_fields = ['name', 'email', 'phone', 'looking_for']
         return all(field in customer_info and customer_info[field] for field in required_fields)
@@ -124,6 +487,7 @@ class AIService:
         }
     
     def _generate_product_recommendations(self, customer_info, products):
+        # products come best first from Product.recommend
         name = customer_info.get('name', 'there')
         looking_for = customer_info.get('looking_for', 'products')
         budget = customer_info.get('budget', '')
@@ -139,8 +503,11 @@ class AIService:
                 
                 # Add personalized notes based on preferences
                 if customer_info.get('brand_preference'):
-                    if customer_info['brand_preference'].lower() in product['name'].lower():
+                    if customer_info['brand_preference'].lower() in (product.get('brand') or product['name']).lower():
                         response += f"\n   ✨ This matches your preferred brand!"
+                if customer_info.get('color_preference'):
+                    if customer_info['color_preference'].lower() == (product.get('color') or '').lower():
+                        response += f"\n   🎨 Available in {product['color']}, your preferred color!"
         
         response += f"\n\nWhich of these {looking_for} interests you the most? I can provide more details or help you with the purchase process!"
         
@@ -0,0 +1,328 @@
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, defaultdict
+
+INDEXED_FIELDS = ('category', 'brand', 'tags', 'ram', 'color')
+# Regex match results kept per index: at most this many patterns, holding this many product keys in all
+MATCH_CACHE_PATTERNS = 256
+MATCH_CACHE_KEYS = 1000000
+
+
+def _field_values(field, doc):
+    if field == 'ram':
+        value = (doc.get('specs') or {}).get('ram')
+    else:
+        value = doc.get(field)
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    # $regex only ever matches string values
+    return [v for v in values if isinstance(v, str)]
+
+
+def _compile(pattern):
+    # Same semantics as {'$regex': pattern, '$options': 'i'}
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+
+
+class MatchCache:
+    """Regex match results by pattern, least recently used first out.
+
+    Patterns come from what customers type, so the cache is bounded by the
+    number of entries and by their total size (weight, e.g. the number of
+    product keys in a result). Safe to share between threads without a
+    lock: a race only costs a recomputed match.
+    """
+
+    def __init__(self, max_entries=MATCH_CACHE_PATTERNS, max_weight=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.entries = OrderedDict()
+        self.weight = 0
+
+    def get(self, key):
+        try:
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+        except KeyError:
+            return None
+
+    def put(self, key, value, weight=0):
+        replaced = self.entries.pop(key, None)
+        if replaced is not None:
+            self.weight -= replaced[1]
+        self.entries[key] = (value, weight)
+        self.weight += weight
+        while len(self.entries) > self.max_entries or (self.max_weight is not None and self.weight > self.max_weight):
+            try:
+                _, (_, dropped) = self.entries.popitem(last=False)
+            except KeyError:
+                break
+            self.weight -= dropped
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _project(doc, fields):
+    # Like a Mongo inclusion projection: just fields (and _id); None keeps everything
+    if fields is None:
+        return dict(doc)
+    projected = {'_id': doc['_id']}
+    for field in fields:
+        if field in doc:
+            projected[field] = doc[field]
+    return projected
+
+
+class CatalogIndex:
+    """In-process inverted index over the products collection.
+
+    Keeps every product document in memory with postings (value -> set of
+    product keys) for category, brand, tags, RAM and color, plus a sorted
+    price array for budget ranges. Regex filters are evaluated once per
+    distinct value rather than once per document, which is what makes the
+    unanchored case-insensitive matches of Product.find_by_query_and_preferences
+    cheap. Results come back in insertion (natural) order like a collection scan.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.docs = {}
+        self.order = {}
+        self._next_seq = 0
+        self.postings = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        self.prices = []
+        self.loaded = False
+        self.version = 0
+        self._match_cache = MatchCache(max_weight=MATCH_CACHE_KEYS)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def load(self, docs):
+        # Built aside, so queries keep running on the current contents until the swap
+        fresh = CatalogIndex()
+        for doc in docs:
+            fresh._add(doc, sort_price=False)
+        fresh.prices.sort()
+        with self.lock:
+            self.docs = fresh.docs
+            self.order = fresh.order
+            self._next_seq = fresh._next_seq
+            self.postings = fresh.postings
+            self.prices = fresh.prices
+            self.loaded = True
+            self._changed()
+
+    def sync(self, docs):
+        """Bring the index in line with a full listing, touching only what changed.
+
+        The listing (a cursor, usually) is read and compared without the
+        lock; only the changes are applied under it.
+        """
+        docs = list(docs)
+        with self.lock:
+            current = dict(self.docs)
+        changed = [doc for doc in docs if current.get(str(doc['_id'])) != doc]
+        seen = {str(doc['_id']) for doc in docs}
+        removed = [key for key in current if key not in seen]
+        with self.lock:
+            for doc in changed:
+                self.upsert(doc)
+            for key in removed:
+                self.remove(key)
+            self.loaded = True
+
+    def upsert(self, doc):
+        with self.lock:
+            key = str(doc['_id'])
+            if key in self.docs:
+                self._discard(key)
+            self._add(doc)
+            self._changed()
+
+    def remove(self, product_id):
+        with self.lock:
+            key = str(product_id)
+            if key in self.docs:
+                self._discard(key)
+                del self.docs[key]
+                del self.order[key]
+                self._changed()
+
+    def _add(self, doc, sort_price=True):
+        key = str(doc['_id'])
+        self.docs[key] = doc
+        if key not in self.order:
+            self.order[key] = self._next_seq
+            self._next_seq += 1
+        for field in INDEXED_FIELDS:
+            for value in _field_values(field, doc):
+                self.postings[field][value].add(key)
+        price = doc.get('price')
+        if isinstance(price, (int, float)):
+            if sort_price:
+                insort(self.prices, (price, key))
+            else:
+                self.prices.append((price, key))
+
+    def _discard(self, key):
+        # Leaves self.docs[key] in place so an upsert keeps the natural order
+        doc = self.docs[key]
+        for field in INDEXED_FIELDS:
+            postings = self.postings[field]
+            for value in _field_values(field, doc):
+                postings[value].discard(key)
+                if not postings[value]:
+                    del postings[value]
+        price = doc.get('price')
+        if isinstance(price, (int, float)):
+            i = bisect_left(self.prices, (price, key))
+            if i < len(self.prices) and self.prices[i] == (price, key):
+                del self.prices[i]
+
+    def _changed(self):
+        self.version += 1
+        self._match_cache = MatchCache(max_weight=MATCH_CACHE_KEYS)
+
+    def _matching(self, field, pattern):
+        """Keys of documents where some value of field matches pattern."""
+        cache_key = (field, pattern)
+        keys = self._match_cache.get(cache_key)
+        if keys is None:
+            regex = _compile(pattern)
+            keys = set()
+            for value, value_keys in self.postings[field].items():
+                if regex.search(value):
+                    keys |= value_keys
+            self._match_cache.put(cache_key, keys, len(keys))
+        return keys
+
+    def price_range(self, min_price=None, max_price=None):
+        lo = 0 if min_price is None else bisect_left(self.prices, (min_price, ''))
+        hi = len(self.prices) if max_price is None else bisect_right(self.prices, (max_price, '\uffff'))
+        return {key for _, key in self.prices[lo:hi]}
+
+    def query(self, category=None, brand=None, ram=None, exclude_brand=None, tag=None, color=None,
+              min_price=None, max_price=None, limit=None, fields=None):
+        """Return matching documents in natural order.
+
+        category, brand, ram and exclude_brand are case-insensitive regexes (as
+        in the Mongo query they replace); tag and color are exact values.
+        With fields, each result holds only those keys (and _id), like a
+        Mongo projection.
+        """
+        with self.lock:
+            include = []
+            if category:
+                include.append(self._matching('category', category))
+            if brand:
+                include.append(self._matching('brand', brand))
+            if ram:
+                include.append(self._matching('ram', ram))
+            if tag:
+                include.append(self.postings['tags'].get(tag, set()))
+            if color:
+                include.append(self.postings['color'].get(color, set()))
+            if min_price is not None or max_price is not None:
+                include.append(self.price_range(min_price, max_price))
+            exclude = self._matching('brand', exclude_brand) if exclude_brand else set()
+
+            if not include:
+                keys = (k for k in self.docs if k not in exclude)
+            else:
+                include.sort(key=len)
+                smallest, rest = include[0], include[1:]
+                if limit is not None and len(smallest) > 4 * limit:
+                    # Broad match: walk in natural order and stop at the limit
+                    keys = (k for k in self.docs
+                            if k in smallest and k not in exclude and all(k in s for s in rest))
+                else:
+                    candidates = [k for k in smallest if k not in exclude and all(k in s for s in rest)]
+                    keys = iter(sorted(candidates, key=self.order.__getitem__))
+
+            results = []
+            for key in keys:
+                results.append(_project(self.docs[key], fields))
+                if limit is not None and len(results) >= limit:
+                    break
+            return results
+
+    def get_many(self, product_ids, fields=None):
+        """Documents for product_ids in the order given, skipping any no longer in the catalog."""
+        with self.lock:
+            docs = (self.docs.get(str(product_id)) for product_id in product_ids)
+            return [_project(doc, fields) for doc in docs if doc is not None]
+
+    def find_by_query_and_preferences(self, query, preferences, limit=None, fields=None):
+        # Mirrors Product.find_by_query_and_preferences, including exclude_brand
+        # replacing the brand filter rather than combining with it
+        brand = preferences.get('brand_preference')
+        exclude_brand = preferences.get('exclude_brand')
+        return self.query(
+            category=query or None,
+            brand=None if exclude_brand else brand,
+            ram=preferences.get('ram'),
+            exclude_brand=exclude_brand,
+            limit=limit,
+            fields=fields
+        )
+
+
+class CatalogRefresher:
+    """Keeps a CatalogIndex in step with the products collection.
+
+    Uses a MongoDB change stream when the deployment supports one (replica
+    sets and Atlas) and falls back to polling the collection every
+    `interval` seconds otherwise.
+    """
+
+    def __init__(self, index, collection, interval=60):
+        self.index = index
+        self.collection = collection
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='catalog-refresher', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        try:
+            self._watch()
+        except Exception:
+            # No change streams on standalone servers: poll instead
+            while not self.stopped.wait(self.interval):
+                try:
+                    self.index.sync(self.collection.find())
+                except Exception:
+                    time.sleep(self.interval)
+
+    def _watch(self):
+        with self.collection.watch(full_document='updateLookup') as stream:
+            # Catch anything written between the initial load and the stream opening
+            self.index.sync(self.collection.find())
+            while not self.stopped.is_set():
+                change = stream.try_next()
+                if change is None:
+                    self.stopped.wait(1)
+                    continue
+                operation = change['operationType']
+                if operation == 'delete':
+                    self.index.remove(change['documentKey']['_id'])
+                elif change.get('fullDocument') is not None:
+                    self.index.upsert(change['fullDocument'])
+                elif operation in ('drop', 'invalidate'):
+                    self.index.load([])
@@ -0,0 +1,256 @@
+import csv
+import json
+import os
+import time
+
+from services.product_ranker import parse_gb
+
+# Columns that hold numbers or flags; everything else is stored as a stripped string
+FLOAT_FIELDS = ('price', 'rating')
+LIST_SEPARATOR = '|'
+TRUE_VALUES = frozenset(('true', 'yes', 'y', '1', 'in stock', 'in_stock'))
+FALSE_VALUES = frozenset(('false', 'no', 'n', '0', 'out of stock', 'out_of_stock'))
+
+
+class RowError(ValueError):
+    """A catalog row that cannot be loaded; the load skips it and counts it."""
+
+
+def _offset_lines(f, position):
+    # Decoded lines of a binary file; position[0] is the byte offset after the last line handed out
+    for line in iter(f.readline, b''):
+        position[0] += len(line)
+        yield line.decode('utf-8-sig' if position[0] == len(line) else 'utf-8')
+
+
+def read_rows(path, fmt=None, offset=0):
+    """Yield (row, offset after it) from a CSV or JSONL file, one row at a time.
+
+    CSV columns name fields directly, with dotted names for specs
+    ("specs.ram") and '|' between tags. A load resumes from a byte offset
+    returned with an earlier row.
+    """
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, 'rb') as f:
+        position = [0]
+        lines = _offset_lines(f, position)
+        if fmt == 'csv':
+            header = next(csv.reader(lines), None)
+            if header is None:
+                return
+            if offset > position[0]:
+                f.seek(offset)
+                position[0] = offset
+            for values in csv.reader(lines):
+                if values:
+                    yield dict(zip(header, values)), position[0]
+        else:
+            if offset:
+                f.seek(offset)
+                position[0] = offset
+            for line in lines:
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        row = RowError(f"invalid JSON: {e}")
+                    yield row, position[0]
+
+
+def _number(value, field):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value).strip().replace(',', '').lstrip('$')
+    try:
+        return float(text)
+    except ValueError:
+        raise RowError(f"{field}: not a number: {value!r}")
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value > 0
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    # A stock count
+    return _number(text, 'in_stock') > 0
+
+
+def _size(value, field):
+    text = str(value).strip()
+    # A bare number is in GB
+    gb = parse_gb(f"{text}GB" if text.replace('.', '', 1).isdigit() else text)
+    if not gb:
+        raise RowError(f"{field}: not a size: {value!r}")
+    return gb
+
+
+def normalize_product(row):
+    """The $set document for one catalog row, keyed by sku.
+
+    Only the fields present in the row are set, so a nightly price and
+    stock feed (sku, price, in_stock) updates just those. Prices and
+    ratings become floats, in_stock a bool (a stock count counts as in
+    stock when positive), tags a lowercase list. specs.ram is rewritten
+    as "16GB" with the number alongside in specs.ram_gb (the RAM filter
+    matches the text, so that stays a string); specs.storage gets
+    specs.storage_gb the same way.
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("not an object")
+    fields = {}
+    for key, value in row.items():
+        if key is None or value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if key == 'specs' and isinstance(value, dict):
+            fields.update((f'specs.{k}', v) for k, v in value.items() if v not in (None, ''))
+        else:
+            fields[key.strip()] = value
+    sku = str(fields.pop('sku', '')).strip()
+    if not sku:
+        raise RowError("missing sku")
+    fields.pop('_id', None)
+
+    doc = {}
+    for key, value in fields.items():
+        if key in FLOAT_FIELDS:
+            value = _number(value, key)
+            if value < 0 or (key == 'rating' and value > 5):
+                raise RowError(f"{key}: out of range: {value}")
+        elif key == 'in_stock':
+            value = _flag(value)
+        elif key == 'tags':
+            items = value if isinstance(value, list) else str(value).split(LIST_SEPARATOR)
+            value = [str(tag).strip().lower() for tag in items if str(tag).strip()]
+        elif key == 'specs.ram':
+            gb = _size(value, key)
+            doc['specs.ram_gb'] = gb
+            value = f"{gb / 1024:g}TB" if gb >= 1024 else f"{gb:g}GB"
+        elif key == 'specs.storage':
+            doc['specs.storage_gb'] = _size(value, key)
+            value = ' '.join(str(value).split())
+        elif isinstance(value, str):
+            value = value.strip()
+        doc[key] = value
+    doc['sku'] = sku
+    return doc
+
+
+class Checkpoint:
+    """Progress of one load, kept in a JSON file next to the source.
+
+    Written after every committed batch; a later load of the same file
+    (same size and modification time) resumes after the last batch. It is
+    removed once the load completes.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        self.state = {'offset': 0, 'rows': 0, 'upserted': 0, 'modified': 0, 'rejected': 0}
+
+    def resume(self):
+        """Load the saved progress; False when there is none for this source."""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get('source') != self.source:
+            return False
+        self.state.update(saved['state'])
+        return True
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'source': self.source, 'state': self.state}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class CatalogIngest:
+    """Streams a CSV or JSONL catalog into the products collection.
+
+    Rows are read one at a time, normalized (normalize_product) and
+    upserted by SKU in batches of batch_size through
+    Product.upsert_many_by_sku, an unordered bulk_write. Rows that fail
+    validation, or that the server rejects, are counted and logged (up to
+    max_errors of them) without stopping the load. After each batch a
+    Checkpoint records the byte offset reached, so an interrupted load
+    picks up from there. Once the whole file is in, the product model's
+    in-process caches are brought up to date.
+    """
+
+    def __init__(self, product_model, batch_size=1000, checkpoint_path=None, max_errors=20, log=print,
+                 progress_interval=5.0):
+        self.product_model = product_model
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.max_errors = max_errors
+        self.log = log
+        self.progress_interval = progress_interval
+        self.errors = 0
+
+    def run(self, path, fmt=None, resume=True):
+        """Load path; returns the counts of the load and its rows per second."""
+        checkpoint = Checkpoint(self.checkpoint_path or f"{path}.checkpoint", path)
+        if resume and checkpoint.resume():
+            self.log(f"Resuming after {checkpoint.state['rows']} row(s)")
+        state = checkpoint.state
+        start = last_report = time.perf_counter()
+        loaded = 0
+        rows = 0
+        position = state['offset']
+        batch = []
+        for row, position in read_rows(path, fmt, state['offset']):
+            rows += 1
+            try:
+                batch.append(normalize_product(row))
+            except RowError as e:
+                self._reject(state, f"row {state['rows'] + rows}: {e}")
+            if len(batch) >= self.batch_size:
+                self._commit(batch, checkpoint, position, rows)
+                loaded += rows
+                rows = 0
+                batch = []
+                if time.perf_counter() - last_report >= self.progress_interval:
+                    last_report = time.perf_counter()
+                    self.log(f"{state['rows']} row(s), {loaded / (last_report - start):.0f} rows/s")
+        self._commit(batch, checkpoint, position, rows)
+        loaded += rows
+        elapsed = time.perf_counter() - start
+        checkpoint.clear()
+        self.product_model.invalidate_caches()
+        return dict(state, elapsed=round(elapsed, 2), rows_per_second=round(loaded / elapsed) if elapsed else None)
+
+    def _commit(self, batch, checkpoint, offset, rows):
+        state = checkpoint.state
+        if batch:
+            result, errors = self.product_model.upsert_many_by_sku(batch)
+            state['upserted'] += result['upserted']
+            state['modified'] += result['modified']
+            for error in errors:
+                self._reject(state, f"sku {batch[error['index']]['sku']}: {error['errmsg']}")
+        state['offset'] = offset
+        state['rows'] += rows
+        checkpoint.save()
+
+    def _reject(self, state, message):
+        state['rejected'] += 1
+        self.errors += 1
+        if self.errors <= self.max_errors:
+            self.log(f"Skipped {message}")
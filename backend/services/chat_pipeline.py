@@ -0,0 +1,422 @@
+import contextvars
+import time
+from services.turn_router import LLM, RECOMMEND, new_fields
+from utils.extraction import extract_customer_info
+from utils.helpers import get_missing_info, merge_customer_data
+from utils.metrics import chat_stage_seconds
+from utils.serialization import CARD_LIMIT, CONVERSATION_STATE, CUSTOMER_PROFILE, PRODUCT_CARD
+
+# Customer fields the product lookup depends on
+PRODUCT_INPUTS = ('looking_for', 'brand_preference', 'exclude_brand', 'ram', 'budget', 'color_preference')
+
+
+def _product_inputs(customer_data, missing_info):
+    return tuple(customer_data.get(field) for field in PRODUCT_INPUTS), tuple(missing_info)
+
+
+class ChatTurn:
+    """State carried through the stages of one chat turn."""
+
+    def __init__(self, user_message, session_id, session_customer_data=None):
+        self.user_message = user_message
+        self.session_id = session_id
+        self.session_customer_data = session_customer_data or {}
+        self.conversation_id = None
+        self.customer_id = None
+        self.customer_data = {}
+        # Profile fields this turn's message filled
+        self.extracted = []
+        self.history = []
+        self.summary = {}
+        # The conversation's turn counter, this turn included
+        self.conversation_turns = None
+        # Server-side Session when the pipeline has a session store
+        self.session = None
+        self.ai_response = None
+        # LLM, or the template the TurnRouter chose
+        self.route = LLM
+        self.missing_info = []
+        self.products = []
+        # Milliseconds spent in each stage, in the order they ran
+        self.timings = {}
+        # Stage name -> (inputs, future) of work running on the stage pool during the LLM call
+        self.pending = {}
+
+
+class ChatPipeline:
+    """Runs a chat turn as a fixed sequence of stages, each exactly once.
+
+    start():  session -> conversation -> history -> user message -> regex extraction -> route
+    the LLM call (generate() or stream(), or agenerate()/astream() under asyncio)
+    finish(): merge LLM fields -> customer upsert -> session -> products -> bot message
+
+    The customer is written once, after the LLM-extracted fields are merged,
+    with a single find_one_and_update, and products are looked up once
+    against the final customer data. The conversation's rolling summary is
+    written back only when the prompt builder folded new messages into it.
+    Documents are fetched through the views in utils/serialization.py and
+    left as pymongo returns them; the response encoder converts ObjectIds.
+
+    With a session_store, the customer profile carried between turns is
+    loaded from it by session_id (falling back to the session_customer_data
+    passed in for a session it does not know yet) and written back only
+    when it changed.
+
+    With a router, turns the regex extraction fully explains are answered
+    from AIService's templates instead of the LLM; the rest of the turn is
+    the same. A recommendation turn looks its products up while routing.
+
+    With a stage_pool (a bounded ThreadPoolExecutor shared by all turns),
+    stages that do not depend on each other run side by side: session and
+    conversation, then history and extraction. The user message insert, a
+    customer upsert of the regex-extracted data and the product lookup are
+    started on the pool before the LLM call and joined in finish(); the
+    upsert is repeated and the products re-filtered only if the LLM's fields
+    changed their inputs. Session, bot message and summary are written
+    together. If the LLM call fails, work that has not started is cancelled.
+    """
+
+    def __init__(self, customer_model, product_model, conversation_model, ai_service, history_limit=5,
+                 session_store=None, router=None, stage_pool=None):
+        self.customer_model = customer_model
+        self.product_model = product_model
+        self.conversation_model = conversation_model
+        self.ai_service = ai_service
+        self.history_limit = history_limit
+        self.session_store = session_store
+        self.router = router
+        self.stage_pool = stage_pool
+
+    def run(self, user_message, session_id, session_customer_data=None):
+        turn = self.start(user_message, session_id, session_customer_data)
+        self.generate(turn)
+        return turn, self.finish(turn)
+
+    def start(self, user_message, session_id, session_customer_data=None):
+        turn = ChatTurn(user_message, session_id, session_customer_data)
+        if self.stage_pool is not None:
+            self._start_concurrent(turn)
+            return turn
+        self._run_stages(turn, [
+            self.load_session,
+            self.load_conversation,
+            # History first, so it holds the previous turns and not this message again
+            self.load_history,
+            self.record_user_message,
+            self.extract,
+            self.route
+        ])
+        return turn
+
+    def _start_concurrent(self, turn):
+        self._run_parallel(turn, [self.load_session, self.load_conversation])
+        # History is read before this message is recorded, as in the serial order
+        self._run_parallel(turn, [self.load_history, self.extract])
+        self._run_stages(turn, [self.route])
+        turn.pending['record_user_message'] = (None, self._submit(turn, 'record_user_message',
+                                                                  self.record_user_message, turn))
+        customer_data = dict(turn.customer_data)
+        turn.pending['save_customer'] = (customer_data, self._submit(turn, 'save_customer',
+                                                                     self._upsert_customer, customer_data))
+        if turn.route != RECOMMEND:
+            turn.pending['find_products'] = (
+                _product_inputs(turn.customer_data, turn.missing_info),
+                self._submit(turn, 'find_products', self._lookup_products, customer_data, list(turn.missing_info))
+            )
+
+    def finish(self, turn):
+        if turn.pending:
+            self._run_stages(turn, [self.merge_llm_fields, self.join_customer, self.join_products,
+                                    self.join_user_message])
+            self._run_parallel(turn, [self.save_session, self.record_bot_message, self.save_summary])
+            return self.build_response(turn)
+        self._run_stages(turn, [
+            self.merge_llm_fields,
+            self.save_customer,
+            self.save_session,
+            self.find_products,
+            self.record_bot_message,
+            self.save_summary
+        ])
+        return self.build_response(turn)
+
+    def _run_stages(self, turn, stages):
+        for stage in stages:
+            start = time.perf_counter()
+            stage(turn)
+            self.record_timing(turn, stage.__name__, start)
+
+    def _submit(self, turn, name, fn, *args):
+        """Run fn(*args) on the stage pool, in a copy of the caller's context (round trip counting), timed as name."""
+        def timed():
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.record_timing(turn, name, start)
+        return self.stage_pool.submit(contextvars.copy_context().run, timed)
+
+    def _run_parallel(self, turn, stages):
+        """Run independent stages at once: the first in this thread, the others on the stage pool."""
+        futures = [self._submit(turn, stage.__name__, stage, turn) for stage in stages[1:]]
+        try:
+            self._run_stages(turn, stages[:1])
+        finally:
+            for future in futures:
+                future.result()
+
+    def abort(self, turn):
+        """Cancel the background work of a turn whose LLM call failed.
+
+        Work still queued is dropped; work already running finishes and its
+        result is ignored. The user message insert is left to complete, as
+        the serial pipeline records it before the LLM call.
+        """
+        for name, (_, future) in turn.pending.items():
+            if name != 'record_user_message':
+                future.cancel()
+        turn.pending = {}
+
+    @staticmethod
+    def record_timing(turn, name, start):
+        """Add the time since `start` (a perf_counter value) to the turn and the stage histogram."""
+        elapsed = time.perf_counter() - start
+        turn.timings[name] = turn.timings.get(name, 0.0) + elapsed * 1000
+        chat_stage_seconds.observe(elapsed, stage=name)
+
+    def load_session(self, turn):
+        if self.session_store is None:
+            return
+        turn.session = self.session_store.load(turn.session_id)
+        if not turn.session.is_new:
+            turn.session_customer_data = turn.session.profile
+
+    def load_conversation(self, turn):
+        conversation, created = self.conversation_model.get_or_create(turn.session_id, projection=CONVERSATION_STATE)
+        turn.conversation_id = str(conversation['_id'])
+        turn.conversation_turns = conversation.get('turns')
+        if not created:
+            turn.summary = {'text': conversation.get('summary', ''), 'until': conversation.get('summary_until')}
+
+    def record_user_message(self, turn):
+        self.conversation_model.add_message(
+            conversation_id=turn.conversation_id,
+            message_type='user',
+            content=turn.user_message
+        )
+
+    def extract(self, turn):
+        extracted = extract_customer_info(turn.user_message, turn.conversation_id, turn.session_customer_data)
+        turn.customer_data = merge_customer_data(turn.session_customer_data, extracted)
+        turn.extracted = new_fields(turn.session_customer_data, turn.customer_data)
+        turn.missing_info = get_missing_info(turn.customer_data)
+
+    def load_history(self, turn):
+        # Every message the rolling summary does not cover yet; the prompt builder folds the older ones
+        turn.history = self.conversation_model.get_recent_messages(
+            turn.conversation_id, limit=self.history_limit, since=turn.summary.get('until'),
+            turns=turn.conversation_turns
+        )
+
+    def route(self, turn):
+        if self.router is None:
+            return
+        route = self.router.route(turn.user_message, turn.customer_data, turn.missing_info, turn.extracted)
+        if route == RECOMMEND:
+            self._find_products(turn)
+            if not turn.products:
+                route = LLM
+        turn.route = route
+        self.router.record(route)
+
+    def respond_from_template(self, turn):
+        """Set turn.ai_response from the routed template; False for a turn that needs the LLM."""
+        if turn.route == LLM:
+            return False
+        start = time.perf_counter()
+        turn.ai_response = self.ai_service.template_response(
+            turn.route, turn.customer_data, missing_info=turn.missing_info, products=turn.products
+        )
+        self.record_timing(turn, 'template', start)
+        return True
+
+    def generate(self, turn):
+        if self.respond_from_template(turn):
+            return turn.ai_response
+        start = time.perf_counter()
+        try:
+            turn.ai_response = self.ai_service.generate_response(
+                user_message=turn.user_message,
+                customer_info=turn.customer_data,
+                missing_info=turn.missing_info,
+                conversation_history=turn.history,
+                summary=turn.summary
+            )
+        except BaseException:
+            self.abort(turn)
+            raise
+        self.record_timing(turn, 'llm', start)
+        return turn.ai_response
+
+    def stream(self, turn):
+        """Yield reply deltas; turn.ai_response is set once the stream ends."""
+        if self.respond_from_template(turn):
+            yield turn.ai_response['response']
+            return
+        start = time.perf_counter()
+        try:
+            for kind, payload in self.ai_service.stream_response(
+                user_message=turn.user_message,
+                customer_info=turn.customer_data,
+                missing_info=turn.missing_info,
+                conversation_history=turn.history,
+                summary=turn.summary
+            ):
+                if kind == 'delta':
+                    yield payload
+                else:
+                    turn.ai_response = payload
+        except BaseException:
+            # Also a client that disconnects mid-stream (GeneratorExit)
+            self.abort(turn)
+            raise
+        self.record_timing(turn, 'llm', start)
+
+    async def agenerate(self, turn):
+        """generate() for the asyncio serving mode."""
+        if self.respond_from_template(turn):
+            return turn.ai_response
+        start = time.perf_counter()
+        try:
+            turn.ai_response = await self.ai_service.agenerate_response(
+                user_message=turn.user_message,
+                customer_info=turn.customer_data,
+                missing_info=turn.missing_info,
+                conversation_history=turn.history,
+                summary=turn.summary
+            )
+        except BaseException:
+            self.abort(turn)
+            raise
+        self.record_timing(turn, 'llm', start)
+        return turn.ai_response
+
+    async def astream(self, turn):
+        """stream() for the asyncio serving mode."""
+        if self.respond_from_template(turn):
+            yield turn.ai_response['response']
+            return
+        start = time.perf_counter()
+        try:
+            async for kind, payload in self.ai_service.astream_response(
+                user_message=turn.user_message,
+                customer_info=turn.customer_data,
+                missing_info=turn.missing_info,
+                conversation_history=turn.history,
+                summary=turn.summary
+            ):
+                if kind == 'delta':
+                    yield payload
+                else:
+                    turn.ai_response = payload
+        except BaseException:
+            self.abort(turn)
+            raise
+        self.record_timing(turn, 'llm', start)
+
+    def merge_llm_fields(self, turn):
+        if 'extracted_fields' in turn.ai_response:
+            turn.customer_data = merge_customer_data(turn.customer_data, turn.ai_response['extracted_fields'])
+
+    def save_customer(self, turn):
+        self._set_customer(turn, self._upsert_customer(turn.customer_data))
+
+    def _upsert_customer(self, customer_data):
+        if customer_data.get('email'):
+            return self.customer_model.upsert_by_email(customer_data, projection=CUSTOMER_PROFILE)
+        return None
+
+    @staticmethod
+    def _set_customer(turn, customer):
+        if customer is not None:
+            turn.customer_id = str(customer['_id'])
+            turn.customer_data = customer
+        turn.missing_info = get_missing_info(turn.customer_data)
+
+    def join_customer(self, turn):
+        """save_customer, reusing the upsert made during the LLM call unless the LLM added fields."""
+        customer_data, future = turn.pending.pop('save_customer')
+        customer = future.result()
+        if turn.customer_data == customer_data:
+            self._set_customer(turn, customer)
+        else:
+            self.save_customer(turn)
+
+    def save_session(self, turn):
+        if turn.session is not None:
+            turn.session.update(turn.customer_data, turn.customer_id, turn.conversation_id)
+            self.session_store.save(turn.session)
+
+    def find_products(self, turn):
+        if turn.route != RECOMMEND:
+            # A recommendation turn already has the products its reply lists
+            self._find_products(turn)
+
+    def _find_products(self, turn):
+        products = self._lookup_products(turn.customer_data, turn.missing_info)
+        if products is not None:
+            turn.products = products
+
+    def _lookup_products(self, customer_data, missing_info):
+        """Product cards for the customer; None while too much is missing to recommend."""
+        if not missing_info or (customer_data.get('looking_for') and len(missing_info) <= 1):
+            return self.product_model.recommend(
+                customer_data.get('looking_for', 'laptop'),
+                customer_data,
+                limit=CARD_LIMIT,
+                projection=PRODUCT_CARD
+            )
+        return None
+
+    def join_products(self, turn):
+        """find_products, reusing the lookup made during the LLM call unless its inputs changed since."""
+        if 'find_products' not in turn.pending:
+            return
+        inputs, future = turn.pending.pop('find_products')
+        products = future.result()
+        if _product_inputs(turn.customer_data, turn.missing_info) != inputs:
+            # The LLM's fields or the stored profile changed the query: filter again (index-backed, cheap)
+            self._find_products(turn)
+        elif products is not None:
+            turn.products = products
+
+    def join_user_message(self, turn):
+        """Wait for the user message insert, so the bot reply is stored after it."""
+        turn.pending.pop('record_user_message')[1].result()
+
+    def record_bot_message(self, turn):
+        self.conversation_model.add_message(
+            conversation_id=turn.conversation_id,
+            message_type='bot',
+            content=turn.ai_response['response']
+        )
+
+    def save_summary(self, turn):
+        summary = turn.ai_response.get('summary')
+        if summary and summary.get('until') != turn.summary.get('until'):
+            self.conversation_model.update(turn.conversation_id, {
+                'summary': summary['text'],
+                'summary_until': summary['until']
+            })
+
+    def build_response(self, turn):
+        return {
+            'response': turn.ai_response['response'],
+            'products': turn.products,
+            'session_id': turn.session_id,
+            'needs_customer_info': turn.ai_response.get('needs_customer_info', False),
+            'customer_info': turn.customer_data if turn.customer_data else None,
+            'missing_info': turn.missing_info,
+            'conversation_id': str(turn.conversation_id),
+            'prompt_tokens': turn.ai_response.get('prompt_tokens')
+        }
@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from models.Customer import Customer
+from models.product import Product
+from models.Conversation import Conversation
+from services.admission import AdmissionController
+from services.ai_service import AIService
+from services.catalog_index import CatalogIndex
+from services.chat_pipeline import ChatPipeline
+from services.customer_repository import CustomerRepository
+from services.product_ranker import ProductRanker
+from services.response_cache import ResponseCache
+from services.semantic_search import SemanticIndex
+from services.session_store import create_session_store
+from services.single_flight import SessionFlights
+from services.turn_router import TurnRouter
+from utils.write_behind import WriteBehindBuffer
+from utils.customer_cache import CustomerCache
+from utils.history_cache import HistoryCache
+
+
+class Services:
+    """Models, caches and the chat pipeline shared by the requests of one app."""
+
+    def __init__(self, db, config=Config):
+        self.db = db
+        self.customer_model = Customer(db)
+        self.customer_cache = CustomerCache(
+            max_entries=config.CUSTOMER_CACHE_SIZE,
+            max_bytes=config.CUSTOMER_CACHE_MAX_BYTES,
+            ttl=config.CUSTOMER_CACHE_TTL
+        ) if config.CUSTOMER_CACHE_ENABLED else None
+        # What the rest of the app reads and writes customers through
+        self.customers = CustomerRepository(self.customer_model, self.customer_cache) \
+            if self.customer_cache is not None else self.customer_model
+        self.product_model = Product(
+            db,
+            index=CatalogIndex() if config.CATALOG_INDEX_ENABLED else None,
+            refresh_interval=config.CATALOG_REFRESH_INTERVAL,
+            ranker=ProductRanker() if config.RANKING_ENABLED else None,
+            semantic=SemanticIndex(
+                path=config.SEMANTIC_INDEX_PATH,
+                min_score=config.SEMANTIC_MIN_SCORE
+            ) if config.SEMANTIC_SEARCH_ENABLED else None
+        )
+        self.message_buffer = WriteBehindBuffer(
+            db.messages,
+            max_batch=config.MESSAGE_FLUSH_BATCH,
+            flush_interval=config.MESSAGE_FLUSH_INTERVAL,
+            max_pending=config.MESSAGE_BUFFER_MAX
+        ) if config.MESSAGE_WRITE_BEHIND else None
+        self.history_cache = HistoryCache(
+            capacity=config.HISTORY_CACHE_MESSAGES,
+            max_conversations=config.HISTORY_CACHE_CONVERSATIONS,
+            max_bytes=config.HISTORY_CACHE_MAX_BYTES,
+            ttl=config.HISTORY_CACHE_TTL
+        ) if config.HISTORY_CACHE_ENABLED else None
+        self.conversation_model = Conversation(
+            db,
+            message_buffer=self.message_buffer,
+            history_cache=self.history_cache,
+            verify_history=config.HISTORY_CACHE_VERIFY
+        )
+        self.response_cache = ResponseCache(
+            max_entries=config.RESPONSE_CACHE_SIZE,
+            ttl=config.RESPONSE_CACHE_TTL,
+            path=config.RESPONSE_CACHE_PATH,
+            max_rows=config.RESPONSE_CACHE_MAX_ROWS
+        ) if config.RESPONSE_CACHE_ENABLED else None
+        self.ai_service = AIService(response_cache=self.response_cache)
+        self.admission = AdmissionController(
+            max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+            max_queue=config.ADMISSION_MAX_QUEUE,
+            queue_timeout=config.ADMISSION_QUEUE_TIMEOUT,
+            session_limit=config.SESSION_RATE_LIMIT or None,
+            storage_uri=config.RATE_LIMIT_STORAGE_URI
+        ) if config.ADMISSION_ENABLED else None
+        self.flights = SessionFlights(
+            max_wait=config.SESSION_FLIGHT_WAIT,
+            max_queue=config.SESSION_FLIGHT_QUEUE
+        ) if config.SESSION_FLIGHT_ENABLED else None
+        self.session_store = create_session_store(config, db)
+        self.router = TurnRouter(
+            min_coverage=config.ROUTER_MIN_COVERAGE,
+            max_words=config.ROUTER_MAX_WORDS,
+            recommend=config.ROUTER_RECOMMEND
+        ) if config.ROUTER_ENABLED else None
+        self.stage_pool = ThreadPoolExecutor(
+            max_workers=config.STAGE_POOL_WORKERS,
+            thread_name_prefix='chat-stage'
+        ) if config.CONCURRENT_STAGES else None
+        self.chat_pipeline = ChatPipeline(
+            self.customers, self.product_model, self.conversation_model, self.ai_service,
+            history_limit=config.PROMPT_HISTORY_FETCH,
+            session_store=self.session_store,
+            router=self.router,
+            stage_pool=self.stage_pool
+        )
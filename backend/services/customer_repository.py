@@ -0,0 +1,70 @@
+def _project(doc, projection):
+    # An inclusion projection such as utils.serialization.CUSTOMER_PROFILE; None keeps everything
+    if doc is None or projection is None:
+        return doc
+    return {field: value for field, value in doc.items() if field == '_id' or projection.get(field)}
+
+
+class CustomerRepository:
+    """The Customer model's methods, read through and written through a CustomerCache.
+
+    Reads are answered from the cache when it holds the customer; writes
+    go to MongoDB first and then replace the cached profile, so readers in
+    this process see a write as soon as it returns. Every write reaches
+    MongoDB, even one that matches the cached profile: another process may
+    have changed the document since this one cached it.
+    """
+
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+
+    def get_by_id(self, customer_id):
+        doc = self.cache.get_by_id(customer_id)
+        if doc is None:
+            token = self.cache.begin_read()
+            doc = self.model.get_by_id(customer_id)
+            if doc is not None:
+                self.cache.fill(doc, token)
+        return doc
+
+    def get_by_email(self, email):
+        doc = self.cache.get_by_email(email)
+        if doc is None:
+            token = self.cache.begin_read()
+            doc = self.model.get_by_email(email)
+            if doc is not None:
+                self.cache.fill(doc, token)
+        return doc
+
+    def create(self, data):
+        write = self.cache.begin_write(email=data.get('email'))
+        doc = None
+        try:
+            customer_id = self.model.create(data)
+            # insert_one has set data['_id']
+            doc = data
+        finally:
+            self.cache.finish_write(write, doc)
+        return customer_id
+
+    def update(self, customer_id, data):
+        # update_one does not return the document: the cached profile is dropped, and read again when needed
+        write = self.cache.begin_write(customer_id=customer_id, email=data.get('email'))
+        try:
+            self.model.update(customer_id, data)
+        finally:
+            self.cache.finish_write(write)
+
+    def upsert_by_email(self, data, projection=None):
+        write = self.cache.begin_write(email=data['email'])
+        doc = None
+        try:
+            # The whole document, to cache; projected for the caller below
+            doc = self.model.upsert_by_email(data)
+        finally:
+            self.cache.finish_write(write, doc)
+        return _project(doc, projection)
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,245 @@
+import re
+import threading
+
+import numpy as np
+
+from services.catalog_index import MatchCache, _compile, _project
+
+# Share of the score each signal contributes
+WEIGHTS = {
+    'budget': 0.35,
+    'rating': 0.25,
+    'tags': 0.15,
+    'specs': 0.1,
+    'color': 0.15,
+}
+# Out-of-stock products keep this fraction of their score
+OUT_OF_STOCK_FACTOR = 0.5
+# Over budget, the budget score falls from 0.5 to 0 at this fraction above the budget
+OVER_BUDGET_TOLERANCE = 0.25
+
+_NUMBER = re.compile(r'(\d+(?:[.,]\d+)*)\s*(k\b)?', re.IGNORECASE)
+_SIZE = re.compile(r'(\d+(?:\.\d+)?)\s*(TB|GB)', re.IGNORECASE)
+_WORD = re.compile(r'[a-z0-9-]+')
+
+
+def parse_budget(text):
+    """'$1,500', '1500 USD' or '2k' -> 1500.0 / 2000.0; None when there is no amount."""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text) or None
+    match = _NUMBER.search(str(text))
+    if not match:
+        return None
+    value = float(match.group(1).replace(',', ''))
+    if match.group(2):
+        value *= 1000
+    return value or None
+
+
+def parse_gb(text):
+    """'16GB' -> 16, '1TB SSD' -> 1024; 0 when unknown."""
+    match = _SIZE.search(text) if isinstance(text, str) else None
+    if not match:
+        return 0.0
+    value = float(match.group(1))
+    return value * 1024 if match.group(2).upper() == 'TB' else value
+
+
+class _Codes:
+    """Dictionary encoding of a string column: distinct values and one code per product."""
+
+    def __init__(self, values):
+        self.values = []
+        lookup = {}
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        self.codes = codes
+        self.lookup = lookup
+        self._matches = MatchCache()
+
+    def matching(self, pattern):
+        """Boolean mask of products whose value matches a case-insensitive regex (as $regex does)."""
+        table = self._matches.get(pattern)
+        if table is None:
+            regex = _compile(pattern)
+            table = np.array([isinstance(v, str) and regex.search(v) is not None for v in self.values], dtype=bool)
+            self._matches.put(pattern, table)
+        return table[self.codes] if len(table) else np.zeros(len(self.codes), dtype=bool)
+
+    def equal(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+
+class _Columns:
+    """Column-wise snapshot of the catalog; never modified once built."""
+
+    def __init__(self, docs, version):
+        n = len(docs)
+        self.docs = docs
+        self.version = version
+        self.size = n
+        self.price = np.array([_number(d.get('price')) for d in docs], dtype=np.float64)
+        self.rating = np.array([_number(d.get('rating')) for d in docs], dtype=np.float64)
+        self.in_stock = np.array([d.get('in_stock', True) is not False for d in docs], dtype=bool)
+        specs = [d.get('specs') or {} for d in docs]
+        self.category = _Codes([d.get('category') for d in docs])
+        self.brand = _Codes([d.get('brand') for d in docs])
+        self.ram = _Codes([s.get('ram') for s in specs])
+        self.color = _Codes([(d.get('color') or '').lower() for d in docs])
+        # Sizes are parsed once per distinct string
+        storage = _Codes([s.get('storage') for s in specs])
+        self.ram_gb = np.array([parse_gb(v) for v in self.ram.values], dtype=np.float64)[self.ram.codes]
+        self.storage_gb = np.array([parse_gb(v) for v in storage.values], dtype=np.float64)[storage.codes]
+
+        # One bit per distinct tag, packed into 64-bit words
+        self.tag_bit = {}
+        rows = []
+        for doc in docs:
+            bits = 0
+            for tag in _tags(doc):
+                bit = self.tag_bit.get(tag)
+                if bit is None:
+                    bit = self.tag_bit[tag] = len(self.tag_bit)
+                bits |= 1 << bit
+            rows.append(bits)
+        words = max(1, (len(self.tag_bit) + 63) // 64)
+        self.tags = np.array(
+            [[(bits >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(words)] for bits in rows], dtype=np.uint64
+        ).reshape(n, words)
+
+        # RAM and storage on a log scale, relative to the catalog maximum
+        ram = np.log2(1 + self.ram_gb)
+        storage = np.log2(1 + self.storage_gb)
+        self.spec_score = 0.5 * ram / max(ram.max(initial=0), 1) + 0.5 * storage / max(storage.max(initial=0), 1)
+
+    def mask(self, query, preferences):
+        # Same filters as Product.find_by_query_and_preferences
+        mask = np.ones(self.size, dtype=bool)
+        if query:
+            mask &= self.category.matching(query)
+        if preferences.get('exclude_brand'):
+            mask &= ~self.brand.matching(preferences['exclude_brand'])
+        elif preferences.get('brand_preference'):
+            mask &= self.brand.matching(preferences['brand_preference'])
+        if preferences.get('ram'):
+            mask &= self.ram.matching(preferences['ram'])
+        return mask
+
+    def scores(self, candidates, query, preferences):
+        """Score of each product index in candidates, between 0 and 1."""
+        score = WEIGHTS['rating'] * self.rating[candidates] / 5.0
+
+        budget = parse_budget(preferences.get('budget'))
+        if budget:
+            price = self.price[candidates]
+            under = 0.5 + 0.5 * np.clip(price / budget, 0.0, 1.0)
+            over = 0.5 * np.clip(1 - (price - budget) / (OVER_BUDGET_TOLERANCE * budget), 0.0, 1.0)
+            score += WEIGHTS['budget'] * np.where(price <= budget, under, over)
+        else:
+            score += WEIGHTS['budget'] * 0.5
+
+        wanted = [self.tag_bit[w] for w in set(_WORD.findall((query or '').lower())) if w in self.tag_bit]
+        if wanted:
+            matched = np.zeros(len(candidates), dtype=np.float64)
+            for bit in wanted:
+                matched += (self.tags[candidates, bit // 64] & np.uint64(1 << (bit % 64))) != 0
+            score += WEIGHTS['tags'] * matched / len(wanted)
+
+        score += WEIGHTS['specs'] * self.spec_score[candidates]
+
+        color = preferences.get('color_preference')
+        if color:
+            score += WEIGHTS['color'] * self.color.equal(color.lower())[candidates]
+
+        return np.where(self.in_stock[candidates], score, score * OUT_OF_STOCK_FACTOR)
+
+
+class ProductRanker:
+    """Scores the whole catalog against a customer's preferences in NumPy.
+
+    The catalog is held column-wise (price, rating, RAM and storage in GB,
+    stock flag, dictionary-coded category/brand/RAM/color strings and a tag
+    bitset per product), rebuilt from the CatalogIndex when its version
+    changes. top_k() applies the same filters as
+    Product.find_by_query_and_preferences as boolean masks, scores every
+    candidate in one pass and picks the best k with argpartition:
+
+        budget  price at or just under the budget scores highest, falling
+                to 0 at OVER_BUDGET_TOLERANCE above it
+        rating  rating / 5
+        tags    share of the words of looking_for that are product tags
+        specs   RAM and storage relative to the catalog maximum
+        color   1 when the color matches color_preference
+
+    Out-of-stock products keep OUT_OF_STOCK_FACTOR of their score; equal
+    scores keep catalog order.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns = None
+        self.rebuilding = False
+
+    def sync(self, index):
+        """The current column snapshot.
+
+        Only the first build blocks; after a catalog change the previous
+        snapshot keeps serving while a fresh one is built in the background.
+        """
+        columns = self.columns
+        if columns is not None and columns.version == index.version:
+            return columns
+        if columns is None:
+            with self.lock:
+                if self.columns is None:
+                    self._rebuild(index)
+            return self.columns
+        with self.lock:
+            if not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self._rebuild, args=(index,), name='ranker-rebuild', daemon=True).start()
+        return columns
+
+    def _rebuild(self, index):
+        try:
+            with index.lock:
+                version = index.version
+                docs = list(index.docs.values())
+            self.columns = _Columns(docs, version)
+        finally:
+            self.rebuilding = False
+
+    def top_k(self, index, query, preferences, k=3, fields=None):
+        """The k best products for the request, best first, as copies limited to fields (and _id)."""
+        columns = self.sync(index)
+        candidates = np.flatnonzero(columns.mask(query, preferences))
+        if not len(candidates) or k <= 0:
+            return []
+        score = columns.scores(candidates, query, preferences)
+        if len(candidates) > k:
+            # Everything scoring at least the k-th best, so ties at the cut are settled by catalog order
+            kth = score[np.argpartition(-score, k - 1)[k - 1]]
+            best = np.flatnonzero(score >= kth)
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.lexsort((candidates[best], -score[best]))][:k]
+        return [_project(columns.docs[i], fields) for i in candidates[best]]
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+def _tags(doc):
+    tags = doc.get('tags') or []
+    return [t.lower() for t in tags if isinstance(t, str)]
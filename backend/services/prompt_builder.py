@@ -0,0 +1,116 @@
+import re
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+# Chat formats add a few tokens per message and for priming the reply
+_MESSAGE_OVERHEAD = 4
+_REPLY_PRIMING = 3
+
+
+def estimate_tokens(text):
+    """Local estimate of the BPE token count of text.
+
+    Every word and punctuation mark is at least one token and long words are
+    split roughly every 8 characters. For English chat text this lands within
+    about 10% of the cl100k count, erring on the high side.
+    """
+    tokens = 0
+    for piece in _PIECE.findall(text or ''):
+        tokens += 1 + (len(piece) - 1) // 8
+    return tokens
+
+
+def message_tokens(message):
+    return _MESSAGE_OVERHEAD + estimate_tokens(message['content'])
+
+
+def _summary_line(msg, max_chars):
+    speaker = 'Customer' if msg['type'] == 'user' else 'Assistant'
+    text = ' '.join((msg.get('content') or '').split())
+    # Keep the first sentence, cut at a word boundary if still too long
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(' ', 1)[0] + '...'
+    return f"{speaker}: {text}"
+
+
+class Prompt:
+    """An assembled prompt and the summary state it was built with."""
+
+    def __init__(self, messages, tokens, summary, summary_until):
+        self.messages = messages
+        self.tokens = tokens
+        self.summary = summary
+        self.summary_until = summary_until
+
+
+class PromptBuilder:
+    """Fits system prompt, history and user message into a token budget.
+
+    The newest history messages, at most max_messages of them, are kept
+    verbatim for as long as they fit in max_tokens. Older ones are folded
+    into a rolling summary: one short line per message, appended to the
+    summary carried over from earlier turns and trimmed from the front to
+    summary_tokens. summary_until is the timestamp of the newest folded
+    message, so a message is only ever folded once; the caller persists both
+    on the conversation and passes in every message newer than summary_until,
+    which max_messages keeps short.
+    """
+
+    def __init__(self, max_tokens=1500, summary_tokens=250, line_chars=120, max_messages=20):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.line_chars = line_chars
+        self.max_messages = max_messages
+
+    def build(self, system_prompt, history, user_message, summary='', summary_until=None):
+        history = history or []
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": user_message}
+        fixed = message_tokens(system) + message_tokens(user) + _REPLY_PRIMING
+        # Leave room for the summary message whenever there is or may be one
+        available = self.max_tokens - fixed - _MESSAGE_OVERHEAD - self.summary_tokens
+
+        kept = []
+        used = 0
+        for msg in reversed(history):
+            entry = {"role": "user" if msg['type'] == 'user' else "assistant", "content": msg['content']}
+            cost = message_tokens(entry)
+            if used + cost > available or len(kept) >= self.max_messages:
+                break
+            kept.append(entry)
+            used += cost
+        kept.reverse()
+
+        folded = history[:len(history) - len(kept)]
+        summary, summary_until = self.fold(summary, summary_until, folded)
+
+        messages = [system]
+        tokens = fixed + used
+        if summary:
+            note = {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+            messages.append(note)
+            tokens += message_tokens(note)
+        messages.extend(kept)
+        messages.append(user)
+        return Prompt(messages, tokens, summary, summary_until)
+
+    def fold(self, summary, summary_until, messages):
+        """Append messages newer than summary_until to the summary."""
+        lines = summary.split('\n') if summary else []
+        for msg in messages:
+            timestamp = msg.get('timestamp')
+            if summary_until is not None and (timestamp is None or timestamp <= summary_until):
+                continue
+            lines.append(_summary_line(msg, self.line_chars))
+            if timestamp is not None:
+                summary_until = timestamp
+        # Rolling: the oldest lines go first once the summary is over budget
+        costs = [estimate_tokens(line) + 1 for line in lines]
+        total = sum(costs)
+        start = 0
+        while start < len(lines) - 1 and total > self.summary_tokens:
+            total -= costs[start]
+            start += 1
+        return '\n'.join(lines[start:]), summary_until
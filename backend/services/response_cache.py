@@ -0,0 +1,112 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r'\s+')
+# SQLite writes between prunes of expired and surplus rows
+PRUNE_EVERY = 100
+
+
+def normalize_text(text):
+    # "Hi!", " hi " and "HI." are the same opener
+    return _WHITESPACE.sub(' ', text or '').strip().casefold().rstrip('.!?')
+
+
+class ResponseCache:
+    """LRU + TTL cache of raw LLM replies, optionally backed by SQLite.
+
+    Keys are SHA-256 hashes of the model name and the normalized prompt
+    messages (system prompt, history and user message). With a `path`, entries
+    are also written to a SQLite file so they survive restarts; memory stays
+    bounded by max_entries either way. The file is pruned every PRUNE_EVERY
+    writes: expired rows go, and then all but the max_rows newest.
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, path=None, max_rows=10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.unpruned_writes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._prune(time.time())
+            self.db.commit()
+
+    @staticmethod
+    def make_key(model, messages):
+        normalized = [[m['role'], normalize_text(m['content'])] for m in messages]
+        payload = json.dumps([model, normalized], separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self.entries[key]
+                entry = None
+            if entry is None and self.db is not None:
+                row = self.db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at >= ?", (key, now)
+                ).fetchone()
+                if row:
+                    entry = (row[1], row[0])
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        entry = (time.time() + self.ttl, value)
+        with self.lock:
+            self._store(key, entry)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, entry[0])
+                )
+                self.unpruned_writes += 1
+                if self.unpruned_writes >= PRUNE_EVERY:
+                    self._prune(entry[0] - self.ttl)
+                self.db.commit()
+
+    def _prune(self, now):
+        self.db.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        # Every row gets the same TTL, so the latest expiries are the newest writes
+        self.db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT ?)", (self.max_rows,)
+        )
+        self.unpruned_writes = 0
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,402 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+# Hashed feature space; collisions are negligible at catalog vocabulary sizes
+DIM = 1 << 18
+# Document text and its weight in the vector
+FIELD_WEIGHTS = {'name': 1.0, 'description': 1.0, 'tags': 2.0, 'specs': 0.5}
+# Mongo projection with just the fields that are indexed
+TEXT_PROJECTION = {field: 1 for field in FIELD_WEIGHTS}
+# Character n-grams of each word ("light" also matches "lightweight"), sharing this much weight
+NGRAM = 4
+GRAM_WEIGHT = 1.0
+STOP_WORDS = frozenset("""
+    a an and any are as at be for from good great i i'm im in is it like me my need of on or
+    some something that the this to want with looking
+""".split())
+# Features found in more than this share of products say nothing about them and are dropped
+# (in catalogs of at least MAX_DF_MIN products; "laptop" in a laptop shop)
+MAX_DF = 0.5
+MAX_DF_MIN = 1000
+# Rebuild once the incremental segment holds this share of the catalog (and at least MERGE_MIN products)
+MERGE_RATIO = 0.1
+MERGE_MIN = 1000
+FORMAT = 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode()) & (DIM - 1)
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word):
+    """Feature ids and weights of one word: the word itself and its character n-grams."""
+    feats = [_hash('w:' + word)]
+    weights = [1.0]
+    if len(word) >= NGRAM:
+        padded = f'<{word}>'
+        grams = [padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)]
+        feats += [_hash('g:' + gram) for gram in grams]
+        weights += [GRAM_WEIGHT / len(grams)] * len(grams)
+    return np.array(feats, dtype=np.int64), np.array(weights, dtype=np.float64)
+
+
+def _fields(doc):
+    specs = doc.get('specs')
+    specs = ' '.join(str(v) for v in specs.values() if isinstance(v, (str, int, float))) if isinstance(specs, dict) else ''
+    tags = doc.get('tags') or []
+    return (
+        ('name', doc.get('name') or ''),
+        ('description', doc.get('description') or ''),
+        ('tags', ' '.join(t for t in tags if isinstance(t, str))),
+        ('specs', specs),
+    )
+
+
+def _term_frequencies(texts):
+    """Weighted term frequencies of a batch of documents as (rows, feats, tf), one entry per (row, feat)."""
+    word_ids = {}
+    tok_word = array('q')
+    seg_row = array('q')
+    seg_weight = array('d')
+    seg_length = array('q')
+    for row, fields in enumerate(texts):
+        for field, text in fields:
+            ids = [word_ids.setdefault(w, len(word_ids)) for w in _WORD.findall(text.lower()) if w not in STOP_WORDS]
+            if ids:
+                tok_word.extend(ids)
+                seg_row.append(row)
+                seg_weight.append(FIELD_WEIGHTS[field])
+                seg_length.append(len(ids))
+    words = list(word_ids)
+    if not words:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+
+    # Combine repeated words per document before expanding them into features
+    seg_length = np.frombuffer(seg_length, dtype=np.int64)
+    rows = np.repeat(np.frombuffer(seg_row, dtype=np.int64), seg_length)
+    key, inverse = np.unique(rows * len(words) + np.frombuffer(tok_word, dtype=np.int64), return_inverse=True)
+    word_tf = np.bincount(inverse, weights=np.repeat(np.frombuffer(seg_weight, dtype=np.float64), seg_length))
+    rows, word = np.divmod(key, len(words))
+
+    features = [_word_features(w) for w in words]
+    counts = np.array([len(f) for f, _ in features], dtype=np.int64)
+    word_feats = np.concatenate([f for f, _ in features])
+    word_weights = np.concatenate([w for _, w in features])
+    starts = np.cumsum(counts) - counts
+
+    per_word = counts[word]
+    total = int(per_word.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(per_word) - per_word, per_word)
+    source = np.repeat(starts[word], per_word) + offsets
+    rows = np.repeat(rows, per_word)
+    values = np.repeat(word_tf, per_word) * word_weights[source]
+
+    key, inverse = np.unique(rows * DIM + word_feats[source], return_inverse=True)
+    rows, feats = np.divmod(key, DIM)
+    return rows, feats, np.bincount(inverse, weights=values)
+
+
+def _weigh(rows, feats, tf, idf, row_count):
+    """TF-IDF weights, L2-normalized per row."""
+    weights = tf * idf[feats]
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=row_count))
+    norms[norms == 0] = 1.0
+    return (weights / norms[rows]).astype(np.float32)
+
+
+def _digest(keys, texts):
+    digest = hashlib.sha1()
+    for key, fields in zip(keys, texts):
+        digest.update(repr((key, fields)).encode())
+    return digest.hexdigest()
+
+
+def _top(candidates, scores, k):
+    """The k best of candidates (row numbers), best first; equal scores keep row order."""
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class _Matrix:
+    """The bulk of the index: TF-IDF vectors stored feature-major (postings), never modified."""
+
+    def __init__(self, keys, ids, indptr, rows, weights, idf, digest):
+        self.keys = keys
+        self.ids = ids
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.idf = idf
+        self.digest = digest
+
+    @classmethod
+    def build(cls, keys, ids, texts, digest):
+        n = len(keys)
+        rows, feats, tf = _term_frequencies(texts)
+        df = np.bincount(feats, minlength=DIM)
+        idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        if n >= MAX_DF_MIN:
+            idf[df > MAX_DF * n] = 0
+            keep = idf[feats] > 0
+            rows, feats, tf = rows[keep], feats[keep], tf[keep]
+            df = np.bincount(feats, minlength=DIM)
+        weights = _weigh(rows, feats, tf, idf, n)
+        # Rows are already ascending within each feature, so a stable sort gives sorted postings
+        order = np.argsort(feats, kind='stable')
+        indptr = np.zeros(DIM + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        return cls(keys, ids, indptr, rows[order].astype(np.int32), weights[order], idf, digest)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        suffix = f'.{os.getpid()}.tmp'
+        for name in ('indptr', 'rows', 'weights', 'idf'):
+            with open(os.path.join(path, name + '.npy' + suffix), 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(os.path.join(path, name + '.npy' + suffix), os.path.join(path, name + '.npy'))
+        # Written last: a meta.json that matches means the arrays next to it are complete
+        with open(os.path.join(path, 'meta.json' + suffix), 'w') as f:
+            json.dump({'format': FORMAT, 'dim': DIM, 'digest': self.digest, 'keys': self.keys}, f)
+        os.replace(os.path.join(path, 'meta.json' + suffix), os.path.join(path, 'meta.json'))
+
+    @classmethod
+    def open(cls, path, keys, ids, digest):
+        """The saved matrix, memory-mapped, if it was built from exactly these documents; else None."""
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('format') != FORMAT or meta.get('dim') != DIM or meta.get('digest') != digest:
+                return None
+            arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                      for name in ('indptr', 'rows', 'weights', 'idf')}
+        except (OSError, ValueError):
+            return None
+        return cls(keys, ids, digest=digest, **arrays)
+
+
+class _Snapshot:
+    """What a search reads: the matrix, vectors added since it was built, and which rows are current."""
+
+    def __init__(self, matrix, keys, ids, alive, delta_rows, delta_feats, delta_weights):
+        self.matrix = matrix
+        self.keys = keys
+        self.ids = ids
+        self.alive = alive
+        self.delta_rows = delta_rows
+        self.delta_feats = delta_feats
+        self.delta_weights = delta_weights
+
+
+class SemanticIndex:
+    """Offline semantic search over product names, descriptions, tags and specs.
+
+    Each product is a TF-IDF vector over hashed features: its words and
+    their character n-grams, so a query such as "something light for
+    college" finds products described as lightweight or great for college
+    whatever their category. Vectors are L2-normalized and stored
+    feature-major, so a query only reads the postings of its own features;
+    scores are cosine similarities and the best k come from argpartition.
+
+    With a path, the matrix is saved there as .npy files and opened
+    memory-mapped at the next start when the catalog has not changed
+    (checked with a digest of the indexed text), so workers share it through
+    the page cache instead of each building its own.
+
+    Products inserted or changed after the build are vectorized with the
+    build's IDF weights into a small incremental segment and their old rows
+    are masked out; once that segment holds MERGE_RATIO of the catalog, the
+    matrix is rebuilt on a background thread while searches go on.
+    """
+
+    def __init__(self, path=None, min_score=0.05):
+        self.path = path
+        self.min_score = min_score
+        self.lock = threading.Lock()
+        self.snapshot = None
+        # Documents indexed, by key; the rows they occupy
+        self.docs = {}
+        self.position = {}
+        self.version = None
+        self.rebuilding = False
+        self.opened_from_disk = False
+
+    @property
+    def loaded(self):
+        return self.snapshot is not None
+
+    def load(self, docs):
+        """Index docs from scratch (or open the saved matrix if it matches them)."""
+        docs = {str(doc['_id']): doc for doc in docs}
+        with self.lock:
+            self._install(docs, *self._matrix(docs))
+
+    def sync(self, index):
+        """Bring the index in line with a CatalogIndex, re-vectorizing only what changed."""
+        if self.version == index.version and self.snapshot is not None:
+            return
+        with index.lock:
+            version = index.version
+            docs = dict(index.docs)
+        with self.lock:
+            if self.snapshot is None:
+                self._install(docs, *self._matrix(docs))
+            else:
+                changed = [doc for key, doc in docs.items() if self.docs.get(key) is not doc]
+                removed = [key for key in self.docs if key not in docs]
+                self._apply(changed, removed)
+            self.version = version
+
+    def upsert(self, doc):
+        with self.lock:
+            self._apply([doc], [])
+
+    def remove(self, product_id):
+        with self.lock:
+            self._apply([], [str(product_id)])
+
+    def _matrix(self, docs):
+        keys = list(docs)
+        ids = [doc['_id'] for doc in docs.values()]
+        texts = [_fields(doc) for doc in docs.values()]
+        digest = _digest(keys, texts)
+        matrix = _Matrix.open(self.path, keys, ids, digest) if self.path else None
+        opened = matrix is not None
+        if matrix is None:
+            matrix = _Matrix.build(keys, ids, texts, digest)
+            if self.path:
+                matrix.save(self.path)
+        return matrix, opened
+
+    def _install(self, docs, matrix, opened):
+        empty = np.zeros(0, dtype=np.int64)
+        self.snapshot = _Snapshot(
+            matrix, list(matrix.keys), list(matrix.ids), np.ones(len(matrix.keys), dtype=bool),
+            empty, empty, np.zeros(0, dtype=np.float32)
+        )
+        self.docs = docs
+        self.position = {key: row for row, key in enumerate(matrix.keys)}
+        self.opened_from_disk = opened
+
+    def _apply(self, changed, removed):
+        # Called with self.lock held; publishes a new snapshot
+        snap = self.snapshot
+        if snap is None or not (changed or removed):
+            return
+        alive = snap.alive.copy()
+        for key in removed:
+            alive[self.position.pop(key)] = False
+            del self.docs[key]
+        delta_rows, delta_feats, delta_weights = snap.delta_rows, snap.delta_feats, snap.delta_weights
+        if changed:
+            start = len(snap.keys)
+            n = len(snap.matrix.keys)
+            for row, doc in enumerate(changed, start):
+                key = str(doc['_id'])
+                if key in self.position:
+                    alive[self.position[key]] = False
+                self.position[key] = row
+                self.docs[key] = doc
+                # Shared with older snapshots, which only read the rows they know about
+                snap.keys.append(key)
+                snap.ids.append(doc['_id'])
+            rows, feats, tf = _term_frequencies([_fields(doc) for doc in changed])
+            alive = np.concatenate([alive, np.ones(len(changed), dtype=bool)])
+            delta_rows = np.concatenate([delta_rows, rows + (start - n)])
+            delta_feats = np.concatenate([delta_feats, feats])
+            delta_weights = np.concatenate([delta_weights, _weigh(rows, feats, tf, snap.matrix.idf, len(changed))])
+        self.snapshot = _Snapshot(snap.matrix, snap.keys, snap.ids, alive, delta_rows, delta_feats, delta_weights)
+
+        delta = len(alive) - len(snap.matrix.keys)
+        if delta >= max(MERGE_MIN, MERGE_RATIO * len(snap.matrix.keys)) and not self.rebuilding:
+            self.rebuilding = True
+            threading.Thread(target=self._merge, name='semantic-rebuild', daemon=True).start()
+
+    def _merge(self):
+        try:
+            with self.lock:
+                docs = dict(self.docs)
+            matrix, opened = self._matrix(docs)
+            with self.lock:
+                # Re-apply whatever changed while the matrix was being built
+                current = self.docs
+                self._install(docs, matrix, opened)
+                changed = [doc for key, doc in current.items() if docs.get(key) is not doc]
+                removed = [key for key in docs if key not in current]
+                self._apply(changed, removed)
+        finally:
+            self.rebuilding = False
+
+    def search(self, text, k=10, allowed=None):
+        """[(_id, score)] of the k products most similar to text, best first.
+
+        allowed, a set of product keys (str of _id), restricts the results.
+        Products scoring below min_score are left out.
+        """
+        snap = self.snapshot
+        if snap is None or k <= 0:
+            return []
+        matrix = snap.matrix
+        rows, feats, tf = _term_frequencies([(('name', text),)])
+        if not len(feats):
+            return []
+        starts, ends = matrix.indptr[feats], matrix.indptr[feats + 1]
+        hit = ends > starts
+        # Features no product has would only scale every score down
+        query = _weigh(rows, feats, np.where(hit | np.isin(feats, snap.delta_feats), tf, 0.0), matrix.idf, 1)
+        if not query.any():
+            return []
+
+        n = len(matrix.keys)
+        size = len(snap.alive)
+        scores = np.zeros(size, dtype=np.float64)
+        if hit.any():
+            postings = [(matrix.rows[s:e], matrix.weights[s:e] * q) for s, e, q in zip(starts[hit], ends[hit], query[hit])]
+            scores[:n] = np.bincount(
+                np.concatenate([r for r, _ in postings]), weights=np.concatenate([w for _, w in postings]), minlength=n
+            )
+        if len(snap.delta_feats):
+            # feats from _term_frequencies are sorted
+            at = np.minimum(np.searchsorted(feats, snap.delta_feats), len(feats) - 1)
+            values = np.where(feats[at] == snap.delta_feats, query[at] * snap.delta_weights, 0.0)
+            scores[n:] = np.bincount(snap.delta_rows, weights=values, minlength=size - n)
+
+        candidates = np.flatnonzero(snap.alive & (scores >= self.min_score))
+        if allowed is None:
+            best = _top(candidates, scores, k)
+        else:
+            # Look at the best few first and widen only when too few of them are allowed
+            fetch = 4 * k
+            while True:
+                best = [row for row in _top(candidates, scores, fetch) if snap.keys[row] in allowed]
+                if len(best) >= k or fetch >= len(candidates):
+                    break
+                fetch *= 4
+            best = best[:k]
+        return [(snap.ids[row], float(scores[row])) for row in best]
+
+    def stats(self):
+        snap = self.snapshot
+        if snap is None:
+            return {'loaded': False}
+        n = len(snap.matrix.keys)
+        return {
+            'loaded': True,
+            'products': int(snap.alive.sum()),
+            'matrix_rows': n,
+            'incremental_rows': len(snap.alive) - n,
+            'opened_from_disk': self.opened_from_disk,
+            'rebuilding': self.rebuilding
+        }
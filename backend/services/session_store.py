@@ -0,0 +1,203 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from utils.serialization import PROFILE_FIELDS
+
+
+def compact_profile(customer_data):
+    return {k: customer_data[k] for k in PROFILE_FIELDS if customer_data.get(k) not in (None, '', [])}
+
+
+class Session:
+    """Server-side state of one chat session: the profile and the ids it maps to.
+
+    Remembers what was loaded, so the store writes it back only when it
+    changed.
+    """
+
+    __slots__ = ('session_id', 'profile', 'customer_id', 'conversation_id', 'saved_at', '_saved')
+
+    def __init__(self, session_id, data=None, saved_at=None):
+        data = data or {}
+        self.session_id = session_id
+        self.profile = dict(data.get('profile') or {})
+        self.customer_id = data.get('customer_id')
+        self.conversation_id = data.get('conversation_id')
+        # Wall-clock seconds of the last write; None for a session not stored yet
+        self.saved_at = saved_at
+        self._saved = self.data() if data else None
+
+    def data(self):
+        return {
+            'profile': copy.deepcopy(self.profile),
+            'customer_id': self.customer_id,
+            'conversation_id': self.conversation_id
+        }
+
+    def update(self, customer_data, customer_id=None, conversation_id=None):
+        self.profile = compact_profile(customer_data)
+        if customer_id:
+            self.customer_id = customer_id
+        if conversation_id:
+            self.conversation_id = str(conversation_id)
+
+    @property
+    def is_new(self):
+        return self._saved is None
+
+    @property
+    def dirty(self):
+        return self.data() != self._saved
+
+    def mark_saved(self):
+        self._saved = self.data()
+        self.saved_at = time.time()
+
+
+class SessionStore:
+    """Base class: load() and save() with dirty tracking around _read/_write.
+
+    A session is written only when its data changed since it was loaded,
+    or, with refresh_after set, when its last write is older than that many
+    seconds (so a store that expires idle sessions keeps active ones).
+    """
+
+    refresh_after = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.writes = 0
+        self.skipped = 0
+
+    def load(self, session_id):
+        data, saved_at = self._read(session_id)
+        with self.lock:
+            self.loads += 1
+        return Session(session_id, data, saved_at)
+
+    def save(self, session):
+        """Write the session if needed; returns True when it was written."""
+        stale = self.refresh_after is not None and (
+            session.saved_at is None or time.time() - session.saved_at > self.refresh_after
+        )
+        if not session.dirty and not stale:
+            with self.lock:
+                self.skipped += 1
+            return False
+        self._write(session.session_id, session.data())
+        session.mark_saved()
+        with self.lock:
+            self.writes += 1
+        return True
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def _read(self, session_id):
+        """(data, saved_at) of a stored session, or (None, None)."""
+        raise NotImplementedError
+
+    def _write(self, session_id, data):
+        raise NotImplementedError
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': type(self).__name__,
+                'loads': self.loads,
+                'writes': self.writes,
+                'skipped_writes': self.skipped
+            }
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in this process, least-recently-used evicted past max_sessions.
+
+    Sessions idle for ttl seconds are dropped. Not shared between worker
+    processes, so only for a single worker.
+    """
+
+    def __init__(self, max_sessions=100000, ttl=30 * 24 * 3600):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.evictions = 0
+
+    def _read(self, session_id):
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None:
+                return None, None
+            data, saved_at, touched = entry
+            if time.monotonic() - touched > self.ttl:
+                del self.entries[session_id]
+                self.evictions += 1
+                return None, None
+            self.entries[session_id] = (data, saved_at, time.monotonic())
+            self.entries.move_to_end(session_id)
+            return copy.deepcopy(data), saved_at
+
+    def _write(self, session_id, data):
+        with self.lock:
+            self.entries[session_id] = (data, time.time(), time.monotonic())
+            self.entries.move_to_end(session_id)
+            while len(self.entries) > self.max_sessions:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self.lock:
+            self.entries.pop(session_id, None)
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats.update(sessions=len(self.entries), evictions=self.evictions)
+        return stats
+
+
+class MongoSessionStore(SessionStore):
+    """Sessions in the `sessions` collection, one document per session_id.
+
+    Documents are {_id: session_id, profile, customer_id, conversation_id,
+    updated_at}; a TTL index on updated_at (migration 4) expires idle ones,
+    and an unchanged session is rewritten once half its ttl has passed.
+    """
+
+    def __init__(self, collection, ttl=30 * 24 * 3600):
+        super().__init__()
+        self.collection = collection
+        self.refresh_after = ttl / 2
+
+    def _read(self, session_id):
+        doc = self.collection.find_one({'_id': session_id})
+        if doc is None:
+            return None, None
+        updated_at = doc.get('updated_at')
+        if updated_at is not None and updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return doc, updated_at.timestamp() if updated_at else None
+
+    def _write(self, session_id, data):
+        self.collection.update_one(
+            {'_id': session_id},
+            {'$set': dict(data, updated_at=datetime.now(timezone.utc))},
+            upsert=True
+        )
+
+    def delete(self, session_id):
+        self.collection.delete_one({'_id': session_id})
+
+
+def create_session_store(config, db):
+    """The store named by config.SESSION_STORE; None for 'cookie' (profile kept in the Flask session)."""
+    if config.SESSION_STORE == 'mongo':
+        return MongoSessionStore(db.sessions, ttl=config.SESSION_TTL)
+    if config.SESSION_STORE == 'memory':
+        return MemorySessionStore(max_sessions=config.SESSION_MEMORY_MAX, ttl=config.SESSION_TTL)
+    return None
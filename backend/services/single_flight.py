@@ -0,0 +1,245 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from services.admission import Overloaded
+from utils.metrics import session_flight_wait_seconds, session_flights_total
+
+
+class TurnAbandoned(Exception):
+    """The turn a coalesced request was waiting for ended without a result (e.g. the client went away)."""
+
+
+class _Session:
+    __slots__ = ('tail', 'flights', 'queued')
+
+    def __init__(self):
+        # Done when the last turn queued for the session is
+        self.tail = None
+        # message -> Flight still queued or running
+        self.flights = {}
+        self.queued = 0
+
+
+class Flight:
+    """One request's place in its session's line.
+
+    A leader runs the turn once its turn comes (wait() / await_turn()) and
+    reports the outcome with finish(); a follower (coalesced) just waits
+    for the leader's result().
+    """
+
+    def __init__(self, owner, session_id, message, leader, result, previous=None):
+        self.owner = owner
+        self.session_id = session_id
+        self.message = message
+        self.leader = leader
+        # The shared outcome of the turn
+        self.result_future = result
+        # Done once this turn and every turn before it in the session are
+        self.done = Future()
+        self.previous = previous
+        self.finished = False
+        self.started = time.monotonic()
+
+    def wait(self):
+        """Block until the turns queued before this one have finished; raises Overloaded at max_wait."""
+        if self.previous is not None and not self.previous.done():
+            start = time.monotonic()
+            try:
+                self.previous.result(self.owner.max_wait)
+            except FutureTimeout:
+                self._give_up(start)
+            self.owner.observe_wait(start)
+
+    async def await_turn(self):
+        """wait() for asyncio handlers; waits without blocking the event loop."""
+        if self.previous is not None and not self.previous.done():
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.previous)), self.owner.max_wait)
+            except asyncio.TimeoutError:
+                self._give_up(start)
+            except asyncio.CancelledError:
+                self.finish(error=TurnAbandoned('The request was cancelled while queued'))
+                raise
+            self.owner.observe_wait(start)
+
+    def _give_up(self, start):
+        self.owner.observe_wait(start, rejected=True)
+        error = self.owner.reject('session_busy')
+        self.finish(error=error)
+        raise error
+
+    def result(self):
+        """A follower's share of the leader's result; raises what the leader's turn raised."""
+        start = time.monotonic()
+        try:
+            result = self.result_future.result(self.owner.max_wait)
+        except FutureTimeout:
+            self.owner.observe_wait(start, rejected=True)
+            raise self.owner.reject('session_busy')
+        except BaseException:
+            self.owner.observe_wait(start)
+            raise
+        self.owner.observe_wait(start)
+        return result
+
+    async def aresult(self):
+        """result() for asyncio handlers."""
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.result_future)),
+                                            self.owner.max_wait)
+        except asyncio.TimeoutError:
+            self.owner.observe_wait(start, rejected=True)
+            raise self.owner.reject('session_busy')
+        except BaseException:
+            self.owner.observe_wait(start)
+            raise
+        self.owner.observe_wait(start)
+        return result
+
+    def finish(self, result=None, error=None):
+        """Report the leader's outcome to its followers and let the session's next turn run.
+
+        Safe to call more than once, also from several threads at once (a
+        stream's generator and its close callback); only the first call counts.
+        """
+        if not self.leader:
+            return
+        with self.owner.lock:
+            if self.finished:
+                return
+            self.finished = True
+        if error is not None:
+            if not isinstance(error, Exception):
+                # Cancellation or a closed generator: nothing the followers should re-raise as is
+                error = TurnAbandoned(f'The turn ended with {type(error).__name__}')
+            self.result_future.set_exception(error)
+        else:
+            self.result_future.set_result(result)
+        self.owner.release(self)
+
+
+class SessionFlights:
+    """Serializes the chat turns of each session and coalesces duplicates.
+
+    Turns of one session_id run one at a time, in the order they arrived,
+    so a second message never races the first for the conversation, the
+    customer upsert or the history. A request whose message is the same as
+    one already queued or running for its session (a double click, a
+    retrying frontend) does not run at all: it waits for that turn and
+    answers with its result, saving the LLM call and the writes.
+
+    At most max_queue distinct turns may be queued or running per session;
+    a turn that finds the line full, or still waits after max_wait seconds,
+    is rejected with Overloaded('session_busy'), as admission control does.
+    A rejected or abandoned turn still lets the turns behind it run only
+    after the turns before it have finished, so the order holds.
+
+    Threads use run() and asyncio handlers arun(); streaming handlers that
+    hold the turn across a response call enter() and finish() themselves.
+    """
+
+    def __init__(self, max_wait=30.0, max_queue=8):
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.counts = {'leader': 0, 'coalesced': 0, 'rejected': 0}
+        # Seconds a session's turn takes, smoothed, for Retry-After
+        self.turn_time = None
+
+    def enter(self, session_id, message):
+        """The request's Flight: a leader, or a follower of an identical queued or running turn."""
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = self.sessions[session_id] = _Session()
+            flight = state.flights.get(message)
+            if flight is not None:
+                self.counts['coalesced'] += 1
+                follower = Flight(self, session_id, message, False, flight.result_future)
+            elif state.queued >= self.max_queue:
+                follower = None
+            else:
+                self.counts['leader'] += 1
+                flight = Flight(self, session_id, message, True, Future(), previous=state.tail)
+                state.tail = flight.done
+                state.flights[message] = flight
+                state.queued += 1
+                session_flights_total.inc(outcome='leader')
+                return flight
+        if follower is None:
+            raise self.reject('session_queue_full')
+        session_flights_total.inc(outcome='coalesced')
+        return follower
+
+    def run(self, session_id, message, fn):
+        """fn() as the session's next turn, or the result of an identical turn already in flight."""
+        flight = self.enter(session_id, message)
+        if not flight.leader:
+            return flight.result()
+        flight.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            flight.finish(error=e)
+            raise
+        flight.finish(result)
+        return result
+
+    async def arun(self, session_id, message, fn):
+        """run() for asyncio handlers; fn is a coroutine function."""
+        flight = self.enter(session_id, message)
+        if not flight.leader:
+            return await flight.aresult()
+        await flight.await_turn()
+        try:
+            result = await fn()
+        except BaseException as e:
+            flight.finish(error=e)
+            raise
+        flight.finish(result)
+        return result
+
+    def release(self, flight):
+        with self.lock:
+            state = self.sessions[flight.session_id]
+            if state.flights.get(flight.message) is flight:
+                del state.flights[flight.message]
+            state.queued -= 1
+            if not state.queued:
+                del self.sessions[flight.session_id]
+            held = time.monotonic() - flight.started
+            self.turn_time = held if self.turn_time is None else 0.2 * held + 0.8 * self.turn_time
+        previous = flight.previous
+        if previous is None or previous.done():
+            flight.done.set_result(None)
+        else:
+            # Given up early: the turns behind still wait for the ones before
+            previous.add_done_callback(lambda _: flight.done.set_result(None))
+
+    def reject(self, reason):
+        with self.lock:
+            self.counts['rejected'] += 1
+            retry_after = max(1, math.ceil(self.turn_time or 1.0))
+        session_flights_total.inc(outcome=reason)
+        return Overloaded(reason, retry_after)
+
+    def observe_wait(self, start, rejected=False):
+        session_flight_wait_seconds.observe(time.monotonic() - start, outcome='rejected' if rejected else 'ok')
+
+    def stats(self):
+        with self.lock:
+            turns = self.counts['leader'] + self.counts['coalesced']
+            return {
+                'sessions_in_flight': len(self.sessions),
+                'queued': sum(state.queued for state in self.sessions.values()),
+                'counts': dict(self.counts),
+                'coalesced_ratio': round(self.counts['coalesced'] / turns, 3) if turns else None,
+                'turn_time_ms': round(self.turn_time * 1000, 1) if self.turn_time is not None else None
+            }
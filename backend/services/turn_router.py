@@ -0,0 +1,110 @@
+import re
+import threading
+
+from utils.metrics import chat_routes_total
+
+# How a turn's reply is produced
+ASK = 'ask'
+RECOMMEND = 'recommend'
+LLM = 'llm'
+
+# Profile fields the regex extractor fills
+PROFILE_FIELDS = ('name', 'email', 'phone', 'looking_for', 'budget', 'brand_preference', 'exclude_brand',
+                  'color_preference')
+# Words that carry nothing beyond the extracted values: "my name is ...", "my budget is around ...".
+# No negations or conversational words: "no thanks" and "can you call me later" are not profile details
+FILLER_WORDS = frozenset("""
+    hi hello hey thanks thank thx ok okay sure yes yeah yep please
+    my name is i im i'm am the a an and or
+    email e mail address phone number mobile cell tel at
+    looking for need want searching in buy purchase
+    budget of around about under up to max usd dollars
+    prefer preferred ideally color colour brand
+""".split())
+
+_WORD = re.compile(r"[a-z0-9']+")
+# The extractor takes any one- or two-word message for a name ("lol", "nope"); only an introduced one is routed
+_INTRODUCTION = re.compile(r"\b(?:name is|i am|i'm|im)\b", re.IGNORECASE)
+
+
+def new_fields(previous, current):
+    """The profile fields current has a value for and previous does not."""
+    return [field for field in PROFILE_FIELDS if current.get(field) and not previous.get(field)]
+
+
+def _values(customer_data):
+    values = (str(customer_data.get(field) or '').lower().lstrip('$') for field in PROFILE_FIELDS)
+    return [value for value in values if value]
+
+
+class TurnRouter:
+    """Decides whether a chat turn needs the LLM.
+
+    Runs after the regex extractor has parsed the message. When the message
+    filled at least one profile field, the profile values and filler words
+    (greetings, "my name is", "budget is around") account for at least
+    min_coverage of its words, it has at most max_words words and asks no
+    question, and no extracted value is itself a filler word (looking_for
+    "a"), the reply is fully determined by the profile:
+
+        ask        details are still missing: AIService._ask_for_missing_info
+        recommend  the profile is complete: AIService._generate_product_recommendations
+                   (only with recommend=True, and only when products match)
+
+    Any other turn is open-ended and goes to the LLM.
+    """
+
+    def __init__(self, min_coverage=0.8, max_words=20, recommend=True):
+        self.min_coverage = min_coverage
+        self.max_words = max_words
+        self.recommend = recommend
+        self.lock = threading.Lock()
+        self.counts = {ASK: 0, RECOMMEND: 0, LLM: 0}
+
+    def coverage(self, message, customer_data):
+        """Share of the message's words explained by profile values and filler; None without words."""
+        text = message.lower()
+        total = len(_WORD.findall(text))
+        if not total:
+            return None
+        # Longest first, so a name does not eat into the email address that contains it
+        for value in sorted(_values(customer_data), key=len, reverse=True):
+            text = re.sub(rf'(?<![a-z0-9]){re.escape(value)}(?![a-z0-9])', ' ', text)
+        unexplained = sum(1 for word in _WORD.findall(text) if word not in FILLER_WORDS)
+        return 1 - unexplained / total
+
+    def route(self, message, customer_data, missing_info, extracted):
+        """ASK, RECOMMEND or LLM; a RECOMMEND turn still needs products to show.
+
+        extracted names the profile fields this turn's message filled (new_fields).
+        """
+        if not extracted:
+            # Nothing new to acknowledge: a refusal, small talk or a question the templates cannot answer
+            return LLM
+        if extracted == ['name'] and not _INTRODUCTION.search(message):
+            return LLM
+        if '?' in message or len(message.split()) > self.max_words:
+            return LLM
+        if any(value in FILLER_WORDS for value in _values(customer_data)):
+            # A mis-extraction such as looking_for "a"; the LLM's fields will replace it
+            return LLM
+        coverage = self.coverage(message, customer_data)
+        if coverage is None or coverage < self.min_coverage:
+            return LLM
+        if missing_info:
+            return ASK
+        return RECOMMEND if self.recommend else LLM
+
+    def record(self, route):
+        with self.lock:
+            self.counts[route] += 1
+        chat_routes_total.inc(route=route)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        return {
+            'turns': counts,
+            'llm_skipped_ratio': round((counts[ASK] + counts[RECOMMEND]) / total, 3) if total else None
+        }
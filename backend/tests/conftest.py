@@ -0,0 +1,63 @@
+"""Shared fixtures.
+
+Most tests run on mongomock. Those that need a real server (query plans,
+command monitoring) take the `mongod` fixture, which connects to
+MONGO_TEST_URI (default mongodb://localhost:27017) and skips the test when
+nothing answers there.
+"""
+import os
+import uuid
+
+# Config reads these at import time
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/chatbot_test')
+os.environ.setdefault('GITHUB_TOKEN', 'test')
+
+import mongomock
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from benchmarks.mock_llm_server import start_mock_server
+from config import Config
+from utils.mongo_metrics import round_trips
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().get_database('chatbot_test')
+
+
+@pytest.fixture
+def mongod():
+    client = MongoClient(
+        os.getenv('MONGO_TEST_URI', 'mongodb://localhost:27017'),
+        serverSelectionTimeoutMS=1000,
+        event_listeners=[round_trips]
+    )
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"no MongoDB server for the test: {e}")
+    name = f"chatbot_test_{uuid.uuid4().hex[:8]}"
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        client.close()
+
+
+@pytest.fixture(scope='session')
+def mock_llm_url():
+    server, url = start_mock_server()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def mock_llm(mock_llm_url, monkeypatch):
+    """Point every configured model at the local mock LLM server."""
+    for model in Config.AI_MODELS:
+        monkeypatch.setitem(model, 'endpoint', mock_llm_url)
+    return mock_llm_url
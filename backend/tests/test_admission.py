@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from config import Config
+from services.admission import AdmissionController, Overloaded
+from services.chat_pipeline import ChatPipeline
+
+
+class OneTurnAtATime(Config):
+    ADMISSION_MAX_CONCURRENT = 1
+    ADMISSION_MAX_QUEUE = 1
+    ADMISSION_QUEUE_TIMEOUT = 0.2
+    SESSION_RATE_LIMIT = '3/minute'
+
+
+@pytest.fixture
+def held_turn(monkeypatch):
+    """Makes the next chat turn hold its admission slot until the test releases it."""
+    started, release = threading.Event(), threading.Event()
+    run = ChatPipeline.run
+
+    def held(pipeline, *args, **kwargs):
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        return run(pipeline, *args, **kwargs)
+
+    monkeypatch.setattr(ChatPipeline, 'run', held)
+    return started, release
+
+
+def post(client, session_id, path='/api/chat'):
+    return client.post(path, json={'message': 'I need a laptop', 'session_id': session_id})
+
+
+def assert_too_many_requests(response, reason):
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['reason'] == reason
+
+
+def test_overload_is_answered_429_with_retry_after(db, mock_llm, held_turn):
+    started, release = held_turn
+    app = create_app(OneTurnAtATime, db=db)
+    first = {}
+    holder = threading.Thread(target=lambda: first.update(response=post(app.test_client(), 'a')))
+    holder.start()
+    assert started.wait(5)
+
+    queued = {}
+    waiter = threading.Thread(target=lambda: queued.update(response=post(app.test_client(), 'b')))
+    waiter.start()
+    time.sleep(0.05)
+    # The slot is taken and the one queue place too
+    assert_too_many_requests(post(app.test_client(), 'c'), 'queue_full')
+    assert_too_many_requests(post(app.test_client(), 'd', '/api/chat/stream'), 'queue_full')
+    waiter.join(5)
+    assert_too_many_requests(queued['response'], 'queue_timeout')
+
+    release.set()
+    holder.join(5)
+    assert first['response'].status_code == 200
+    assert post(app.test_client(), 'b').status_code == 200
+
+    stats = app.test_client().get('/api/admission/stats').get_json()
+    assert stats['rejected'] == {'queue_full': 2, 'queue_timeout': 1}
+    assert stats['in_flight'] == 0
+
+
+def test_session_rate_limit(db, mock_llm):
+    client = create_app(OneTurnAtATime, db=db).test_client()
+    for _ in range(3):
+        assert post(client, 'chatty').status_code == 200
+    response = post(client, 'chatty')
+    assert_too_many_requests(response, 'session_rate')
+    assert int(response.headers['Retry-After']) <= 60
+    assert post(client, 'quiet').status_code == 200
+
+
+def test_freed_slot_goes_to_the_oldest_waiter():
+    admission = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=5)
+    release = admission.acquire()
+    order = []
+
+    def turn(n):
+        done = admission.acquire()
+        order.append(n)
+        done()
+
+    threads = []
+    for n in range(3):
+        threads.append(threading.Thread(target=turn, args=(n,)))
+        threads[-1].start()
+        while admission.stats()['queued'] < n + 1:
+            time.sleep(0.001)
+    release()
+    for thread in threads:
+        thread.join(5)
+    assert order == [0, 1, 2]
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_retry_after_follows_the_hold_time():
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=1)
+    admission.hold_time = 2.5
+    admission.acquire()
+    with pytest.raises(Overloaded) as rejected:
+        admission.acquire()
+    assert rejected.value.reason == 'queue_full'
+    assert rejected.value.retry_after == 3
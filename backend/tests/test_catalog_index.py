@@ -0,0 +1,107 @@
+import itertools
+import re
+
+import pytest
+
+from benchmarks.catalog_data import synthetic_products
+from models.product import Product
+from services.catalog_index import CatalogIndex
+from utils.serialization import PRODUCT_CARD
+
+QUERIES = [None, 'laptop', 'gaming', 'Business Laptop', 'chrome', 'tablet', '2-in-1']
+PREFERENCES = [
+    {},
+    {'brand_preference': 'Dell'},
+    {'brand_preference': 'as'},
+    {'exclude_brand': 'Apple'},
+    {'brand_preference': 'HP', 'exclude_brand': 'Lenovo'},
+    {'ram': '16GB'},
+    {'ram': '32', 'brand_preference': 'msi'},
+    {'brand_preference': 'NoSuchBrand'},
+]
+
+
+def product_models(database):
+    database.products.insert_many(list(synthetic_products(300)))
+    index = CatalogIndex()
+    # Loaded up front, so get_index() starts no refresher thread
+    index.load(database.products.find())
+    return Product(database, index=index), Product(database)
+
+
+@pytest.fixture
+def models(db):
+    return product_models(db)
+
+
+def mongomock_results(mongo, query, preferences, limit, projection):
+    """The Mongo path's results; mongomock rejects $options inside $not, so an excluded brand is filtered here."""
+    exclude = preferences.get('exclude_brand')
+    if not exclude:
+        return mongo.find_by_query_and_preferences(query, preferences, limit=limit, projection=projection)
+    # As in the Mongo query, the exclusion replaces the brand preference
+    rest = {key: value for key, value in preferences.items() if key not in ('brand_preference', 'exclude_brand')}
+    docs = [doc for doc in mongo.find_by_query_and_preferences(query, rest)
+            if not re.search(exclude, doc['brand'], re.IGNORECASE)][:limit]
+    if projection is not None:
+        docs = [{key: value for key, value in doc.items() if key == '_id' or projection.get(key)} for doc in docs]
+    return docs
+
+
+def assert_same_results(indexed, mongo, expected_results=mongomock_results):
+    matched = 0
+    for query, preferences in itertools.product(QUERIES, PREFERENCES):
+        for limit, projection in ((None, None), (3, PRODUCT_CARD), (50, {'name': 1})):
+            expected = expected_results(mongo, query, preferences, limit, projection)
+            actual = indexed.find_by_query_and_preferences(query, preferences, limit=limit, projection=projection)
+            assert actual == expected, (query, preferences, limit)
+            matched += bool(expected)
+    # Most combinations match something, so the comparison is not between empty lists
+    assert matched > len(QUERIES) * len(PREFERENCES)
+
+
+def test_index_matches_the_mongo_query(models):
+    assert_same_results(*models)
+
+
+def test_index_matches_the_mongo_query_mongod(mongod):
+    def mongo_results(mongo, query, preferences, limit, projection):
+        return mongo.find_by_query_and_preferences(query, preferences, limit=limit, projection=projection)
+
+    assert_same_results(*product_models(mongod), expected_results=mongo_results)
+
+
+def test_index_matches_after_upsert_and_remove(db, models):
+    indexed, mongo = models
+    index = indexed.index
+    docs = list(db.products.find())
+
+    changes = [
+        {'brand': 'Dell', 'category': 'gaming laptop'},
+        {'specs': {'ram': '16GB'}},
+        {'brand': 'Apple', 'tags': ['premium']},
+        {'category': 'chromebook', 'price': 199.0},
+    ]
+    for doc, change in zip(docs[::7], itertools.cycle(changes)):
+        db.products.update_one({'_id': doc['_id']}, {'$set': change})
+        index.upsert(db.products.find_one({'_id': doc['_id']}))
+    for doc in docs[3::11]:
+        db.products.delete_one({'_id': doc['_id']})
+        index.remove(doc['_id'])
+    new = list(synthetic_products(20, seed=9))
+    indexed.insert_many(new)
+
+    assert len(index) == db.products.count_documents({})
+    assert_same_results(indexed, mongo)
+
+
+def test_sync_matches_the_collection(db, models):
+    indexed, mongo = models
+    docs = list(db.products.find())
+    db.products.delete_many({'_id': {'$in': [doc['_id'] for doc in docs[:40]]}})
+    db.products.update_many({'brand': 'HP'}, {'$set': {'category': 'workstation'}})
+    db.products.insert_many(list(synthetic_products(10, seed=3)))
+
+    indexed.index.sync(db.products.find())
+
+    assert_same_results(indexed, mongo)
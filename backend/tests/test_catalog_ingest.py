@@ -0,0 +1,206 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from models.product import Product
+from services.catalog_ingest import CatalogIngest, RowError, normalize_product, read_rows
+
+CSV_HEADER = "sku,name,brand,price,in_stock,tags,specs.ram,specs.storage\n"
+
+
+class BulkCollection:
+    """Applies bulk_write one update_one at a time; mongomock's bulk builder rejects pymongo's UpdateOne."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, requests, ordered=True):
+        upserted = modified = 0
+        for request in requests:
+            result = self.collection.update_one(request._filter, request._doc, upsert=request._upsert)
+            upserted += result.upserted_id is not None
+            modified += result.modified_count
+        return SimpleNamespace(bulk_api_result={'nUpserted': upserted, 'nModified': modified})
+
+
+class Interrupted(Exception):
+    pass
+
+
+def product_model(database):
+    product = Product(database)
+    product.collection = BulkCollection(database.products)
+    return product
+
+
+def fail_after(product, batches):
+    """Makes the load stop, as if killed, once the given number of batches are in."""
+    upsert = product.upsert_many_by_sku
+    calls = [0]
+
+    def upsert_many_by_sku(docs):
+        if calls[0] == batches:
+            raise Interrupted()
+        calls[0] += 1
+        return upsert(docs)
+
+    product.upsert_many_by_sku = upsert_many_by_sku
+
+
+def write_csv(path, count, price=100):
+    with open(path, 'w') as f:
+        f.write(CSV_HEADER)
+        for n in range(count):
+            f.write(f"SKU-{n},Laptop {n},Dell,\"${price + n:,}\",yes,Gaming|Premium,16,512 GB\n")
+    return str(path)
+
+
+def write_jsonl(path, count, price=100):
+    with open(path, 'w') as f:
+        for n in range(count):
+            f.write(json.dumps({'sku': f"SKU-{n}", 'name': f"Laptop {n}", 'price': price + n,
+                                'in_stock': 3, 'specs': {'ram': '16GB'}}) + "\n")
+    return str(path)
+
+
+@pytest.fixture(params=['csv', 'jsonl'])
+def catalog(request, tmp_path):
+    write = write_csv if request.param == 'csv' else write_jsonl
+    return lambda count, price=100: write(tmp_path / f"catalog.{request.param}", count, price)
+
+
+def run(product, path, **kwargs):
+    return CatalogIngest(product, batch_size=10, log=lambda *args: None, **kwargs).run(path)
+
+
+def test_interrupted_load_resumes_after_the_last_batch(db, catalog):
+    path = catalog(95)
+    product = product_model(db)
+    fail_after(product, 4)
+    with pytest.raises(Interrupted):
+        run(product, path)
+    assert db.products.count_documents({}) == 40
+
+    with open(f"{path}.checkpoint") as f:
+        saved = json.load(f)['state']
+    assert saved['rows'] == 40
+
+    loaded = []
+    product = product_model(db)
+    upsert = product.upsert_many_by_sku
+    product.upsert_many_by_sku = lambda docs: loaded.extend(doc['sku'] for doc in docs) or upsert(docs)
+    result = run(product, path)
+    # Only the rows after the checkpoint are read again
+    assert loaded == [f"SKU-{n}" for n in range(40, 95)]
+    assert (result['rows'], result['upserted'], result['rejected']) == (95, 95, 0)
+    assert db.products.count_documents({}) == 95
+    assert len(db.products.distinct('sku')) == 95
+
+
+def test_completed_load_removes_its_checkpoint(db, catalog):
+    path = catalog(25)
+    run(product_model(db), path)
+    assert not os.path.exists(f"{path}.checkpoint")
+    # With no checkpoint the next load starts over, updating the same products
+    result = run(product_model(db), path)
+    assert (result['rows'], result['upserted'], result['modified']) == (25, 0, 0)
+
+
+def test_checkpoint_of_a_changed_file_is_ignored(db, catalog):
+    path = catalog(30)
+    product = product_model(db)
+    fail_after(product, 1)
+    with pytest.raises(Interrupted):
+        run(product, path)
+
+    # A different size, so the change shows even where modification times are coarse
+    catalog(31, price=200)
+    result = run(product_model(db), path)
+    assert result['rows'] == 31
+    assert db.products.find_one({'sku': 'SKU-0'})['price'] == 200.0
+
+
+def test_restart_ignores_the_checkpoint(db, catalog):
+    path = catalog(30)
+    product = product_model(db)
+    fail_after(product, 2)
+    with pytest.raises(Interrupted):
+        run(product, path)
+    result = CatalogIngest(product_model(db), batch_size=10, log=lambda *args: None).run(path, resume=False)
+    assert result['rows'] == 30
+
+
+def test_upsert_by_sku_sets_only_the_given_fields(db, tmp_path):
+    product = product_model(db)
+    run(product, write_csv(tmp_path / "catalog.csv", 3))
+    created = db.products.find_one({'sku': 'SKU-1'})
+
+    feed = tmp_path / "prices.csv"
+    feed.write_text("sku,price,in_stock\nSKU-1,899.99,0\nSKU-9,10,1\n")
+    result = run(product, str(feed))
+    assert (result['upserted'], result['modified']) == (1, 1)
+
+    updated = db.products.find_one({'sku': 'SKU-1'})
+    assert (updated['price'], updated['in_stock']) == (899.99, False)
+    assert (updated['name'], updated['tags'], updated['created_at']) == \
+        (created['name'], ['gaming', 'premium'], created['created_at'])
+    assert db.products.count_documents({'sku': 'SKU-1'}) == 1
+    assert db.products.count_documents({}) == 4
+
+
+def test_bad_rows_are_skipped_and_counted(db, tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text("\n".join([
+        json.dumps({'sku': 'A', 'price': 10}),
+        json.dumps({'price': 10}),
+        "{not json",
+        json.dumps({'sku': 'B', 'rating': 7}),
+        json.dumps({'sku': 'C', 'price': 'free'}),
+        json.dumps({'sku': 'D', 'specs': {'ram': 'lots'}}),
+        json.dumps({'sku': 'E', 'in_stock': 'out of stock'}),
+    ]) + "\n")
+    logged = []
+    result = CatalogIngest(product_model(db), batch_size=10, log=logged.append).run(str(path))
+    assert (result['rows'], result['upserted'], result['rejected']) == (7, 2, 5)
+    assert sorted(db.products.distinct('sku')) == ['A', 'E']
+    assert len(logged) == 5
+
+
+def test_read_rows_resumes_from_any_returned_offset(catalog):
+    path = catalog(12)
+    rows = list(read_rows(path))
+    assert [row['sku'] for row, _ in rows] == [f"SKU-{n}" for n in range(12)]
+    for n, (_, offset) in enumerate(rows):
+        assert [row['sku'] for row, _ in read_rows(path, offset=offset)] == [f"SKU-{m}" for m in range(n + 1, 12)]
+
+
+def test_csv_with_byte_order_mark(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_bytes("\ufeffsku,name\nX1,Café\n".encode('utf-8'))
+    assert [row for row, _ in read_rows(str(path))] == [{'sku': 'X1', 'name': 'Café'}]
+
+
+def test_normalize_product():
+    assert normalize_product({'sku': ' S1 ', 'price': '$1,299', 'in_stock': '4', 'tags': 'Gaming| RGB |',
+                              'specs.ram': '1024', 'specs.storage': '1  TB SSD', 'color': ''}) == {
+        'sku': 'S1', 'price': 1299.0, 'in_stock': True, 'tags': ['gaming', 'rgb'],
+        'specs.ram': '1TB', 'specs.ram_gb': 1024.0, 'specs.storage': '1 TB SSD', 'specs.storage_gb': 1024.0,
+    }
+    with pytest.raises(RowError):
+        normalize_product({'sku': 'S1', 'price': -1})
+
+
+def test_resumed_load_mongod(mongod, tmp_path):
+    path = write_jsonl(tmp_path / "catalog.jsonl", 45)
+    product = Product(mongod)
+    fail_after(product, 2)
+    with pytest.raises(Interrupted):
+        run(product, path)
+    result = run(Product(mongod), path)
+    assert (result['rows'], result['upserted']) == (45, 45)
+    assert mongod.products.count_documents({}) == 45
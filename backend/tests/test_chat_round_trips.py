@@ -0,0 +1,72 @@
+import threading
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+from app import create_app
+from config import Config
+from manage import seed_products
+from utils.mongo_metrics import round_trips
+
+# What a turn issued before the staged pipeline: over 12 round trips
+MAX_ROUND_TRIPS = 8
+
+CONVERSATION = [
+    "Hi, I'm John",
+    "my email is john@example.com and my phone is 555-123-4567",
+    "I need a gaming laptop, my budget is $2000",
+    "does it come in black?",
+]
+
+# The collection methods that are one command each in pymongo
+COMMANDS = ('find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+            'find_one_and_update', 'delete_one', 'delete_many', 'aggregate', 'count_documents', 'bulk_write')
+
+
+@pytest.fixture
+def counted_db(db, monkeypatch):
+    """mongomock with the command events pymongo's monitoring would see, one per collection operation."""
+    depth = threading.local()
+
+    def counted(name, method):
+        def run(self, *args, **kwargs):
+            nested = getattr(depth, 'n', 0)
+            if not nested:
+                # mongomock implements some operations with others; only the outer one is sent
+                round_trips.started(SimpleNamespace(command_name=name))
+            depth.n = nested + 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                depth.n = nested
+        return run
+
+    for name in COMMANDS:
+        monkeypatch.setattr(mongomock.collection.Collection, name,
+                            counted(name, getattr(mongomock.collection.Collection, name)))
+    return db
+
+
+def chat_round_trips(database):
+    seed_products(database, log=lambda *a: None)
+    client = create_app(Config, db=database).test_client()
+    counts = []
+    for message in CONVERSATION:
+        response = client.post('/api/chat', json={'message': message, 'session_id': 'round-trips'})
+        assert response.status_code == 200
+        counts.append(int(response.headers['X-Mongo-Round-Trips']))
+    return counts
+
+
+@pytest.mark.parametrize('concurrent', [False, True], ids=['serial', 'concurrent'])
+def test_chat_turn_round_trips(counted_db, mock_llm, monkeypatch, concurrent):
+    monkeypatch.setattr(Config, 'CONCURRENT_STAGES', concurrent)
+    counts = chat_round_trips(counted_db)
+    assert all(0 < count <= MAX_ROUND_TRIPS for count in counts), counts
+
+
+def test_chat_turn_round_trips_mongod(mongod, mock_llm):
+    # The same bound, counted by pymongo's command monitoring on a real server
+    counts = chat_round_trips(mongod)
+    assert all(0 < count <= MAX_ROUND_TRIPS for count in counts), counts
@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from models.Customer import Customer
+from services.customer_repository import CustomerRepository
+from utils.customer_cache import CustomerCache
+
+EMAILS = [f"customer{i}@example.com" for i in range(6)]
+
+
+class SlowCollection:
+    """A collection whose calls take a random fraction of a millisecond or two, so threads interleave."""
+
+    def __init__(self, collection, seed=0):
+        self.collection = collection
+        self.rng = random.Random(seed)
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        def call(*args, **kwargs):
+            time.sleep(self.rng.random() * 0.002)
+            result = method(*args, **kwargs)
+            time.sleep(self.rng.random() * 0.002)
+            return result
+        return call
+
+
+def repository(db, **cache_options):
+    model = Customer(SimpleNamespace(customers=SlowCollection(db.customers)))
+    return CustomerRepository(model, CustomerCache(**cache_options))
+
+
+def seed(repo):
+    return [str(repo.upsert_by_email({'email': email, 'name': f"Customer {i}"})['_id'])
+            for i, email in enumerate(EMAILS)]
+
+
+def run_threads(worker, threads=12):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(worker, n) for n in range(threads)]:
+            future.result()
+
+
+def assert_cache_matches_database(db, repo, ids):
+    for customer_id, email in zip(ids, EMAILS):
+        stored = db.customers.find_one({'email': email})
+        with repo.cache.lock:
+            entry = repo.cache.entries.get(customer_id)
+        if entry is not None:
+            assert entry.doc == stored
+        assert repo.get_by_email(email) == stored
+        assert repo.get_by_id(customer_id) == stored
+
+
+def test_concurrent_updates_leave_cache_matching_database(db):
+    repo = repository(db)
+    ids = seed(repo)
+    stamps = iter(range(1, 10 ** 6))
+    stamp_lock = threading.Lock()
+
+    def worker(n):
+        rng = random.Random(n)
+        for _ in range(150):
+            i = rng.randrange(len(EMAILS))
+            op = rng.random()
+            if op < 0.4:
+                repo.get_by_id(ids[i]) if op < 0.2 else repo.get_by_email(EMAILS[i])
+                continue
+            with stamp_lock:
+                stamp = next(stamps)
+            if op < 0.8:
+                repo.upsert_by_email({'email': EMAILS[i], 'stamp': stamp})
+            else:
+                repo.update(ids[i], {'stamp': stamp})
+
+    run_threads(worker)
+
+    assert repo.stats()['hits'] > 0
+    assert_cache_matches_database(db, repo, ids)
+
+
+def test_reads_see_every_finished_write(db):
+    repo = repository(db)
+    ids = seed(repo)
+    # Writes to one customer are serialized, so "the last finished write" is well defined
+    write_locks = [threading.Lock() for _ in EMAILS]
+    finished = [0] * len(EMAILS)
+    stale = []
+
+    def worker(n):
+        rng = random.Random(100 + n)
+        for step in range(150):
+            i = rng.randrange(len(EMAILS))
+            op = rng.random()
+            if op < 0.5:
+                floor = finished[i]
+                doc = repo.get_by_id(ids[i]) if op < 0.25 else repo.get_by_email(EMAILS[i])
+                if doc.get('stamp', 0) < floor:
+                    stale.append((EMAILS[i], doc.get('stamp'), floor))
+                continue
+            with write_locks[i]:
+                stamp = finished[i] + 1
+                if op < 0.75:
+                    repo.upsert_by_email({'email': EMAILS[i], 'stamp': stamp})
+                else:
+                    repo.update(ids[i], {'stamp': stamp})
+                finished[i] = stamp
+
+    run_threads(worker)
+
+    assert stale == []
+    assert_cache_matches_database(db, repo, ids)
+
+
+def test_write_through(db):
+    repo = CustomerRepository(Customer(db), CustomerCache())
+    created = repo.upsert_by_email({'email': 'ann@example.com', 'name': 'Ann'})
+    customer_id = str(created['_id'])
+    assert repo.get_by_id(customer_id) == created
+    assert (repo.stats()['hits'], repo.stats()['misses']) == (1, 0)
+
+    # An upsert that changes nothing still writes: another process may have changed the document
+    db.customers.update_one({'_id': created['_id']}, {'$set': {'phone': '555-0100'}})
+    again = repo.upsert_by_email({'email': 'ann@example.com', 'name': 'Ann'})
+    assert again == db.customers.find_one({'_id': created['_id']})
+    assert repo.get_by_id(customer_id)['phone'] == '555-0100'
+
+    repo.update(customer_id, {'budget': '$1500'})
+    assert repo.get_by_email('ann@example.com')['budget'] == '$1500'
+
+    new_id = repo.create({'email': 'bob@example.com', 'name': 'Bob'})
+    assert repo.get_by_id(new_id)['name'] == 'Bob'
+
+
+def test_size_caps(db):
+    repo = CustomerRepository(Customer(db), CustomerCache(max_entries=3))
+    for i in range(5):
+        repo.upsert_by_email({'email': f"c{i}@example.com", 'name': f"C{i}"})
+    assert repo.stats()['customers'] == 3
+    # The oldest profiles went first
+    assert repo.cache.get_by_email('c0@example.com') is None
+    assert repo.cache.get_by_email('c4@example.com') is not None
+
+    repo = CustomerRepository(Customer(db), CustomerCache(max_bytes=1000))
+    for i in range(5):
+        repo.get_by_email(f"c{i}@example.com")
+    assert 0 < repo.stats()['approx_bytes'] <= 1000
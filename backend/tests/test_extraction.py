@@ -0,0 +1,60 @@
+import pytest
+
+from benchmarks.bench_extraction import CORPUS, legacy_extract_customer_info, random_messages
+from utils.extraction import BRANDS, COLORS, extract_customer_info, extractor
+
+# Profiles a message may arrive with: each leaves other fields for the extractor to fill
+EXISTING = [
+    None,
+    {'name': 'Ann'},
+    {'email': 'ann@example.com', 'phone': '555-0100'},
+    {'looking_for': 'laptop', 'budget': '$900'},
+    {'brand_preference': 'Dell', 'color_preference': 'Black'},
+    {'exclude_brand': 'Apple', 'name': ''},
+]
+
+
+def extracted(fn, message, existing):
+    data = fn(message, 'c1', existing)
+    data.pop('timestamp')
+    return data
+
+
+@pytest.mark.parametrize('existing', EXISTING)
+def test_same_results_as_the_original_patterns(existing):
+    for message in CORPUS + random_messages(3000):
+        assert extracted(extract_customer_info, message, existing) == \
+            extracted(legacy_extract_customer_info, message, existing), message
+
+
+@pytest.mark.parametrize('brand', BRANDS)
+def test_every_brand_and_its_negations(brand):
+    for message in (f"I want {brand}", f"no {brand}", f"I don't want {brand}", f"not {brand} but dell",
+                    f"avoid {brand}, maybe hp", f"without {brand}", f"{brand.upper()} please"):
+        assert extracted(extract_customer_info, message, None) == \
+            extracted(legacy_extract_customer_info, message, None), message
+
+
+@pytest.mark.parametrize('color', COLORS)
+def test_every_color(color):
+    for message in (f"a {color} one", f"{color} or red", f"{color.title()}!"):
+        assert extracted(extract_customer_info, message, None) == \
+            extracted(legacy_extract_customer_info, message, None), message
+
+
+def test_existing_data_is_not_modified():
+    existing = {'name': 'Ann'}
+    extract_customer_info("my email is ann@example.com", 'c1', existing)
+    assert existing == {'name': 'Ann'}
+
+
+@pytest.mark.parametrize('message', [
+    "my name is Sarah", "john@example.com", "call 555-123-4567", "Mike here!",
+])
+def test_personal_data(message):
+    assert extractor.has_personal_data(message)
+
+
+@pytest.mark.parametrize('message', ["I need a gaming laptop", "hi", "looking for a business laptop?"])
+def test_no_personal_data(message):
+    assert not extractor.has_personal_data(message)
@@ -0,0 +1,48 @@
+from models.Conversation import Conversation
+from utils.history_cache import HistoryCache
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.reads = 0
+
+    def __getattr__(self, name):
+        if name in ('find', 'find_one'):
+            self.reads += 1
+        return getattr(self.collection, name)
+
+
+def worker(db):
+    model = Conversation(db, history_cache=HistoryCache(capacity=40))
+    model.messages = CountingCollection(db.messages)
+    return model
+
+
+def run_turn(model, session_id, message):
+    """What a chat turn does with its conversation; returns the history it saw."""
+    conversation, _ = model.get_or_create(session_id, projection={'turns': 1})
+    conversation_id = str(conversation['_id'])
+    history = model.get_recent_messages(conversation_id, limit=40, turns=conversation['turns'])
+    model.add_message(conversation_id, 'user', message)
+    model.add_message(conversation_id, 'assistant', f"re: {message}")
+    return [msg['content'] for msg in history if msg['type'] == 'user']
+
+
+def test_cached_history_needs_no_messages_query(db):
+    model = worker(db)
+    for i in range(5):
+        assert run_turn(model, 's1', f"turn {i}") == [f"turn {n}" for n in range(i)]
+    assert model.messages.reads == 0
+    assert model.history_cache.stats()['hits'] == 5
+
+
+def test_turns_handled_by_another_worker_are_read(db):
+    a, b = worker(db), worker(db)
+    for i in range(6):
+        history = run_turn(a if i % 2 == 0 else b, 's1', f"turn {i}")
+        assert history == [f"turn {n}" for n in range(i)]
+    # Each worker's cache was behind on every turn after its first
+    assert a.history_cache.stats()['stale'] == 2
+    assert b.history_cache.stats()['stale'] == 2
+
@@ -0,0 +1,80 @@
+from migrations import HOT_QUERIES, MIGRATIONS, explain_plans, run_migrations, verify_indexes
+from models.Conversation import Conversation
+
+
+def quiet(*args):
+    pass
+
+
+def test_applies_every_migration_once(db):
+    applied = run_migrations(db, log=quiet)
+    assert applied == sorted(version for version, _, _ in MIGRATIONS)
+    assert {doc['_id'] for doc in db.schema_migrations.find()} == set(applied)
+    assert run_migrations(db, log=quiet) == []
+
+
+def test_creates_the_hot_query_indexes(db):
+    run_migrations(db, log=quiet)
+    messages = db.messages.index_information()
+    assert messages['conversation_id_1_timestamp_-1']['key'] == [('conversation_id', 1), ('timestamp', -1)]
+    customers = db.customers.index_information()
+    assert customers['email_1']['key'] == [('email', 1)]
+    assert customers['email_1']['unique']
+    conversations = db.conversations.index_information()
+    assert conversations['session_id_1']['unique']
+
+
+def test_merges_duplicate_customer_emails(db):
+    first = db.customers.insert_one({'email': 'ann@example.com', 'name': 'Ann', 'phone': ''}).inserted_id
+    second = db.customers.insert_one({'email': 'ann@example.com', 'name': '', 'phone': '555-0100'}).inserted_id
+    db.customers.insert_one({'email': 'bob@example.com', 'name': 'Bob'})
+    db.conversations.insert_one({'session_id': 's1', 'customer_id': str(second)})
+    db.sessions.insert_one({'_id': 's1', 'customer_id': str(second)})
+
+    run_migrations(db, log=quiet)
+
+    ann = list(db.customers.find({'email': 'ann@example.com'}))
+    assert len(ann) == 1
+    assert ann[0]['_id'] == first
+    assert (ann[0]['name'], ann[0]['phone']) == ('Ann', '555-0100')
+    assert db.conversations.find_one({'session_id': 's1'})['customer_id'] == str(first)
+    assert db.sessions.find_one({'_id': 's1'})['customer_id'] == str(first)
+    assert db.customers.count_documents({}) == 2
+
+
+def test_merges_duplicate_session_conversations(db):
+    first = db.conversations.insert_one({'session_id': 's1'}).inserted_id
+    second = db.conversations.insert_one({'session_id': 's1'}).inserted_id
+    db.messages.insert_one({'conversation_id': str(second), 'type': 'user', 'content': 'hi'})
+
+    run_migrations(db, log=quiet)
+
+    assert [doc['_id'] for doc in db.conversations.find({'session_id': 's1'})] == [first]
+    assert db.messages.find_one()['conversation_id'] == str(first)
+
+
+def test_history_hot_query_is_the_one_conversation_sends(db, monkeypatch):
+    sent = []
+    find = type(db.messages).find
+
+    def recording_find(collection, query, *args, **kwargs):
+        sent.append(query)
+        return find(collection, query, *args, **kwargs)
+
+    monkeypatch.setattr(type(db.messages), 'find', recording_find)
+    Conversation(db, verify_history=False).get_recent_messages('5f0000000000000000000000')
+    assert ('messages', sent[-1], [('timestamp', -1)]) in HOT_QUERIES
+
+
+def test_hot_queries_use_an_index(mongod):
+    # mongomock has no query planner: these plans come from a real server
+    mongod.messages.insert_one({'conversation_id': 'c1', 'timestamp': '2025-01-01T00:00:00'})
+    assert 'COLLSCAN' in explain_plans(mongod)['messages']
+
+    run_migrations(mongod, log=quiet)
+
+    plans = explain_plans(mongod)
+    assert set(plans) == {'conversations', 'messages', 'customers'}
+    for collection, stages in plans.items():
+        assert 'IXSCAN' in stages and 'COLLSCAN' not in stages, (collection, stages)
+    assert verify_indexes(mongod, log=quiet)
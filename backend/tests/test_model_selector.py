@@ -0,0 +1,86 @@
+import asyncio
+
+from services.ai_service import AIService
+from utils.model_selector import CLOSED, HALF_OPEN, ModelSelector
+
+MODELS = [
+    {'name': 'primary', 'model': 'primary', 'endpoint': 'http://unused', 'token_env': 'GITHUB_TOKEN'},
+    {'name': 'fallback', 'model': 'fallback', 'endpoint': 'http://unused', 'token_env': 'GITHUB_TOKEN'},
+]
+
+
+def selector_with_probe_due():
+    # The primary's breaker has been open for longer than any cooldown: the next call probes it
+    selector = ModelSelector(MODELS)
+    health = selector.health['primary']
+    health.trip()
+    health.opened_at -= 10 ** 6
+    return selector
+
+
+async def cancel_when_started(coro, started):
+    task = asyncio.ensure_future(coro)
+    await started.wait()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    else:
+        raise AssertionError("the call was not cancelled")
+
+
+def test_cancelled_async_probe_is_released():
+    selector = selector_with_probe_due()
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang(model_config):
+            assert model_config['name'] == 'primary'
+            started.set()
+            await asyncio.sleep(60)
+
+        await cancel_when_started(selector.acall(hang), started)
+        health = selector.health['primary']
+        assert health.state == HALF_OPEN
+        assert not health.probe_in_flight
+
+        async def answer(model_config):
+            return model_config['name']
+
+        # The primary is probed again, and the probe closes its breaker
+        assert await selector.acall(answer) == 'primary'
+        assert health.state == CLOSED
+
+    asyncio.run(scenario())
+
+
+class HangingStreamClient:
+    def __init__(self, started):
+        self.started = started
+
+    async def stream_chat_completion(self, messages, model_config):
+        self.started.set()
+        await asyncio.sleep(60)
+        yield ''
+
+
+def test_cancelled_async_stream_probe_is_released():
+    service = AIService()
+    service.model_selector = selector_with_probe_due()
+
+    async def scenario():
+        started = asyncio.Event()
+        service.async_client = HangingStreamClient(started)
+
+        async def consume():
+            async for _ in service.astream_response("what laptops do you have?"):
+                pass
+
+        await cancel_when_started(consume(), started)
+        health = service.model_selector.health['primary']
+        assert not health.probe_in_flight
+        assert health.probe_due()
+
+    asyncio.run(scenario())
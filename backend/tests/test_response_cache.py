@@ -0,0 +1,101 @@
+import sqlite3
+
+import pytest
+
+from services.ai_service import AIService
+from services.response_cache import PRUNE_EVERY, ResponseCache
+
+
+class RecordingCache(ResponseCache):
+    """A ResponseCache that remembers which keys were looked up and stored."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.looked_up = []
+        self.stored = []
+
+    def get(self, key):
+        self.looked_up.append(key)
+        return super().get(key)
+
+    def set(self, key, value):
+        self.stored.append(key)
+        super().set(key, value)
+
+
+class BrokenCache(ResponseCache):
+    def get(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def set(self, key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+
+@pytest.mark.parametrize('message', [
+    "my email is john@example.com",
+    "call me on 555-123-4567",
+    "my name is John Smith",
+])
+def test_personal_data_is_neither_stored_nor_served(mock_llm, message):
+    cache = RecordingCache()
+    service = AIService(response_cache=cache)
+    prompt = service._build_prompt(message)
+    # Even a reply already in the cache for this prompt is not served
+    for model in service.model_selector.models:
+        ResponseCache.set(cache, ResponseCache.make_key(model['model'], prompt.messages), 'cached reply')
+
+    assert service.generate_response(message)['response'] != 'cached reply'
+    assert cache.looked_up == []
+    assert cache.stored == []
+
+
+def test_personal_data_in_history_is_not_cached(mock_llm):
+    cache = RecordingCache()
+    history = [{'type': 'user', 'content': "I'm John, john@example.com"},
+               {'type': 'assistant', 'content': "Thanks John!"}]
+    AIService(response_cache=cache).generate_response("what laptops do you have", conversation_history=history)
+    assert cache.looked_up == [] and cache.stored == []
+
+
+def test_other_prompts_are_cached(mock_llm):
+    cache = RecordingCache()
+    service = AIService(response_cache=cache)
+    first = service.generate_response("what laptops do you have")
+    assert len(cache.stored) == 1
+    assert service.generate_response("What laptops do you have?")['response'] == first['response']
+    assert cache.stats()['hits'] == 1
+    assert service.model_selector.health[service.model_selector.models[0]['name']].requests == 1
+
+
+def test_cache_errors_do_not_count_against_the_model(mock_llm):
+    service = AIService(response_cache=BrokenCache())
+    assert service.generate_response("what laptops do you have")['response']
+    stats = service.model_selector.stats()
+    assert sum(model['requests'] for model in stats.values()) == 1
+    assert all(model['errors'] == 0 and model['state'] == 'closed' for model in stats.values())
+
+
+def rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def test_sqlite_store_is_capped(tmp_path):
+    path = str(tmp_path / 'responses.db')
+    cache = ResponseCache(max_entries=10, path=path, max_rows=50)
+    for i in range(3 * PRUNE_EVERY):
+        cache.set(f"key{i}", f"reply {i}")
+    assert rows(path) == 50
+
+    # The newest replies are the ones kept
+    reopened = ResponseCache(max_entries=10, path=path, max_rows=50)
+    assert reopened.get(f"key{3 * PRUNE_EVERY - 1}") == f"reply {3 * PRUNE_EVERY - 1}"
+    assert reopened.get('key0') is None
+
+
+def test_sqlite_store_drops_expired_rows_while_running(tmp_path):
+    path = str(tmp_path / 'responses.db')
+    cache = ResponseCache(path=path, ttl=-1)
+    for i in range(PRUNE_EVERY):
+        cache.set(f"key{i}", 'stale')
+    assert rows(path) == 0
@@ -0,0 +1,127 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from config import Config
+from migrations import run_migrations
+from services import session_store
+from services.session_store import MemorySessionStore, MongoSessionStore, compact_profile, create_session_store
+
+
+@pytest.fixture(params=['memory', 'mongo'])
+def store(request, db):
+    return MemorySessionStore() if request.param == 'memory' else MongoSessionStore(db.sessions)
+
+
+def test_round_trip(store):
+    session = store.load('s1')
+    assert session.is_new and session.profile == {}
+
+    session.update({'name': 'John', 'email': 'john@example.com', 'phone': '', 'timestamp': 'x'},
+                   customer_id='c1', conversation_id='v1')
+    assert store.save(session)
+
+    loaded = store.load('s1')
+    assert not loaded.is_new
+    assert loaded.profile == {'name': 'John', 'email': 'john@example.com'}
+    assert (loaded.customer_id, loaded.conversation_id) == ('c1', 'v1')
+    assert store.load('s2').is_new
+
+
+def test_unchanged_session_is_not_written(store):
+    session = store.load('s1')
+    session.update({'name': 'John'})
+    store.save(session)
+
+    loaded = store.load('s1')
+    loaded.update({'name': 'John'})
+    assert not store.save(loaded)
+    loaded.update({'name': 'John', 'budget': '$900'})
+    assert store.save(loaded)
+    assert store.load('s1').profile['budget'] == '$900'
+    assert store.stats()['writes'] == 2
+    assert store.stats()['skipped_writes'] == 1
+
+
+def test_loaded_profile_is_a_copy(store):
+    session = store.load('s1')
+    session.update({'name': 'John'})
+    store.save(session)
+    store.load('s1').profile['name'] = 'Changed'
+    assert store.load('s1').profile['name'] == 'John'
+
+
+def test_memory_sessions_expire(monkeypatch):
+    store = MemorySessionStore(ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(session_store, 'time', SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    session = store.load('s1')
+    session.update({'name': 'John'})
+    store.save(session)
+
+    now[0] += 59
+    assert not store.load('s1').is_new
+    # Reading touched it: the ttl counts from the last use
+    now[0] += 59
+    assert not store.load('s1').is_new
+    now[0] += 61
+    assert store.load('s1').is_new
+    assert store.stats()['evictions'] == 1
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    for session_id in ('a', 'b'):
+        session = store.load(session_id)
+        session.update({'name': session_id})
+        store.save(session)
+    store.load('a')
+    session = store.load('c')
+    session.update({'name': 'c'})
+    store.save(session)
+    assert [store.load(session_id).is_new for session_id in ('a', 'b', 'c')] == [False, True, False]
+
+
+def test_mongo_store_refreshes_active_sessions(db, monkeypatch):
+    store = MongoSessionStore(db.sessions, ttl=3600)
+    session = store.load('s1')
+    session.update({'name': 'John'})
+    store.save(session)
+    first = db.sessions.find_one({'_id': 's1'})['updated_at']
+
+    # An unchanged session is rewritten once half the ttl has passed, so the TTL index keeps it
+    assert not store.save(store.load('s1'))
+    later = time.time() + 1801
+    monkeypatch.setattr(session_store, 'time', SimpleNamespace(monotonic=time.monotonic, time=lambda: later))
+    assert store.save(store.load('s1'))
+    assert db.sessions.find_one({'_id': 's1'})['updated_at'] >= first
+
+
+def test_mongo_sessions_expire_by_index(db):
+    run_migrations(db, log=lambda *args: None)
+    index = db.sessions.index_information()['updated_at_ttl']
+    assert index['key'] == [('updated_at', 1)]
+    assert index['expireAfterSeconds'] == int(Config.SESSION_TTL)
+
+
+def test_compact_profile():
+    assert compact_profile({'name': 'Ann', 'email': '', 'phone': None, 'conversation_id': 'c', 'timestamp': 't'}) \
+        == {'name': 'Ann'}
+
+
+@pytest.mark.parametrize('backend', ['mongo', 'memory', 'cookie'])
+def test_profile_carries_across_requests_without_the_cookie(db, mock_llm, backend):
+    class Configured(Config):
+        SESSION_STORE = backend
+
+    app = create_app(Configured, db=db)
+    app.test_client().post('/api/chat', json={'message': "my name is John", 'session_id': 's1'})
+    # A new client has no Flask session cookie; only a server-side store knows the name
+    response = app.test_client().post('/api/chat', json={'message': "my email is john@example.com",
+                                                         'session_id': 's1'})
+    customer = response.get_json()['customer_info']
+    assert customer['email'] == 'john@example.com'
+    assert customer.get('name') == (None if backend == 'cookie' else 'John')
+    assert (create_session_store(Configured, db) is None) == (backend == 'cookie')
@@ -0,0 +1,99 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+from config import Config
+from services.chat_pipeline import ChatPipeline
+from services.single_flight import SessionFlights
+
+
+def post_together(app, messages, session_id='flights'):
+    # One client per thread, all released at once
+    barrier = threading.Barrier(len(messages))
+
+    def post(message):
+        client = app.test_client()
+        barrier.wait()
+        return client.post('/api/chat', json={'message': message, 'session_id': session_id})
+
+    with ThreadPoolExecutor(max_workers=len(messages)) as pool:
+        return list(pool.map(post, messages))
+
+
+class TurnRecorder:
+    """Wraps ChatPipeline.run to count the turns of each session that run, and how many at once."""
+
+    def __init__(self, monkeypatch, delay=0.2):
+        self.lock = threading.Lock()
+        self.messages = []
+        self.running = 0
+        self.most_running = 0
+        run = ChatPipeline.run
+
+        def recorded(pipeline, user_message, session_id, session_customer_data=None):
+            with self.lock:
+                self.messages.append(user_message)
+                self.running += 1
+                self.most_running = max(self.most_running, self.running)
+            try:
+                time.sleep(delay)
+                return run(pipeline, user_message, session_id, session_customer_data)
+            finally:
+                with self.lock:
+                    self.running -= 1
+
+        monkeypatch.setattr(ChatPipeline, 'run', recorded)
+
+
+def test_identical_concurrent_requests_are_coalesced(db, mock_llm, monkeypatch):
+    turns = TurnRecorder(monkeypatch)
+    app = create_app(Config, db=db)
+
+    responses = post_together(app, ["I need a gaming laptop"] * 6)
+
+    assert [response.status_code for response in responses] == [200] * 6
+    assert turns.messages == ["I need a gaming laptop"]
+    assert len({response.data for response in responses}) == 1
+    assert db.messages.count_documents({'type': 'user'}) == 1
+    assert app.test_client().get('/api/flights/stats').get_json()['counts']['coalesced'] == 5
+
+
+def test_different_concurrent_requests_are_serialized(db, mock_llm, monkeypatch):
+    turns = TurnRecorder(monkeypatch, delay=0.05)
+    app = create_app(Config, db=db)
+    messages = [f"message {i}" for i in range(5)]
+
+    responses = post_together(app, messages)
+
+    assert [response.status_code for response in responses] == [200] * 5
+    assert sorted(turns.messages) == messages
+    assert turns.most_running == 1
+    assert db.conversations.count_documents({'session_id': 'flights'}) == 1
+    assert db.messages.count_documents({'type': 'user'}) == 5
+
+
+def test_finish_races_count_once():
+    # Switch threads as often as possible, so the finish() calls interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        race_finish(SessionFlights())
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def race_finish(flights):
+    for _ in range(200):
+        flight = flights.enter('s1', 'hello')
+        barrier = threading.Barrier(8)
+
+        def finish(n):
+            barrier.wait()
+            flight.finish(result=n)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(finish, range(8)))
+        assert flight.result_future.result() in range(8)
+        assert flights.stats()['queued'] == 0
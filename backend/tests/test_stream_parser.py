@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config import Config
+from services.ai_service import AsyncLLMClient, LLMClient, _STREAM_DONE, _parse_stream_line
+from utils.stream_parser import ReplyStreamParser
+
+MODEL = {'name': 'mock', 'model': 'mock', 'token': 'test'}
+
+ENVELOPE = json.dumps({
+    'name': 'John',
+    'email': '',
+    'note': {'reply': 'not this one'},
+    'reply': 'Hi John! Try the "Aero 15" – 15”, $1,499.\nAnything else?',
+    'summary': 'reply'
+})
+REPLY = json.loads(ENVELOPE)['reply']
+
+
+def feed(parser, chunks):
+    return ''.join(parser.feed(chunk) for chunk in chunks)
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 64, len(ENVELOPE)])
+def test_reply_is_decoded_from_any_chunking(size):
+    parser = ReplyStreamParser()
+    chunks = [ENVELOPE[i:i + size] for i in range(0, len(ENVELOPE), size)]
+    assert feed(parser, chunks) == REPLY
+    assert parser.result()['reply'] == REPLY
+
+
+def test_unicode_escapes_split_across_chunks():
+    raw = json.dumps({'reply': 'café – ok'}, ensure_ascii=True)
+    assert '\\u2013' in raw
+    split = raw.index('\\u2013') + 3
+    assert feed(ReplyStreamParser(), [raw[:split], raw[split:]]) == 'café – ok'
+
+
+def test_fenced_json():
+    parser = ReplyStreamParser()
+    assert feed(parser, ['``', '`json\n{"re', 'ply": "hello"}\n```']) == 'hello'
+    assert parser.result() == {'reply': 'hello'}
+
+
+def test_plain_text_is_streamed_as_the_reply():
+    parser = ReplyStreamParser()
+    assert feed(parser, ['  Sure', ', here you go.']) == 'Sure, here you go.'
+    assert parser.result() is None
+
+
+def event(content=None, usage=None):
+    body = {'choices': [{'delta': {'content': content}}] if content is not None else []}
+    if usage:
+        body['usage'] = usage
+    return f"data: {json.dumps(body, ensure_ascii=False)}"
+
+
+def test_stream_lines():
+    assert _parse_stream_line(event('Hi'), MODEL) == 'Hi'
+    assert _parse_stream_line('data: [DONE]', MODEL) is _STREAM_DONE
+    assert _parse_stream_line('data:[DONE]', MODEL) is _STREAM_DONE
+    assert _parse_stream_line('', MODEL) is None
+    assert _parse_stream_line(': keep-alive', MODEL) is None
+    assert _parse_stream_line('event: message', MODEL) is None
+    assert _parse_stream_line(event(''), MODEL) is None
+    assert _parse_stream_line(event(usage={'prompt_tokens': 3, 'completion_tokens': 5}), MODEL) is None
+
+
+def sse_body(deltas):
+    frames = [event(delta) for delta in deltas] + ['data: [DONE]', event('after done')]
+    return ''.join(f"{frame}\n\n" for frame in frames).encode()
+
+
+class SplitFrameHandler(BaseHTTPRequestHandler):
+    """Answers every POST with an SSE stream written in pieces that cut frames, lines and characters apart."""
+
+    body = b''
+    piece = 7
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for i in range(0, len(self.body), self.piece):
+            self.wfile.write(self.body[i:i + self.piece])
+            self.wfile.flush()
+            time.sleep(0.001)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sse_server():
+    deltas = ['{"reply": "Caf', 'é ', 'olé', '"}']
+    body = sse_body(deltas)
+    # A piece boundary inside the two-byte UTF-8 encoding of the first accented character
+    accent = body.index('é'.encode())
+    piece = accent + 1
+    handler = type('Handler', (SplitFrameHandler,), {'body': body, 'piece': piece})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield dict(MODEL, endpoint=f"http://127.0.0.1:{server.server_address[1]}"), deltas
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_reassembles_split_frames_and_stops_at_done(sse_server):
+    model, deltas = sse_server
+    client = LLMClient()
+    try:
+        assert list(client.stream_chat_completion([], model)) == deltas
+    finally:
+        client.close()
+
+
+def test_async_client_reassembles_split_frames_and_stops_at_done(sse_server):
+    model, deltas = sse_server
+
+    async def stream():
+        client = AsyncLLMClient()
+        try:
+            return [delta async for delta in client.stream_chat_completion([], model)]
+        finally:
+            await client.close()
+
+    assert asyncio.run(stream()) == deltas
+    assert feed(ReplyStreamParser(), deltas) == 'Café olé'
+
+
+def test_client_settings_default_only_when_not_given():
+    client = LLMClient(pool_connections=0, pool_maxsize=0, connect_timeout=0, read_timeout=0)
+    assert (client.pool_connections, client.pool_maxsize, client.timeout) == (0, 0, (0, 0))
+    client = AsyncLLMClient(pool_maxsize=0, connect_timeout=0, read_timeout=0)
+    assert (client.pool_maxsize, client.connect_timeout, client.read_timeout) == (0, 0, 0)
+    client = AsyncLLMClient()
+    assert (client.pool_maxsize, client.connect_timeout, client.read_timeout) == \
+        (Config.LLM_POOL_MAXSIZE, Config.LLM_CONNECT_TIMEOUT, Config.LLM_READ_TIMEOUT)
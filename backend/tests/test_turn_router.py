@@ -0,0 +1,65 @@
+import pytest
+
+from services.turn_router import ASK, LLM, RECOMMEND, TurnRouter, new_fields
+from utils.extraction import extract_customer_info
+from utils.helpers import get_missing_info, merge_customer_data
+
+COMPLETE = {'name': 'John', 'email': 'john@example.com', 'phone': '555-123-4567', 'looking_for': 'gaming laptop'}
+
+
+def route(message, profile=None):
+    # As ChatPipeline.extract and ChatPipeline.route do it
+    profile = profile or {}
+    customer_data = merge_customer_data(profile, extract_customer_info(message, 'c1', profile))
+    return TurnRouter().route(message, customer_data, get_missing_info(customer_data),
+                              new_fields(profile, customer_data))
+
+
+@pytest.mark.parametrize('message', [
+    "no thanks",
+    "not interested",
+    "can you call me later",
+    "just looking",
+    "no",
+    "I don't want to give my phone number",
+])
+def test_refusals_go_to_the_model(message):
+    assert route(message, {'name': 'John'}) == LLM
+    assert route(message, COMPLETE) == LLM
+
+
+@pytest.mark.parametrize('message', [
+    "hi",
+    "ok thanks",
+    "lol",
+    "nope",
+    "what's the weather",
+    "is it in stock",
+    "tell me a joke",
+])
+def test_short_off_topic_messages_go_to_the_model(message):
+    assert route(message) == LLM
+    assert route(message, COMPLETE) == LLM
+
+
+def test_repeating_known_details_goes_to_the_model():
+    assert route("my name is John", {'name': 'John'}) == LLM
+
+
+@pytest.mark.parametrize('message', [
+    "Hi, I'm John",
+    "my email is john@example.com",
+    "my phone number is 555-123-4567",
+])
+def test_new_details_are_answered_from_a_template(message):
+    assert route(message) == ASK
+
+
+def test_completed_profile_is_recommended():
+    # Preferences (a budget or brand) complete it
+    assert route("I need laptops", dict(COMPLETE, looking_for='')) == ASK
+    assert route("my budget is $1500", COMPLETE) == RECOMMEND
+
+
+def test_new_detail_with_more_to_say_goes_to_the_model():
+    assert route("my email is john@example.com, can you compare the two laptops") == LLM
@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+from models.Conversation import Conversation
+from utils.write_behind import WriteBehindBuffer
+
+
+class GatedCollection:
+    """A collection whose insert_many waits until the test opens the gate, recording each batch."""
+
+    def __init__(self, collection, open_gate=True):
+        self.collection = collection
+        self.gate = threading.Event()
+        if open_gate:
+            self.gate.set()
+        self.batches = []
+
+    def insert_many(self, docs, ordered=True):
+        self.gate.wait(5)
+        self.batches.append([doc['n'] for doc in docs])
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+class LostAckCollection:
+    """Inserts the first batch but reports a network error, as when the acknowledgement is lost."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        result = self.collection.insert_many(docs, ordered=ordered)
+        if self.calls == 1:
+            raise ConnectionError("connection reset")
+        return result
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def stored(db):
+    return [doc['n'] for doc in db.messages.find()]
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval(db):
+    buffer = WriteBehindBuffer(db.messages, max_batch=5, flush_interval=60)
+    for n in range(5):
+        buffer.add({'n': n})
+    wait_for(lambda: db.messages.count_documents({}) == 5)
+    buffer.close()
+
+
+def test_partial_batch_is_written_after_the_interval(db):
+    buffer = WriteBehindBuffer(db.messages, max_batch=100, flush_interval=0.05)
+    buffer.add({'n': 0})
+    wait_for(lambda: db.messages.count_documents({}) == 1)
+    buffer.close()
+
+
+def test_flush_waits_for_the_writes(db):
+    buffer = WriteBehindBuffer(db.messages, max_batch=100, flush_interval=60)
+    for n in range(10):
+        buffer.add({'n': n})
+    buffer.flush()
+    assert stored(db) == list(range(10))
+    buffer.close()
+
+
+def test_close_drains_in_order(db):
+    collection = GatedCollection(db.messages, open_gate=False)
+    buffer = WriteBehindBuffer(collection, max_batch=7, flush_interval=60)
+    for n in range(50):
+        buffer.add({'n': n})
+    closing = threading.Thread(target=buffer.close)
+    closing.start()
+    collection.gate.set()
+    closing.join(5)
+
+    assert not closing.is_alive()
+    assert stored(db) == list(range(50))
+    assert [n for batch in collection.batches for n in batch] == list(range(50))
+    assert all(len(batch) <= 7 for batch in collection.batches)
+    with pytest.raises(RuntimeError):
+        buffer.add({'n': 50})
+
+
+def test_documents_stay_pending_until_acknowledged(db):
+    collection = GatedCollection(db.messages, open_gate=False)
+    buffer = WriteBehindBuffer(collection, max_batch=3, flush_interval=60)
+    for n in range(4):
+        buffer.add({'n': n})
+    # The first batch is in flight, the fourth document still queued
+    wait_for(lambda: buffer.in_flight)
+    assert [doc['n'] for doc in buffer.pending()] == [0, 1, 2, 3]
+    assert [doc['n'] for doc in buffer.pending(lambda doc: doc['n'] % 2)] == [1, 3]
+    collection.gate.set()
+    buffer.flush()
+    assert buffer.pending() == []
+    buffer.close()
+
+
+def test_full_buffer_blocks_writers(db):
+    collection = GatedCollection(db.messages, open_gate=False)
+    buffer = WriteBehindBuffer(collection, max_batch=2, flush_interval=60, max_pending=4)
+    for n in range(4):
+        buffer.add({'n': n})
+    writer = threading.Thread(target=buffer.add, args=({'n': 4},))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()
+    collection.gate.set()
+    writer.join(5)
+    buffer.close()
+    assert stored(db) == list(range(5))
+
+
+def test_retry_after_a_lost_acknowledgement_writes_once(db):
+    collection = LostAckCollection(db.messages)
+    buffer = WriteBehindBuffer(collection, max_batch=3, flush_interval=60)
+    docs = [{'_id': n, 'n': n} for n in range(3)]
+    for doc in docs:
+        buffer.add(doc)
+    buffer.close()
+    assert collection.calls == 2
+    assert stored(db) == [0, 1, 2]
+
+
+def test_conversation_reads_its_buffered_messages(db):
+    buffer = WriteBehindBuffer(db.messages, max_batch=100, flush_interval=60)
+    conversation = Conversation(db, message_buffer=buffer)
+    conversation_id = conversation.create(None, 's1')
+    for n in range(6):
+        conversation.add_message(conversation_id, 'user', f"message {n}")
+    buffer.flush()
+    for n in range(6, 9):
+        conversation.add_message(conversation_id, 'user', f"message {n}")
+
+    # Messages 6 to 8 are still in the buffer; reads see them all, in order, and close() writes them
+    expected = [f"message {n}" for n in range(9)]
+    assert [msg['content'] for msg in conversation.get_recent_messages(conversation_id, limit=20)] == expected
+    buffer.close()
+    assert [doc['content'] for doc in db.messages.find().sort('timestamp', 1)] == expected
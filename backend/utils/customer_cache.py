@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import count, islice
+
+from utils.metrics import customer_cache_lookups_total
+
+# Rough per-profile overhead of the dict and its keys, in bytes
+_PROFILE_OVERHEAD = 300
+
+
+def _profile_size(doc):
+    return _PROFILE_OVERHEAD + sum(len(str(value)) for value in doc.values())
+
+
+def _keys(customer_id=None, email=None):
+    keys = []
+    if customer_id is not None:
+        keys.append(('id', str(customer_id)))
+    if email:
+        keys.append(('email', email))
+    return keys
+
+
+class _Entry:
+    __slots__ = ('doc', 'touched', 'size')
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.touched = time.monotonic()
+        self.size = _profile_size(doc)
+
+
+class _Write:
+    __slots__ = ('token', 'keys')
+
+    def __init__(self, token, keys):
+        self.token = token
+        self.keys = keys
+
+
+class CustomerCache:
+    """Customer documents by _id, also found by email.
+
+    Profiles are evicted least-recently-used first when there are more than
+    max_entries of them or their approximate size exceeds max_bytes, and
+    expire ttl seconds after they were read or written (which bounds how
+    long a change made by another worker process can go unseen here).
+
+    Every read and write of the database is bracketed: begin_read() before
+    a read and fill() after it, begin_write() before a write and
+    finish_write() after it. A document is only cached when no write to
+    the same customer (by _id or email) was in flight or finished in
+    between, so a slow reader or writer never puts back a profile that a
+    concurrent write has already replaced; in that case the entry is
+    dropped and the next read goes to the database.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.emails = {}
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.discarded = 0
+        self._sequence = count(1)
+        # key -> [writes in flight, sequence of the last write event]; pruned keys count as _floor
+        self._writes = OrderedDict()
+        self._floor = 0
+
+    def get_by_id(self, customer_id):
+        with self.lock:
+            return self._lookup(str(customer_id))
+
+    def get_by_email(self, email):
+        with self.lock:
+            return self._lookup(self.emails.get(email))
+
+    def begin_read(self):
+        return next(self._sequence)
+
+    def fill(self, doc, token):
+        """Cache doc read from the database after begin_read() returned token."""
+        with self.lock:
+            keys = _keys(doc['_id'], doc.get('email'))
+            if self._clean(keys, token):
+                self._put(doc)
+            else:
+                self.discarded += 1
+
+    def begin_write(self, customer_id=None, email=None):
+        """Register a write to the customer with this _id and/or email; drops what is cached for it."""
+        with self.lock:
+            write = _Write(next(self._sequence), _keys(customer_id, email))
+            for key in write.keys:
+                state = self._writes.setdefault(key, [0, self._floor])
+                state[0] += 1
+                state[1] = write.token
+                self._writes.move_to_end(key)
+            if customer_id is not None:
+                self._drop(str(customer_id))
+            if email:
+                self._drop(self.emails.get(email))
+            return write
+
+    def finish_write(self, write, doc=None):
+        """End a write; doc is the customer as the write left it, when the database returned it."""
+        with self.lock:
+            keys = list(write.keys)
+            if doc is not None:
+                keys += [key for key in _keys(doc['_id'], doc.get('email')) if key not in keys]
+            fresh = doc is not None and self._clean(keys, write.token, own=write.keys)
+            for key in write.keys:
+                self._writes[key][0] -= 1
+            event = next(self._sequence)
+            for key in keys:
+                self._writes.setdefault(key, [0, self._floor])[1] = event
+                self._writes.move_to_end(key)
+            if doc is not None:
+                self._drop(str(doc['_id']))
+                self._drop(self.emails.get(doc.get('email')))
+                if fresh:
+                    self._put(doc)
+                else:
+                    self.discarded += 1
+            self._prune()
+
+    def _clean(self, keys, token, own=()):
+        # No other write to these keys in flight, and none started or finished since token
+        for key in keys:
+            in_flight, last = self._writes.get(key, (0, self._floor))
+            if in_flight > (1 if key in own else 0) or last > token:
+                return False
+        return True
+
+    def _lookup(self, customer_id):
+        entry = self.entries.get(customer_id) if customer_id is not None else None
+        if entry is not None and time.monotonic() - entry.touched > self.ttl:
+            self._drop(customer_id)
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            customer_cache_lookups_total.inc(result='miss')
+            return None
+        self.hits += 1
+        customer_cache_lookups_total.inc(result='hit')
+        self.entries.move_to_end(customer_id)
+        return dict(entry.doc)
+
+    def _put(self, doc):
+        customer_id = str(doc['_id'])
+        self._drop(customer_id)
+        entry = _Entry(dict(doc))
+        self.entries[customer_id] = entry
+        self.size += entry.size
+        if doc.get('email'):
+            self.emails[doc['email']] = customer_id
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _drop(self, customer_id):
+        entry = self.entries.pop(customer_id, None) if customer_id is not None else None
+        if entry is not None:
+            self.size -= entry.size
+            email = entry.doc.get('email')
+            if email and self.emails.get(email) == customer_id:
+                del self.emails[email]
+
+    def _prune(self):
+        # Forget the oldest idle keys beyond twice the capacity; forgotten keys count as written at _floor
+        excess = len(self._writes) - 2 * self.max_entries
+        for key in list(islice(self._writes, max(excess, 0))):
+            in_flight, last = self._writes[key]
+            if not in_flight:
+                del self._writes[key]
+                self._floor = max(self._floor, last)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'customers': len(self.entries),
+                'approx_bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'discarded': self.discarded,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
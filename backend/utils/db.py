@@ -0,0 +1,34 @@
+import threading
+from pymongo import MongoClient
+from config import Config
+from utils.mongo_metrics import round_trips
+
+DEFAULT_DATABASE = 'ecomerce_chatbot'
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client(uri=None):
+    """The process-wide MongoClient, created on first use.
+
+    With connect=False the client opens no sockets and starts no monitor
+    threads until the first operation, so building the app never waits on
+    MongoDB and a client created before gunicorn forks is still safe to use
+    in the workers. All models share its connection pool.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MongoClient(
+                    uri or Config.MONGO_URI,
+                    connect=False,
+                    maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                    event_listeners=[round_trips]
+                )
+    return _client
+
+
+def get_db(uri=None):
+    return get_client(uri).get_default_database(DEFAULT_DATABASE)
@@ -0,0 +1,143 @@
+import re
+from datetime import datetime, timezone
+
+BRANDS = ['apple', 'dell', 'hp', 'lenovo', 'asus', 'acer', 'microsoft', 'surface', 'macbook', 'thinkpad', 'msi', 'razer']
+COLORS = ['black', 'white', 'silver', 'gray', 'grey', 'gold', 'rose gold', 'blue', 'red']
+NAME_STOPWORDS = {'looking', 'searching', 'need', 'want', 'here', 'hello', 'hi'}
+
+_NEGATION = r"(?:don\'t want|no|avoid|not|without)\s+"
+
+
+def _alternation(words):
+    return '|'.join(re.escape(word) for word in words)
+
+
+class CustomerInfoExtractor:
+    """Regex extraction of customer details from a chat message.
+
+    All patterns are compiled once. Brands, negated brands and colors are
+    found with a single scan each: a zero-width lookahead alternation reports
+    every (possibly overlapping) occurrence, and the list order of BRANDS and
+    COLORS then decides the winner exactly as the original per-item loops did.
+    """
+
+    def __init__(self):
+        self.name_patterns = [re.compile(p, re.IGNORECASE) for p in [
+            r'(?:my name is|i am|i\'m|call me|name is)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
+            r'^([a-zA-Z]+)(?:\s+[a-zA-Z]+)?\s*(?:here|!|\.|\s*$)',
+            r'(?:i\'m|im)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)'
+        ]]
+        self.email_pattern = re.compile(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+        self.phone_patterns = [re.compile(p, re.IGNORECASE) for p in [
+            r'(?:phone|number|tel|mobile|call)\s*:?0\s*([0-9\s\-\(\)\+]{7,})',
+            r'([0-9]{3}[-\s]?[0-9]{3}[-\s]?[0-9]{4})',
+            r'(\+[0-9\s\-\(\)]{10,})',
+            r'([0-9]{6,})'
+        ]]
+        self.looking_patterns = [re.compile(p, re.IGNORECASE) for p in [
+            r'(?:looking for|need|want|searching for|interested in)\s+([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
+            r'(?:buy|purchase|get)\s+(?:a|an|some)?\s*([a-zA-Z\s]+?)(?:\s|$|,|\.|!)',
+            r'(laptop|computer|gaming laptop|business laptop|ultrabook|notebook)',
+        ]]
+        self.budget_pattern = re.compile(
+            r'budget\s*(?:is|of|around)?\s*\$?(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE
+        )
+        brands = _alternation(BRANDS)
+        self.brand_scan = re.compile(rf'\b(?=({brands})\b)')
+        self.negated_brand_scan = re.compile(rf'(?=(?:{_NEGATION})({brands}))')
+        self.color_scan = re.compile(rf'(?=({_alternation(COLORS)}))')
+        self.brand_rank = {brand: i for i, brand in enumerate(BRANDS)}
+        self.color_rank = {color: i for i, color in enumerate(COLORS)}
+
+    @staticmethod
+    def _first_match(patterns, message):
+        for pattern in patterns:
+            match = pattern.search(message)
+            if match:
+                return match
+        return None
+
+    @staticmethod
+    def _first_ranked(found, rank):
+        return min(found, key=rank.__getitem__) if found else None
+
+    def has_personal_data(self, message):
+        """True when the message contains a name, email or phone number."""
+        if self.email_pattern.search(message) or self._first_match(self.phone_patterns, message):
+            return True
+        for pattern in self.name_patterns:
+            name_match = pattern.search(message)
+            if name_match and name_match.group(1).strip().lower() not in NAME_STOPWORDS:
+                return True
+        return False
+
+    def extract(self, message, conversation_id, existing_customer_data=None):
+        customer_data = existing_customer_data.copy() if existing_customer_data else {}
+        message_lower = message.lower()
+
+        # Name
+        if not customer_data.get('name'):
+            for pattern in self.name_patterns:
+                name_match = pattern.search(message)
+                if name_match:
+                    name = name_match.group(1).strip().title()
+                    if name.lower() not in NAME_STOPWORDS:
+                        customer_data['name'] = name
+                        break
+
+        # Email
+        if not customer_data.get('email'):
+            email_match = self.email_pattern.search(message)
+            if email_match:
+                customer_data['email'] = email_match.group(1)
+
+        # Phone
+        if not customer_data.get('phone'):
+            phone_match = self._first_match(self.phone_patterns, message)
+            if phone_match:
+                customer_data['phone'] = phone_match.group(1).strip()
+
+        # Looking for
+        if not customer_data.get('looking_for'):
+            looking_match = self._first_match(self.looking_patterns, message)
+            if looking_match:
+                customer_data['looking_for'] = looking_match.group(1).strip().lower()
+
+        # Preferences (budget, brand, color)
+        if not customer_data.get('budget'):
+            budget_match = self.budget_pattern.search(message)
+            if budget_match:
+                customer_data['budget'] = f"${budget_match.group(1)}"
+
+        need_brand = not customer_data.get('brand_preference')
+        need_exclude = not customer_data.get('exclude_brand')
+        if need_brand or need_exclude:
+            negated = {m.group(1) for m in self.negated_brand_scan.finditer(message_lower)}
+            # Positive brand preference (e.g., 'I want HP')
+            if need_brand:
+                mentioned = {m.group(1) for m in self.brand_scan.finditer(message_lower)}
+                brand = self._first_ranked(mentioned - negated, self.brand_rank)
+                if brand:
+                    customer_data['brand_preference'] = brand.title()
+            # Exclude brand (e.g., 'I don\'t want MacBook', 'no Apple')
+            if need_exclude:
+                brand = self._first_ranked(negated, self.brand_rank)
+                if brand:
+                    customer_data['exclude_brand'] = brand.title()
+
+        if not customer_data.get('color_preference'):
+            colors = {m.group(1) for m in self.color_scan.finditer(message_lower)}
+            color = self._first_ranked(colors, self.color_rank)
+            if color:
+                customer_data['color_preference'] = color.title()
+
+        customer_data['conversation_id'] = conversation_id
+        customer_data['timestamp'] = datetime.now(timezone.utc).isoformat()
+        return customer_data
+
+
+extractor = CustomerInfoExtractor()
+
+
+def extract_customer_info(message, conversation_id, existing_customer_data=None):
+    return extractor.extract(message, conversation_id, existing_customer_data)
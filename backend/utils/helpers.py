@@ -0,0 +1,49 @@
+from bson import ObjectId
+from utils.serialization import dumps
+
+
+def get_missing_info(customer_data):
+    required_fields = ['name', 'email', 'phone', 'looking_for']
+    missing = [field for field in required_fields if not customer_data.get(field)]
+    if not missing and not customer_data.get('budget') and not customer_data.get('brand_preference'):
+        missing.append('preferences')
+    return missing
+
+
+def mongo_to_dict(doc):
+    """Recursively convert MongoDB document to dict with string _id and nested ObjectIds."""
+    if not doc:
+        return doc
+    if isinstance(doc, ObjectId):
+        return str(doc)
+    if isinstance(doc, list):
+        return [mongo_to_dict(item) for item in doc]
+    if isinstance(doc, dict):
+        doc = dict(doc)
+        for k, v in doc.items():
+            if isinstance(v, ObjectId):
+                doc[k] = str(v)
+            elif isinstance(v, (dict, list)):
+                doc[k] = mongo_to_dict(v)
+        return doc
+    return doc
+
+
+def mongo_list_to_dicts(docs):
+    return [mongo_to_dict(doc) for doc in docs]
+
+
+def merge_customer_data(old, new):
+    merged = old.copy()
+    for k, v in new.items():
+        if v not in [None, '', []]:  # Only overwrite if new value is not empty/None
+            merged[k] = v
+    return merged
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def server_timing(timings):
+    return ', '.join(f"{name};dur={duration:.2f}" for name, duration in timings.items())
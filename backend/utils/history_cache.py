@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import count
+
+# Rough per-message overhead of the dict, deque slot and strings, in bytes
+_MESSAGE_OVERHEAD = 200
+
+
+def _message_size(msg):
+    return _MESSAGE_OVERHEAD + len(msg.get('content') or '')
+
+
+class _Entry:
+    __slots__ = ('messages', 'complete', 'filled', 'size', 'turns')
+
+    def __init__(self, capacity, turns=None):
+        self.messages = deque(maxlen=capacity)
+        # True when messages holds the whole conversation (until it overflows)
+        self.complete = False
+        # When the entry was read from (or created along with) the database; hits do not extend it
+        self.filled = time.monotonic()
+        self.size = 0
+        # The conversation's turn counter the entry is current for; None when unknown
+        self.turns = turns
+
+
+class HistoryCache:
+    """Per-conversation ring buffers of the most recent messages.
+
+    Each conversation keeps its last `capacity` messages, oldest first.
+    Conversations are evicted least-recently-used first when there are more
+    than max_conversations of them or their approximate size exceeds
+    max_bytes, and dropped ttl seconds after they were read from the
+    database, however often they are used since.
+
+    A miss returns None; the caller reads MongoDB and hands the result to
+    fill() with the generation() it saw before reading, so a message
+    appended while the read was in flight is never lost from the cache.
+
+    Only messages added in this process are appended. With several worker
+    processes, each turn bumps a counter on the conversation document; the
+    caller passes the value it read to current(), and invalidate()s the
+    conversation when another worker has run a turn since this one cached
+    it. ttl bounds what that check cannot see.
+    """
+
+    def __init__(self, capacity=20, max_conversations=10000, max_bytes=64 * 1024 * 1024, ttl=1800):
+        self.capacity = capacity
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+        self._sequence = count(1)
+        self._appended = OrderedDict()
+
+    def get(self, conversation_id, limit, since=None):
+        """The last `limit` messages newer than `since` (a timestamp), or None if they are not all cached."""
+        with self.lock:
+            entry = self._live_entry(conversation_id)
+            if entry is not None and self._covers(entry, limit, since):
+                self.hits += 1
+                self.entries.move_to_end(conversation_id)
+                messages = list(entry.messages)
+                if since is not None:
+                    messages = [msg for msg in messages if msg['timestamp'] > since]
+                return messages[-limit:] if limit else []
+            self.misses += 1
+            return None
+
+    @staticmethod
+    def _covers(entry, limit, since):
+        if entry.complete:
+            return True
+        if since is not None and entry.messages and entry.messages[0]['timestamp'] <= since:
+            # The cached tail reaches back past since, so it holds every newer message
+            return True
+        newer = len(entry.messages) if since is None else sum(1 for msg in entry.messages if msg['timestamp'] > since)
+        return limit <= newer
+
+    def current(self, conversation_id, turns):
+        """True when the cached conversation has seen every turn before this one.
+
+        turns is the conversation's turn counter, which this turn has already
+        bumped; the entry then advances to it.
+        """
+        with self.lock:
+            entry = self.entries.get(conversation_id)
+            if entry is None or entry.turns is None or entry.turns not in (turns - 1, turns):
+                return False
+            entry.turns = turns
+            return True
+
+    def invalidate(self, conversation_id):
+        """Drop a conversation the last get() found but the database is ahead of; that get() was a miss."""
+        with self.lock:
+            if conversation_id in self.entries:
+                self._drop(conversation_id)
+                self.stale += 1
+                self.hits -= 1
+                self.misses += 1
+
+    def generation(self, conversation_id):
+        with self.lock:
+            return self._appended.get(conversation_id, 0)
+
+    def prime(self, conversation_id, turns=None):
+        """Register a brand-new, empty conversation as fully cached."""
+        with self.lock:
+            entry = self._new_entry(conversation_id, turns)
+            entry.complete = True
+            self._evict()
+
+    def fill(self, conversation_id, messages, complete, generation, turns=None):
+        """Cache messages (oldest first) read from the database.
+
+        complete says the read returned the entire conversation, and turns
+        is the turn counter read before it. Ignored when a message was
+        appended after `generation` was taken.
+        """
+        with self.lock:
+            if self._appended.get(conversation_id, 0) != generation:
+                return
+            entry = self._new_entry(conversation_id, turns)
+            for msg in messages[-self.capacity:]:
+                self._push(entry, msg)
+            entry.complete = complete
+            self._evict()
+
+    def append(self, conversation_id, msg):
+        with self.lock:
+            self._appended[conversation_id] = next(self._sequence)
+            self._appended.move_to_end(conversation_id)
+            while len(self._appended) > 2 * self.max_conversations:
+                self._appended.popitem(last=False)
+            entry = self._live_entry(conversation_id)
+            if entry is not None:
+                self._push(entry, msg)
+                self.entries.move_to_end(conversation_id)
+                self._evict()
+
+    def _push(self, entry, msg):
+        if len(entry.messages) == entry.messages.maxlen:
+            dropped = _message_size(entry.messages[0])
+            entry.size -= dropped
+            self.size -= dropped
+            entry.complete = False
+        entry.messages.append(msg)
+        added = _message_size(msg)
+        entry.size += added
+        self.size += added
+
+    def _new_entry(self, conversation_id, turns=None):
+        self._drop(conversation_id)
+        entry = _Entry(self.capacity, turns)
+        self.entries[conversation_id] = entry
+        return entry
+
+    def _live_entry(self, conversation_id):
+        entry = self.entries.get(conversation_id)
+        if entry is not None and time.monotonic() - entry.filled > self.ttl:
+            self._drop(conversation_id)
+            self.evictions += 1
+            return None
+        return entry
+
+    def _drop(self, conversation_id):
+        entry = self.entries.pop(conversation_id, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_conversations or self.size > self.max_bytes):
+            conversation_id = next(iter(self.entries))
+            self._drop(conversation_id)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'conversations': len(self.entries),
+                'approx_bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale': self.stale,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,271 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from operator import itemgetter
+
+# Seconds; covers sub-millisecond cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        # Every label must be passed; a single label is keyed by its bare value
+        self._key = itemgetter(*self.labelnames) if self.labelnames else lambda labels: ()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            children = list(self.children.items())
+        single = len(self.labelnames) == 1
+        for key, child in sorted(children):
+            lines.extend(self._render_child((key,) if single else key, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.children[key] = self.children.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.children.get(self._key(labels), 0)
+
+    def _render_child(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; set_function() reads it at scrape time."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.children[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.children[key] = self.children.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        with self.lock:
+            self.children[self._key(labels)] = fn
+
+    def value(self, **labels):
+        value = self.children.get(self._key(labels), 0)
+        return value() if callable(value) else value
+
+    def _render_child(self, key, value):
+        if callable(value):
+            value = value()
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            child = self.children.get(key)
+            if child is None:
+                child = self.children[key] = _HistogramChild(len(self.buckets) + 1)
+            child.counts[index] += 1
+            child.sum += value
+            child.count += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Each metric keeps one child per label combination behind its own lock,
+    so recording is a dict lookup, a bisect and a few additions. With
+    enabled = False counters and histograms stop recording (gauges are
+    still set, they are cheap and read at scrape time).
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(self, name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+chat_stage_seconds = registry.histogram(
+    'chatbot_chat_stage_seconds', 'Time spent in each stage of a chat turn.', ['stage']
+)
+http_request_seconds = registry.histogram(
+    'chatbot_http_request_seconds', 'HTTP request latency by endpoint and status.', ['endpoint', 'method', 'status']
+)
+model_method_seconds = registry.histogram(
+    'chatbot_model_method_seconds', 'Time spent in data model methods.', ['model', 'method']
+)
+llm_request_seconds = registry.histogram(
+    'chatbot_llm_request_seconds', 'LLM call latency by model and outcome.', ['model', 'outcome']
+)
+llm_failures_total = registry.counter(
+    'chatbot_llm_failures_total', 'Failed LLM calls by model and HTTP status.', ['model', 'status']
+)
+llm_retries_total = registry.counter(
+    'chatbot_llm_retries_total', 'LLM attempts beyond the first within one call, by the model retried on.', ['model']
+)
+llm_tokens_total = registry.counter(
+    'chatbot_llm_tokens_total', 'Tokens reported by the LLM API, by model and type.', ['model', 'type']
+)
+mongo_round_trips_total = registry.counter(
+    'chatbot_mongo_round_trips_total', 'MongoDB commands sent to the server.', ['command']
+)
+mongo_command_seconds = registry.histogram(
+    'chatbot_mongo_command_seconds', 'MongoDB command latency as reported by the driver.', ['command', 'outcome']
+)
+chat_routes_total = registry.counter(
+    'chatbot_chat_routes_total', 'Chat turns by how the reply was produced (llm, or a template: ask, recommend).',
+    ['route']
+)
+admission_in_flight = registry.gauge(
+    'chatbot_admission_in_flight', 'Chat turns holding an admission slot.'
+)
+admission_queue_depth = registry.gauge(
+    'chatbot_admission_queue_depth', 'Chat turns waiting for an admission slot.'
+)
+admission_wait_seconds = registry.histogram(
+    'chatbot_admission_wait_seconds', 'Time queued chat turns waited for a slot.'
+)
+admission_rejected_total = registry.counter(
+    'chatbot_admission_rejected_total', 'Chat turns answered with 429, by reason.', ['reason']
+)
+
+
+def instrumented(cls):
+    """Class decorator: time every public method into model_method_seconds."""
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, _timed_method(method, cls.__name__, name))
+    return cls
+
+
+def _timed_method(method, model, name):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            model_method_seconds.observe(time.perf_counter() - start, model=model, method=name)
+    return wrapper
+session_flights_total = registry.counter(
+    'chatbot_session_flights_total',
+    'Chat requests by single-flight outcome: leader (ran the turn), coalesced (shared an identical turn\'s '
+    'result) or the reason it was rejected.',
+    ['outcome']
+)
+session_flight_wait_seconds = registry.histogram(
+    'chatbot_session_flight_wait_seconds',
+    'Time chat requests waited for an earlier turn of their session, or for the identical turn they joined.',
+    ['outcome']
+)
+customer_cache_lookups_total = registry.counter(
+    'chatbot_customer_cache_lookups_total', 'Customer profile cache lookups by result (hit, miss).', ['result']
+)
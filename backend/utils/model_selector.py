@@ -1,17 +1,325 @@
 from config import Config
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+import asyncio
+import threading
+import time
 import os
+from utils.metrics import llm_failures_total, llm_request_seconds, llm_retries_total
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ModelHealth:
+    """Rolling health statistics and circuit breaker state for one model."""
+
+    def __init__(self, name, alpha=None):
+        self.name = name
+        self.alpha = alpha or Config.MODEL_EWMA_ALPHA
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        # Monotonic time until which a 429 asked us not to send requests
+        self.backoff_until = 0.0
+        self.latencies = deque(maxlen=200)
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.probe_successes = 0
+
+    def _ewma(self, current, value):
+        return value if current is None else self.alpha * value + (1 - self.alpha) * current
+
+    def record_success(self, latency):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.ewma_latency = self._ewma(self.ewma_latency, latency)
+        self.error_rate = self._ewma(self.error_rate, 0.0)
+        self.latencies.append(latency)
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+            self.probe_successes += 1
+            if self.probe_successes >= Config.MODEL_BREAKER_PROBES:
+                self.state = CLOSED
+                self.opened_at = None
+
+    def record_failure(self, status_code=None, retry_after=None):
+        self.requests += 1
+        if status_code == 429:
+            self.record_rate_limited(retry_after)
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        self.error_rate = self._ewma(self.error_rate, 1.0)
+        if self.state == HALF_OPEN or self.consecutive_failures >= Config.MODEL_BREAKER_FAILURES:
+            self.trip()
+
+    def record_rate_limited(self, retry_after=None):
+        # The models share one quota: a 429 says wait, not that this model is broken
+        self.rate_limited += 1
+        delay = retry_after if retry_after is not None else Config.MODEL_RATE_LIMIT_BACKOFF
+        self.backoff_until = max(self.backoff_until, time.monotonic() + delay)
+        if self.state == HALF_OPEN:
+            # Not an answer either way; probe again once the back-off is over
+            self.probe_in_flight = False
+
+    def release_probe(self):
+        # An attempt that ended without an answer, such as a cancelled one
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+
+    def backoff_remaining(self):
+        return max(self.backoff_until - time.monotonic(), 0.0)
+
+    def trip(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        self.probe_successes = 0
+
+    def is_healthy(self):
+        return self.state == CLOSED and self.error_rate < Config.MODEL_DEGRADED_ERROR_RATE
+
+    def probe_due(self):
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= Config.MODEL_BREAKER_COOLDOWN
+        return self.state == HALF_OPEN and not self.probe_in_flight
+
+    def start_probe(self):
+        self.state = HALF_OPEN
+        self.probe_in_flight = True
+
+    def score(self):
+        # Lower is better: latency inflated by the recent error rate
+        return (self.ewma_latency or 0.0) * (1 + 4 * self.error_rate)
+
+    def p95(self):
+        if len(self.latencies) < Config.MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def snapshot(self):
+        p95 = self.p95()
+        return {
+            'state': self.state,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+            'backoff_s': round(self.backoff_remaining(), 3),
+            'error_rate': round(self.error_rate, 4),
+            'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            'p95_latency_ms': round(p95 * 1000, 1) if p95 is not None else None
+        }
+
 
 class ModelSelector:
-    def __init__(self):
-        self.models = Config.AI_MODELS
+    """Routes LLM calls across Config.AI_MODELS by health.
+
+    Models are preferred in configuration order. A model whose circuit
+    breaker is open is skipped until its cooldown expires; then a half-open
+    probe is routed to it, and the breaker closes again once the probe
+    succeeds, so traffic returns to the primary model after an outage.
+
+    A 429 does not count against a model's health. The model is skipped
+    for the Retry-After the API sent (MODEL_RATE_LIMIT_BACKOFF without
+    one), and when every model is backing off for at most
+    MODEL_RATE_LIMIT_MAX_WAIT seconds, a call waits for the first to be
+    free again instead of failing.
+    """
+
+    def __init__(self, models=None):
+        self.models = models or Config.AI_MODELS
         self.current_index = 0
+        self.health = {model['name']: ModelHealth(model['name']) for model in self.models}
+        self.lock = threading.Lock()
+        self._hedge_pool = None
 
-    def get_current_model(self):
-        model = self.models[self.current_index]
+    def _with_token(self, model):
         # Get the token from env
-        model['token'] = os.getenv(model['token_env'])
-        return model
+        return dict(model, token=os.getenv(model['token_env']))
+
+    def get_current_model(self):
+        return self._with_token(self.models[self.current_index])
 
     def switch_to_next_model(self):
         self.current_index = (self.current_index + 1) % len(self.models)
         return self.get_current_model()
+
+    def select(self, exclude=()):
+        """Pick the model for the next attempt, skipping names in exclude.
+
+        Returns None when every remaining model has an open breaker.
+        """
+        with self.lock:
+            candidates = [
+                (i, m) for i, m in enumerate(self.models)
+                if m['name'] not in exclude and not self.health[m['name']].backoff_remaining()
+            ]
+            # A due probe goes first so a recovered primary is noticed quickly
+            for i, model in candidates:
+                health = self.health[model['name']]
+                if health.state != CLOSED and health.probe_due():
+                    health.start_probe()
+                    self.current_index = i
+                    return self._with_token(model)
+            for i, model in candidates:
+                if self.health[model['name']].is_healthy():
+                    self.current_index = i
+                    return self._with_token(model)
+            closed = [(i, m) for i, m in candidates if self.health[m['name']].state == CLOSED]
+            if not closed:
+                return None
+            i, model = min(closed, key=lambda c: self.health[c[1]['name']].score())
+            self.current_index = i
+            return self._with_token(model)
+
+    def next_model(self, tried):
+        """The model for the next attempt of a call that has tried the models in tried.
+
+        Returns (model_config, None); (None, seconds) when every usable model
+        is backing off from a 429 that ends within MODEL_RATE_LIMIT_MAX_WAIT,
+        for the caller to wait and ask again; (None, None) when no model is
+        available.
+        """
+        model_config = self.select(exclude=tried) or self.select()
+        if model_config is None:
+            return None, self.backoff_wait()
+        if tried:
+            self.record_retry(model_config)
+        tried.append(model_config['name'])
+        return model_config, None
+
+    def backoff_wait(self):
+        with self.lock:
+            waits = [health.backoff_remaining() for health in self.health.values()
+                     if health.state == CLOSED or health.probe_due()]
+        waits = [wait for wait in waits if wait > 0]
+        if waits and min(waits) <= Config.MODEL_RATE_LIMIT_MAX_WAIT:
+            return min(waits)
+        return None
+
+    def record_success(self, model_config, latency):
+        with self.lock:
+            self.health[model_config['name']].record_success(latency)
+        llm_request_seconds.observe(latency, model=model_config['name'], outcome='success')
+
+    def record_failure(self, model_config, error=None, latency=None):
+        status_code = getattr(error, 'status_code', None)
+        with self.lock:
+            self.health[model_config['name']].record_failure(status_code, getattr(error, 'retry_after', None))
+        llm_failures_total.inc(model=model_config['name'], status=str(status_code or 'error'))
+        if latency is not None:
+            llm_request_seconds.observe(latency, model=model_config['name'], outcome='failure')
+
+    def record_abandoned(self, model_config):
+        """An attempt was cancelled before it answered; frees the model's half-open probe."""
+        with self.lock:
+            self.health[model_config['name']].release_probe()
+
+    def record_retry(self, model_config):
+        llm_retries_total.inc(model=model_config['name'])
+
+    def _attempt(self, fn, model_config):
+        start = time.monotonic()
+        try:
+            result = fn(model_config)
+        except Exception as e:
+            self.record_failure(model_config, e, time.monotonic() - start)
+            raise
+        except BaseException:
+            self.record_abandoned(model_config)
+            raise
+        self.record_success(model_config, time.monotonic() - start)
+        return result
+
+    def call(self, fn, retry_budget=None):
+        """Run fn(model_config) on the healthiest model, retrying on failure.
+
+        Each attempt goes to a model not yet tried in this call while there is
+        one; at most retry_budget attempts are made (Config.MODEL_RETRY_BUDGET).
+        """
+        budget = retry_budget or Config.MODEL_RETRY_BUDGET
+        tried = []
+        last_error = None
+        for _ in range(budget):
+            model_config, wait = self.next_model(tried)
+            if wait is not None:
+                time.sleep(wait)
+                model_config, _ = self.next_model(tried)
+            if model_config is None:
+                break
+            try:
+                if Config.MODEL_HEDGE_ENABLED:
+                    return self._hedged(fn, model_config, tried)
+                return self._attempt(fn, model_config)
+            except Exception as e:
+                last_error = e
+        if last_error is None:
+            last_error = Exception("No model available: all circuit breakers are open")
+        raise last_error
+
+    async def acall(self, fn, retry_budget=None):
+        """asyncio variant of call(): awaits fn(model_config) with the same routing and retries.
+
+        Hedging (MODEL_HEDGE_ENABLED) applies to call() only.
+        """
+        budget = retry_budget or Config.MODEL_RETRY_BUDGET
+        tried = []
+        last_error = None
+        for _ in range(budget):
+            model_config, wait = self.next_model(tried)
+            if wait is not None:
+                await asyncio.sleep(wait)
+                model_config, _ = self.next_model(tried)
+            if model_config is None:
+                break
+            start = time.monotonic()
+            try:
+                result = await fn(model_config)
+            except Exception as e:
+                self.record_failure(model_config, e, time.monotonic() - start)
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled (asyncio.CancelledError): no outcome to record, but a probe must not stay in flight
+                self.record_abandoned(model_config)
+                raise
+            self.record_success(model_config, time.monotonic() - start)
+            return result
+        if last_error is None:
+            last_error = Exception("No model available: all circuit breakers are open")
+        raise last_error
+
+    def _hedged(self, fn, model_config, tried):
+        # Send a duplicate request to another model once the primary is slower than its p95
+        p95 = self.health[model_config['name']].p95()
+        if p95 is None:
+            return self._attempt(fn, model_config)
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=Config.MODEL_HEDGE_WORKERS)
+        futures = [self._hedge_pool.submit(self._attempt, fn, model_config)]
+        done, _ = wait(futures, timeout=p95)
+        if not done:
+            hedge_config = self.select(exclude=tried)
+            if hedge_config is not None:
+                tried.append(hedge_config['name'])
+                futures.append(self._hedge_pool.submit(self._attempt, fn, hedge_config))
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def stats(self):
+        with self.lock:
+            return {name: health.snapshot() for name, health in self.health.items()}
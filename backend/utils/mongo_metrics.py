@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from utils.metrics import mongo_command_seconds, mongo_round_trips_total
+
+_current = ContextVar('mongo_round_trips', default=None)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts MongoDB commands issued while a request is being tracked.
+
+    Register it on the client (event_listeners=[round_trips]) and wrap the
+    request in `with round_trips.track() as counter:`; counter.count is the
+    number of commands sent to the server, i.e. network round trips.
+    Every command is also counted and timed in the process-wide metrics.
+    """
+
+    def started(self, event):
+        mongo_round_trips_total.inc(command=event.command_name)
+        counter = _current.get()
+        if counter is not None:
+            counter.count += 1
+
+    def succeeded(self, event):
+        mongo_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome='success')
+
+    def failed(self, event):
+        mongo_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome='failure')
+
+    @contextmanager
+    def track(self):
+        counter = RequestCount()
+        token = _current.set(counter)
+        try:
+            yield counter
+        finally:
+            _current.reset(token)
+
+
+class RequestCount:
+    def __init__(self):
+        self.count = 0
+
+
+round_trips = RoundTripCounter()
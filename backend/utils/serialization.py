@@ -0,0 +1,60 @@
+"""Response views and the JSON encoding applied once at the response boundary.
+
+Queries fetch only the fields a view needs (the projections below), the
+documents travel through the chat turn as pymongo returned them, and
+ObjectId / datetime values are converted by the encoder's default hook
+while the response is written, instead of by copying every document up
+front with mongo_to_dict.
+"""
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+# The customer fields a turn carries from one turn to the next
+PROFILE_FIELDS = (
+    'name', 'email', 'phone', 'looking_for',
+    'budget', 'brand_preference', 'exclude_brand', 'color_preference'
+)
+
+# Product cards in chat responses; specs, tags and category stay in the database
+PRODUCT_CARD = {field: 1 for field in (
+    'name', 'brand', 'price', 'description', 'color', 'image_url', 'rating', 'in_stock'
+)}
+
+CUSTOMER_PROFILE = {field: 1 for field in PROFILE_FIELDS}
+
+# What a turn reads from its conversation document: the rolling summary and the turn counter
+CONVERSATION_STATE = {'summary': 1, 'summary_until': 1, 'turns': 1}
+
+# Products a chat response shows
+CARD_LIMIT = 3
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(default=_default, separators=(',', ':'))
+
+
+def dumps(obj):
+    """JSON for a response body; ObjectId and datetime become strings."""
+    return _encoder.encode(obj)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider with the same ObjectId and datetime handling as dumps()."""
+
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (ObjectId, datetime, date)):
+            return _default(o)
+        return DefaultJSONProvider.default(o)
@@ -0,0 +1,137 @@
+import json
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class ReplyStreamParser:
+    """Incrementally extracts the "reply" value from the LLM's JSON envelope.
+
+    The system prompt asks the model for a single JSON object such as
+    {"name": "", ..., "reply": "..."}. Tokens arrive in arbitrary chunks, so
+    feed() scans character by character and returns only the newly decoded
+    part of the reply string. If the model ignores the format and answers in
+    plain text, the text itself is streamed as the reply.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.mode = None          # None until the first significant char, then 'json' or 'text'
+        self.preamble = ''
+        self.depth = 0
+        self.in_string = False
+        self.escape = None        # None, '' after a backslash, or the collected \\u digits
+        self.string_chars = []
+        self.last_key = None
+        self.expect_value = False
+        self.in_reply = False
+        self.reply_done = False
+
+    def feed(self, chunk):
+        """Consume a chunk of model output; returns the new reply text (may be '')."""
+        self.buffer.append(chunk)
+        out = []
+        for ch in chunk:
+            if self.mode is None:
+                if ch == '{':
+                    self.mode = 'json'
+                else:
+                    # Skip leading whitespace and a ```json fence
+                    self.preamble += ch
+                    fence = self.preamble.lstrip()
+                    if not fence or '```'.startswith(fence) or fence.startswith('```'):
+                        continue
+                    self.mode = 'text'
+                    out.append(self.preamble.lstrip())
+                    continue
+            if self.mode == 'text':
+                out.append(ch)
+                continue
+            self._consume_json(ch, out)
+        return ''.join(out)
+
+    def _consume_json(self, ch, out):
+        if self.in_string:
+            if self.escape is not None:
+                decoded = self._decode_escape(ch)
+                if decoded is not None:
+                    self._string_char(decoded, out)
+                return
+            if ch == '\\':
+                self.escape = ''
+            elif ch == '"':
+                self._end_string()
+            else:
+                self._string_char(ch, out)
+            return
+
+        if ch == '"':
+            self.in_string = True
+            self.string_chars = []
+            self.in_reply = (
+                self.depth == 1 and self.expect_value and self.last_key == 'reply' and not self.reply_done
+            )
+        elif ch in '{[':
+            self.depth += 1
+            self.expect_value = False
+        elif ch in '}]':
+            self.depth -= 1
+        elif ch == ':':
+            self.expect_value = True
+        elif ch == ',':
+            self.expect_value = False
+            self.last_key = None
+
+    def _decode_escape(self, ch):
+        if self.escape == '':
+            if ch == 'u':
+                self.escape = 'u'
+                return None
+            self.escape = None
+            return _ESCAPES.get(ch, ch)
+        # Collecting \uXXXX digits
+        self.escape += ch
+        if len(self.escape) < 5:
+            return None
+        digits = self.escape[1:]
+        self.escape = None
+        try:
+            return chr(int(digits, 16))
+        except ValueError:
+            return ''
+
+    def _string_char(self, ch, out):
+        if self.in_reply:
+            out.append(ch)
+        else:
+            self.string_chars.append(ch)
+
+    def _end_string(self):
+        self.in_string = False
+        if self.in_reply:
+            self.in_reply = False
+            self.reply_done = True
+        elif self.depth == 1 and not self.expect_value:
+            self.last_key = ''.join(self.string_chars)
+        if self.depth == 1:
+            self.expect_value = False
+        self.string_chars = []
+
+    def text(self):
+        return ''.join(self.buffer)
+
+    def result(self):
+        """Parse the complete output once the stream has ended.
+
+        Returns the decoded JSON object, or None when the output was not valid
+        JSON (the caller then treats the raw text as the reply).
+        """
+        raw = self.text().strip()
+        if raw.startswith('```'):
+            raw = raw.strip('`')
+            if raw.startswith('json'):
+                raw = raw[4:]
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
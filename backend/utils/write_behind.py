@@ -0,0 +1,104 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Buffers documents in memory and inserts them in batches in the background.
+
+    A flusher thread writes with insert_many(ordered=False) as soon as
+    max_batch documents are waiting or flush_interval seconds have passed.
+    At most max_pending documents are held; add() blocks when the buffer is
+    full, so a stalled database slows writers down instead of growing memory.
+    Documents stay visible through pending() until the insert is acknowledged,
+    which gives readers in this process read-your-writes. close() (also run at
+    interpreter exit) drains the buffer.
+    """
+
+    def __init__(self, collection, max_batch=100, flush_interval=0.5, max_pending=10000):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.queue = deque()
+        self.in_flight = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.flush_requested = False
+        self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def add(self, doc):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("WriteBehindBuffer is closed")
+            while len(self.queue) + len(self.in_flight) >= self.max_pending:
+                self.condition.wait()
+            self.queue.append(doc)
+            if len(self.queue) >= self.max_batch:
+                self.condition.notify_all()
+
+    def pending(self, predicate=None):
+        """Documents not yet acknowledged by the database, oldest first."""
+        with self.condition:
+            docs = self.in_flight + list(self.queue)
+        return [doc for doc in docs if predicate is None or predicate(doc)]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not (self.closed or self.flush_requested) and len(self.queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.closed and not self.queue:
+                    return
+                batch = [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+                self.in_flight = batch
+                if not self.queue:
+                    self.flush_requested = False
+            if batch:
+                self._write(batch)
+            with self.condition:
+                self.in_flight = []
+                self.condition.notify_all()
+
+    def _write(self, batch):
+        for attempt in range(3):
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                return
+            except BulkWriteError as e:
+                # Duplicate _ids mean an earlier attempt already landed; anything else is lost
+                errors = [err for err in e.details.get('writeErrors', []) if err.get('code') != 11000]
+                if errors:
+                    logger.error("Write-behind insert dropped %d document(s): %s", len(errors), errors[0])
+                return
+            except Exception:
+                logger.exception("Write-behind insert failed (attempt %d)", attempt + 1)
+                time.sleep(0.5 * (attempt + 1))
+        logger.error("Write-behind insert gave up on %d document(s)", len(batch))
+
+    def flush(self):
+        """Block until everything added so far has been written."""
+        with self.condition:
+            while self.queue or self.in_flight:
+                self.flush_requested = True
+                self.condition.notify_all()
+                self.condition.wait()
+
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
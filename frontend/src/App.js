@@ -212,18 +212,33 @@ function App() {
     setInputValue('');
     setIsLoading(true);
 
+    const botMessageId = Date.now() + 1;
     try {
-      const response = await chatAPI.sendMessage(inputValue, sessionId);
-      
+      let started = false;
+      const response = await chatAPI.streamMessage(inputValue, sessionId, (delta) => {
+        if (!started) {
+          // First token: swap the typing indicator for the streaming reply
+          started = true;
+          setIsLoading(false);
+          setMessages(prev => [...prev, { id: botMessageId, text: delta, isBot: true, timestamp: new Date() }]);
+        } else {
+          setMessages(prev => prev.map(m => (m.id === botMessageId ? { ...m, text: m.text + delta } : m)));
+        }
+      });
+
       const botMessage = {
-        id: Date.now() + 1,
+        id: botMessageId,
         text: response.response || response.message || "I'm sorry, I didn't understand that. Could you please rephrase?",
         isBot: true,
         timestamp: new Date(),
         products: response.products || []
       };
 
-      setMessages(prev => [...prev, botMessage]);
+      setMessages(prev => (
+        started
+          ? prev.map(m => (m.id === botMessageId ? botMessage : m))
+          : [...prev, botMessage]
+      ));
 
       // Check if we should show customer form
       if (response.collect_info || response.show_form) {
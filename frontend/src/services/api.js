@@ -58,6 +58,59 @@ export const chatAPI = {
     }
   },
 
+  // Send message and receive the reply incrementally (server-sent events).
+  // onDelta is called with each new piece of reply text; resolves with the
+  // same payload as sendMessage once the stream ends.
+  streamMessage: async (message, sessionId = null, onDelta = () => {}) => {
+    const response = await fetch(new URL('/api/chat/stream', api.defaults.baseURL), {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ message, session_id: sessionId }),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error('Failed to send message');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach((line) => {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+
+        const payload = data ? JSON.parse(data) : {};
+        if (event === 'delta') {
+          onDelta(payload.text);
+        } else if (event === 'done') {
+          result = payload;
+        } else if (event === 'error') {
+          throw new Error(payload.error || 'Failed to send message');
+        }
+      }
+    }
+
+    if (!result) {
+      throw new Error('Stream ended unexpectedly');
+    }
+    return result;
+  },
+
   // Get chat history
   getChatHistory: async (sessionId) => {
     try {